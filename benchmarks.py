@@ -0,0 +1,317 @@
+"""
+Benchmarks of csvnav.Navigator over synthetic CSV files.
+
+Generate a file and write a JSON report:
+    python benchmarks.py run --rows 200000 --cols 8 --quote-rate 0.1 --newline-rate 0.01 --output new.json
+Compare two reports (exits with status 1 if a scenario got slower than the threshold):
+    python benchmarks.py compare old.json new.json --threshold 0.1
+
+Each scenario runs in a fresh process so that its peak resident set size is its own and every cold scenario starts
+without any state in memory. The generated file is cached by its parameters, so reports of different versions of
+csvnav are measured on identical data.
+"""
+from typing import List
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from csvnav import Navigator
+
+
+# Names of the scenarios in the order they run.
+SCENARIOS = ['size', 'scalar_cold', 'scalar_warm', 'slice', 'iterate', 'filter', 'register', 'take', 'threads',
+             'threads_cold']
+# Scenarios that are run once for every thread count.
+THREAD_SCENARIOS = ['threads', 'threads_cold']
+
+
+def generate(path: str, rows: int, cols: int, quote_rate: float, newline_rate: float, seed: int):
+    """
+    Write a synthetic CSV file with a header. The first column is the row number, the second column is a category with
+    a few distinct values (for register() and filter()), odd columns are floats and even columns are words.
+
+    :param path: path of the file to write.
+    :param rows: number of rows of data.
+    :param cols: number of columns (at least 2).
+    :param quote_rate: fraction of text values that contain the delimiter or a quote character, which forces quoting.
+    :param newline_rate: fraction of rows with a text value that contains a newline.
+    :param seed: seed of the random number generator.
+    """
+    rng = random.Random(seed)
+    categories = [f'cat{i}' for i in range(16)]
+    with open(path, 'w', newline='') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(['id', 'category'] + [f'c{i}' for i in range(2, cols)])
+        for i in range(rows):
+            row = [str(i), rng.choice(categories)]
+            for col in range(2, cols):
+                if col % 2:
+                    row.append(f'{rng.uniform(-1000, 1000):.4f}')
+                else:
+                    word = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 12)))
+                    if rng.random() < quote_rate:
+                        word = f'{word}, "{word}"'
+                    row.append(word)
+            if cols > 2 and rng.random() < newline_rate:
+                row[2] += '\nmore'
+            writer.writerow(row)
+
+
+def measure(name: str, path: str, opts: dict, params: dict) -> dict:
+    """
+    Run a scenario and time it.
+
+    :param name: the name of the scenario (see SCENARIOS).
+    :param path: path of the CSV file.
+    :param opts: keyword arguments of Navigator.
+    :param params: the parameters of the run (see main()).
+    :return: a dict with the number of rows and bytes processed and the best time in seconds over the repeats.
+    """
+    rng = random.Random(params['seed'])
+    size = os.path.getsize(path)
+    rows = params['rows']
+    indices = [rng.randrange(rows) for _ in range(params['accesses'])]
+    row_bytes = size / max(rows, 1)
+
+    def fresh():
+        return Navigator(path, header=True, **opts)
+
+    def explored():
+        nav = fresh()
+        nav.size(force=True)
+        return nav
+
+    def slice_rows(nav):
+        start = rows // 2
+        return sum(1 for _ in nav[start:start + params['accesses']])
+
+    def random_threads(nav):
+        chunks = [indices[i::params['threads']] for i in range(params['threads'])]
+
+        def read(chunk):
+            for idx in chunk:
+                nav[idx]
+
+        workers = [threading.Thread(target=read, args=(chunk,)) for chunk in chunks]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    # Each scenario is a setup (not timed), the timed function of the navigator and the rows and bytes it processes.
+    scenarios = {
+        'size': (fresh, lambda nav: nav.size(force=True), rows, size),
+        'scalar_cold': (fresh, lambda nav: [nav[idx] for idx in indices], len(indices), size),
+        'scalar_warm': (explored, lambda nav: [nav[idx] for idx in indices], len(indices),
+                        len(indices) * row_bytes),
+        'slice': (explored, slice_rows, params['accesses'], params['accesses'] * row_bytes),
+        'iterate': (fresh, lambda nav: sum(1 for _ in nav), rows, size),
+        'filter': (explored, lambda nav: sum(1 for _ in nav.filter(lambda row: row['category'] == 'cat0')), rows,
+                   size),
+        'register': (explored, lambda nav: nav.register('category'), rows, size),
+        'take': (explored, lambda nav: nav.take(indices), len(indices), len(indices) * row_bytes),
+        'threads': (explored, random_threads, len(indices), len(indices) * row_bytes),
+        'threads_cold': (fresh, random_threads, len(indices), size),
+    }
+    setup, func, count, processed = scenarios[name]
+    best = None
+    for _ in range(params['repeat']):
+        nav = setup()
+        start = time.perf_counter()
+        func(nav)
+        elapsed = time.perf_counter() - start
+        nav.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return {'rows': count, 'bytes': int(processed), 'seconds': best}
+
+
+def _child(conn, name: str, path: str, opts: dict, params: dict):
+    """
+    Run a scenario in a child process and send the result with the peak resident set size of the process.
+    """
+    try:
+        result = measure(name, path, opts, params)
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result['peak_rss_mb'] = peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+        conn.send(result)
+    except Exception as e:
+        conn.send({'error': repr(e)})
+    finally:
+        conn.close()
+
+
+def run_scenario(name: str, path: str, opts: dict, params: dict) -> dict:
+    """
+    Run a scenario in a fresh process.
+
+    :param name: the name of the scenario (see SCENARIOS).
+    :param path: path of the CSV file.
+    :param opts: keyword arguments of Navigator.
+    :param params: the parameters of the run (see main()).
+    :return: a dict of the result including rows/s and MB/s.
+    """
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_child, args=(child, name, path, opts, params))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    if 'error' not in result:
+        seconds = max(result['seconds'], 1e-9)
+        result['rows_per_s'] = result['rows'] / seconds
+        result['mb_per_s'] = result['bytes'] / seconds / (1 << 20)
+    return result
+
+
+def _git_commit() -> str or None:
+    """
+    Get the commit of the working tree, if it is a git repository.
+    """
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def run(args: argparse.Namespace) -> dict:
+    """
+    Generate (or reuse) the file and run the selected scenarios for every checkpoint setting.
+
+    :param args: the parsed command line arguments of the run command.
+    :return: the report.
+    """
+    params = {
+        'rows': args.rows,
+        'cols': args.cols,
+        'quote_rate': args.quote_rate,
+        'newline_rate': args.newline_rate,
+        'seed': args.seed,
+        'accesses': args.accesses,
+        'threads': args.threads,
+        'repeat': args.repeat,
+        'engine': args.engine,
+        'checkpoints': args.checkpoints,
+        'cache_rows': args.cache_rows,
+    }
+    name = f'csvnav_bench_{args.rows}_{args.cols}_{args.quote_rate}_{args.newline_rate}_{args.seed}.csv'
+    path = os.path.join(args.data_dir, name)
+    if not os.path.exists(path):
+        generate(path + '.tmp', args.rows, args.cols, args.quote_rate, args.newline_rate, args.seed)
+        os.replace(path + '.tmp', path)
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'file_bytes': os.path.getsize(path),
+            'params': params,
+        },
+        'results': {},
+    }
+    for checkpoint in args.checkpoints:
+        opts = {'engine': args.engine, 'checkpoint': checkpoint, 'cache_rows': args.cache_rows}
+        for scenario in args.scenarios:
+            for threads in args.threads if scenario in THREAD_SCENARIOS else [None]:
+                labels = [] if len(args.checkpoints) == 1 else [f'checkpoint={checkpoint}']
+                if threads is not None and len(args.threads) > 1:
+                    labels.append(f'threads={threads}')
+                key = f'{scenario}[{",".join(labels)}]' if labels else scenario
+                result = run_scenario(scenario, path, opts, {**params, 'threads': threads})
+                report['results'][key] = result
+                if 'error' in result:
+                    print(f'{key:40s} error: {result["error"]}', file=sys.stderr)
+                else:
+                    print(f'{key:40s} {result["seconds"]:10.4f} s {result["rows_per_s"]:14.0f} rows/s '
+                          f'{result["mb_per_s"]:10.2f} MB/s {result["peak_rss_mb"]:10.1f} MB peak RSS',
+                          file=sys.stderr)
+    return report
+
+
+def compare(old: dict, new: dict, threshold: float) -> List[str]:
+    """
+    Compare the throughput of two reports scenario by scenario.
+
+    :param old: the baseline report.
+    :param new: the report to check.
+    :param threshold: the relative drop of rows/s considered a regression, e.g. 0.1 for 10%.
+    :return: the names of the scenarios that regressed.
+    """
+    regressions = []
+    print(f'{"scenario":40s} {"old rows/s":>14s} {"new rows/s":>14s} {"change":>8s} {"old RSS":>9s} {"new RSS":>9s}')
+    for key, result in new['results'].items():
+        base = old['results'].get(key)
+        if base is None or 'error' in base or 'error' in result:
+            print(f'{key:40s} {"n/a":>14s}')
+            continue
+        change = result['rows_per_s'] / base['rows_per_s'] - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f'{key:40s} {base["rows_per_s"]:14.0f} {result["rows_per_s"]:14.0f} {change:+8.1%} '
+              f'{base["peak_rss_mb"]:9.1f} {result["peak_rss_mb"]:9.1f}{flag}')
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark csvnav.Navigator on synthetic CSV files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    bench = commands.add_parser('run', help='run the benchmarks and write a JSON report')
+    bench.add_argument('--rows', type=int, default=200000, help='number of rows of data')
+    bench.add_argument('--cols', type=int, default=8, help='number of columns')
+    bench.add_argument('--quote-rate', type=float, default=0.05, help='fraction of quoted text values')
+    bench.add_argument('--newline-rate', type=float, default=0.01, help='fraction of rows with an embedded newline')
+    bench.add_argument('--seed', type=int, default=0, help='seed of the data and of the accessed rows')
+    bench.add_argument('--accesses', type=int, default=10000, help='number of rows read by the random scenarios')
+    bench.add_argument('--threads', type=lambda s: [int(n) for n in s.split(',')], default=[1, 2, 4, 8],
+                       help='comma separated numbers of threads of the threads scenarios')
+    bench.add_argument('--repeat', type=int, default=3, help='number of repeats, the best time is reported')
+    bench.add_argument('--engine', default='text', choices=['text', 'mmap'], help='Navigator engine')
+    bench.add_argument('--checkpoints', type=lambda s: [int(k) for k in s.split(',')], default=[1],
+                       help='comma separated checkpoint settings to sweep, e.g. 1,4,16')
+    bench.add_argument('--cache-rows', type=int, default=None, help='size of the row cache')
+    bench.add_argument('--scenarios', type=lambda s: s.split(','), default=SCENARIOS,
+                       help=f'comma separated scenarios out of {",".join(SCENARIOS)}')
+    bench.add_argument('--data-dir', default=tempfile.gettempdir(), help='directory of the generated files')
+    bench.add_argument('--output', default=None, help='path of the JSON report (default stdout)')
+    diff = commands.add_parser('compare', help='compare two JSON reports')
+    diff.add_argument('old', help='baseline report')
+    diff.add_argument('new', help='report to check')
+    diff.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as a regression')
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        unknown = [scenario for scenario in args.scenarios if scenario not in SCENARIOS]
+        if unknown:
+            parser.error(f'unknown scenarios {unknown}')
+        report = run(args)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as fp:
+                fp.write(text + '\n')
+        else:
+            print(text)
+        return 0
+    with open(args.old) as fp:
+        old = json.load(fp)
+    with open(args.new) as fp:
+        new = json.load(fp)
+    return 1 if compare(old, new, args.threshold) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,33 @@
-from typing import Hashable, Any, Callable, List, Tuple, Generator, TextIO
-from collections import KeysView
+from typing import Hashable, Any, Callable, List, Tuple, Generator, AsyncGenerator, TextIO, BinaryIO
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import KeysView
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial, wraps
+from itertools import accumulate, count, islice
+from operator import add, itemgetter
+import asyncio
+import codecs
 import csv
+import hashlib
+import heapq
+import inspect
+import json
+import locale
+import mmap
+import os
+import pickle
+import queue
+import random
 import re
+import statistics
+import struct
+import sys
+import tempfile
 import threading
+import time
+import zlib
 
 
 GenericRowType = dict or list or str
@@ -10,17 +35,1093 @@ GenericGenType = Generator[GenericRowType, None, None]
 GenericIndexType = int or slice or Tuple[Hashable, str]
 
 
+# Sidecar index file layout: magic, format version, metadata length, JSON metadata, then the int64 pointer arrays.
+INDEX_MAGIC = b'CSVNAVIX'
+INDEX_VERSION = 1
+INDEX_PREFIX = struct.Struct('<8sIQ')
+# Number of bytes hashed at the head and tail of the file when fingerprinting it for the sidecar index.
+FINGERPRINT_BLOCK = 1 << 16
+
+
 class CharLimitExceededError(Exception):
     pass
 
 
+class IndexMismatchError(Exception):
+    pass
+
+
+# Buffer size of the file pointer used to read the file in a single forward pass.
+STREAM_BUFFER_SIZE = 1 << 20
+# Size of the byte ranges that the parallel index builder hands to each worker process.
+PARALLEL_CHUNK_SIZE = 1 << 25
+# Size of the blocks read when a worker needs to look past the end of its byte range to finish a row, and of the blocks
+# scanned for newlines when rows are single lines.
+SCAN_BLOCK_SIZE = 1 << 20
+# Number of rows explored before the exploring thread releases the lock and publishes its progress.
+EXPLORE_CHUNK_SIZE = 1 << 12
+# Number of (value, pointer) pairs sorted in memory by self.register_range() before a sorted run is spilled to disk.
+RANGE_RUN_SIZE = 1 << 20
+# Number of pairs pickled together when a sorted run is spilled to disk.
+RANGE_SPILL_CHUNK = 1 << 12
+# Number of rows converted at a time by Navigator.to_arrays().
+ARRAY_BATCH_SIZE = 1 << 16
+# Number of rows read per executor call when AsyncNavigator iterates over rows.
+ASYNC_BATCH_SIZE = 256
+# First bytes of a gzip file.
+GZIP_MAGIC = b'\x1f\x8b'
+# Number of decompressed bytes between the decompressor snapshots of the gzip engine.
+GZIP_CHECKPOINT_SPAN = 1 << 20
+# Number of compressed bytes read, and decompressed bytes produced, at a time by the gzip engine.
+GZIP_READ_SIZE = 1 << 16
+# Forms in which rows are returned when the instance has a header (see the row_type argument of Navigator).
+ROW_TYPES = frozenset(['dict', 'tuple', 'namedtuple'])
+# Default number of positions sampled by Navigator.estimate_size() and rows read at each position.
+ESTIMATE_SAMPLES = 64
+ESTIMATE_ROWS = 16
+# Default number of consecutive rows in the blocks shuffled by Navigator.batches() and number of blocks whose rows are
+# shuffled together.
+BATCH_BLOCK_SIZE = 1 << 10
+BATCH_WINDOW_BLOCKS = 8
+# A carriage return as an int, testing a line of bytes for an int is much faster than for b'\r'.
+CR = ord('\r')
+# Carriage returns that are not part of a '\r\n' line ending.
+LONE_CR = re.compile(b'\r(?!\n)')
+# Encodings in which every byte offset at a line boundary is a valid seek position and b'\n' only encodes a newline.
+BYTE_OFFSET_ENCODINGS = frozenset(['ascii', 'utf-8', 'iso8859-1', 'iso8859-15', 'cp1250', 'cp1251', 'cp1252'])
+
+
+def _count_quotes(task: tuple) -> int:
+    """
+    Worker function for the parallel index builder. Computes the parity of the number of quote characters in a byte
+    range so that the quoting state at the start of every range can be resolved before rows are located.
+
+    :param task: a tuple (path, start, end, quote) where quote is the quote character as bytes.
+    :return: 1 if the byte range contains an odd number of quote characters and 0 otherwise.
+    """
+    path, start, end, quote = task
+    parity = 0
+    with open(path, 'rb') as fp:
+        fp.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = fp.read(min(SCAN_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            parity ^= block.count(quote) & 1
+            remaining -= len(block)
+    return parity
+
+
+def _chunk_rows(path: str, start: int, end: int, in_quote: int, opts: dict) -> Generator[Tuple[int, bytes], None, None]:
+    """
+    Locate the rows that start in a byte range of a file. A row starts after every newline that is not inside a quoted
+    field, so given the quoting state at the start of the range the rows can be found by tracking the parity of quote
+    characters. The last row of the range is read to its end even if it continues past the end of the range.
+
+    :param path: path of the file.
+    :param start: the beginning of the byte range.
+    :param end: the end of the byte range.
+    :param in_quote: the quoting state at start.
+    :param opts: a dict of parsing options prepared by Navigator._parallel_opts().
+    :yield: the absolute byte offset and the bytes of each row.
+    """
+    quote = opts['quote']
+    split_cr = opts['split_cr']
+    with open(path, 'rb') as fp:
+        if start > opts['data_start']:
+            # A row starts at the beginning of the range only if the previous byte ends a row.
+            fp.seek(start - 1)
+            ends = fp.read(2)
+            ends_line = ends[:1] == b'\n' or split_cr and ends[:1] == b'\r' and ends[1:] != b'\n'
+            row_start = 0 if ends_line and not in_quote else None
+        else:
+            row_start = 0
+        fp.seek(start)
+        data = fp.read(end - start)
+        pos = 0
+        eof = False
+        at_end = False
+        while True:
+            nl = data.find(b'\n', pos)
+            if split_cr:
+                # Under universal newlines a lone '\r' also ends a line, unless the next byte has not been read yet.
+                cr = data.find(b'\r', pos, len(data) if nl < 0 else nl)
+                if cr >= 0 and (data[cr + 1:cr + 2] != b'\n' if cr + 1 < len(data) else eof):
+                    nl = cr
+            if nl < 0:
+                if not eof:
+                    # The last row of the range continues past its end, read further.
+                    more = fp.read(SCAN_BLOCK_SIZE)
+                    if more:
+                        data += more
+                        continue
+                    eof = True
+                if row_start is None or row_start >= len(data):
+                    break
+                # There is no newline before EOF, the remaining bytes form the last row.
+                nl = len(data) - 1
+                at_end = True
+            elif quote is not None:
+                in_quote ^= data.count(quote, pos, nl) & 1
+            pos = nl + 1
+            if in_quote and not at_end:
+                # The newline is inside a quoted field.
+                continue
+            if row_start is not None:
+                yield start + row_start, data[row_start:pos]
+            if pos >= end - start or pos >= len(data):
+                # The next row starts in the next range.
+                break
+            row_start = pos
+
+
+def _decode_row(segment: bytes, opts: dict) -> List[str] or str:
+    """
+    Parse the bytes of a row located by _chunk_rows() the way Navigator parses it.
+
+    :param segment: the bytes of the row.
+    :param opts: a dict of parsing options prepared by Navigator._parallel_opts().
+    :return: a list of strings or, when raw_output is True, a string.
+    """
+    line = segment.decode(opts['encoding'], opts['errors'])
+    if opts['translate']:
+        line = line.replace('\r\n', '\n').replace('\r', '\n')
+    if opts['raw_output']:
+        return line
+    return next(csv.reader([line], **opts['dialect']))
+
+
+def _is_blank(segment: bytes, opts: dict) -> bool:
+    """
+    Check whether a row located by _chunk_rows() is empty, which is where reading stops when parsing csv.
+
+    :param segment: the bytes of the row.
+    :param opts: a dict of parsing options prepared by Navigator._parallel_opts().
+    :return: True if the row is empty and raw_output is False.
+    """
+    return not opts['raw_output'] and segment.rstrip(b'\r\n') == b''
+
+
+def _scan_chunk(task: tuple) -> Tuple[array, int, dict]:
+    """
+    Worker function for the parallel index builder. Locates the rows that start in a byte range (see _chunk_rows())
+    and optionally groups them by the values of some columns.
+
+    :param task: a tuple (path, start, end, in_quote, opts) where start and end delimit the byte range, in_quote is the
+        quoting state at start and opts is a dict of parsing options prepared by Navigator._parallel_opts().
+    :return: a tuple (starts, blank, groups) where starts holds the absolute byte offsets of the rows, blank is the
+        position in starts of the first empty row (-1 if there is none), and groups maps each column to a dict of
+        values to row offsets.
+    """
+    path, start, end, in_quote, opts = task
+    columns = opts['columns']
+    starts = array('q')
+    blank = -1
+    groups = {field: {} for field in columns}
+    for offset, segment in _chunk_rows(path, start, end, in_quote, opts):
+        starts.append(offset)
+        if _is_blank(segment, opts):
+            blank = len(starts) - 1
+            break
+        if columns:
+            row = _decode_row(segment, opts)
+            for field, col in columns.items():
+                if col >= len(row):
+                    raise KeyError(field)
+                val = row[col]
+                if val not in groups[field]:
+                    groups[field][val] = array('q', [offset])
+                else:
+                    groups[field][val].append(offset)
+    return starts, blank, groups
+
+
+def _filter_chunk(task: tuple) -> Tuple[list, int, int]:
+    """
+    Worker function for the parallel filter. Locates the rows that start in a byte range (see _chunk_rows()) and
+    evaluates a condition on each of them.
+
+    :param task: a tuple (path, start, end, in_quote, opts, condition, output) where start and end delimit the byte
+        range, in_quote is the quoting state at start, opts is a dict of parsing options prepared by
+        Navigator._parallel_opts(), condition is the predicate and output is 'rows', 'offsets' or 'indices'.
+    :return: a tuple (matches, count, blank) where matches holds the matching parsed rows (formatted by the parent
+        process since e.g. namedtuple classes built by a worker cannot be unpickled), their byte offsets or their
+        positions within the range depending on output, count is the number of rows in the range before any empty row
+        and blank is 1 if the range contains an empty row (0 otherwise).
+    """
+    path, start, end, in_quote, opts, condition, output = task
+    header, columns, row_type = opts['format']
+    formatter = _make_formatter(header, columns, row_type)
+    matches = []
+    count = 0
+    for offset, segment in _chunk_rows(path, start, end, in_quote, opts):
+        if _is_blank(segment, opts):
+            return matches, count, 1
+        parsed = _decode_row(segment, opts)
+        if condition(parsed if isinstance(parsed, str) else formatter(parsed)):
+            matches.append(parsed if output == 'rows' else offset if output == 'offsets' else count)
+        count += 1
+    return matches, count, 0
+
+
+def _passthrough(nav: 'Navigator', line: str) -> str:
+    """
+    Default reformat function of a Navigator, returns the line unchanged.
+    """
+    return line
+
+
+def _empty_like(ptrs: array or list) -> array or list:
+    """
+    Create an empty container of pointers of the same kind as ptrs (see Navigator._ptrs()).
+
+    :param ptrs: a typed array or a list of pointers.
+    :return: an empty typed array or list.
+    """
+    return array(ptrs.typecode) if isinstance(ptrs, array) else []
+
+
+def _union(ptrs: List[array]) -> array:
+    """
+    Union of sorted arrays of row pointers.
+
+    :param ptrs: a list of sorted arrays.
+    :return: a sorted array of the distinct pointers in any of the arrays.
+    """
+    if len(ptrs) == 1:
+        return ptrs[0]
+    result = _empty_like(ptrs[0])
+    last = None
+    for ptr in heapq.merge(*ptrs):
+        if ptr != last:
+            result.append(ptr)
+            last = ptr
+    return result
+
+
+def _intersect(small: array, large: array) -> array:
+    """
+    Intersection of two sorted arrays of row pointers. Each pointer of the smaller array is searched for in the larger
+    array by bisecting the part of the larger array that follows the previous match (galloping), so the cost is
+    proportional to the size of the smaller array rather than the larger.
+
+    :param small: the smaller sorted array.
+    :param large: the larger sorted array.
+    :return: a sorted array of the pointers in both arrays.
+    """
+    if len(small) > len(large):
+        small, large = large, small
+    result = _empty_like(small)
+    lo = 0
+    n = len(large)
+    for ptr in small:
+        # Gallop forward to bracket the pointer before bisecting.
+        step = 1
+        hi = lo
+        while hi < n and large[hi] < ptr:
+            lo = hi
+            hi += step
+            step *= 2
+        lo = bisect_left(large, ptr, lo, min(hi + 1, n))
+        if lo == n:
+            break
+        if large[lo] == ptr:
+            result.append(ptr)
+    return result
+
+
+def _difference(ptrs: array, exclude: array) -> array:
+    """
+    Difference of two sorted arrays of row pointers.
+
+    :param ptrs: a sorted array.
+    :param exclude: a sorted array of pointers to remove.
+    :return: a sorted array of the pointers in ptrs that are not in exclude.
+    """
+    result = _empty_like(ptrs)
+    lo = 0
+    for ptr in ptrs:
+        lo = bisect_left(exclude, ptr, lo)
+        if lo == len(exclude) or exclude[lo] != ptr:
+            result.append(ptr)
+    return result
+
+
+def _spill(run: List[tuple]) -> BinaryIO:
+    """
+    Sort a run of (value, pointer) pairs and write it to a temporary file in pickled chunks.
+
+    :param run: the pairs, sorted in place.
+    :return: the temporary file positioned at its beginning.
+    """
+    run.sort()
+    fp = tempfile.TemporaryFile()
+    for i in range(0, len(run), RANGE_SPILL_CHUNK):
+        pickle.dump(run[i:i + RANGE_SPILL_CHUNK], fp, pickle.HIGHEST_PROTOCOL)
+    fp.seek(0)
+    return fp
+
+
+def _read_run(fp: BinaryIO) -> Generator[tuple, None, None]:
+    """
+    Read back a run written by _spill() one chunk at a time.
+
+    :param fp: the temporary file of the run.
+    :yield: the (value, pointer) pairs of the run in sorted order.
+    """
+    while True:
+        try:
+            chunk = pickle.load(fp)
+        except EOFError:
+            return
+        yield from chunk
+
+
+def _column(header: List[Hashable], field: Hashable) -> int:
+    """
+    Get the column of a field. A duplicated name refers to the last column as it does in a row dict.
+
+    :param header: the column names.
+    :param field: a column name.
+    :return: the index of the column.
+    """
+    return len(header) - 1 - header[::-1].index(field)
+
+
+def _make_formatter(header: List[Hashable] or None, columns: List[Hashable] or None,
+                    row_type: str) -> Callable[[List[str]], GenericRowType]:
+    """
+    Build the function that converts a parsed row into the form returned to the caller.
+
+    :param header: the header of the file, or None.
+    :param columns: the names of the columns to keep (or their positions when there is no header), or None to keep all
+        columns.
+    :param row_type: one of ROW_TYPES.
+    :return: a function of a parsed row.
+    """
+    if row_type not in ROW_TYPES:
+        raise ValueError(f'row_type must be one of {sorted(ROW_TYPES)}, got {row_type}.')
+    if columns is None and row_type == 'dict':
+        if header:
+            # Return the row as a dictionary.
+            return lambda row: {k: v for k, v in zip(header, row)}
+        # Return the row as a list.
+        return lambda row: row
+    if columns is None:
+        if row_type == 'tuple':
+            return tuple
+        if not header:
+            raise ValueError('row_type="namedtuple" requires a header or explicit columns')
+        columns = header
+    if header:
+        cols = [_column(header, name) for name in columns]
+    else:
+        cols = list(columns)
+    if not cols:
+        raise ValueError('columns must contain at least one column')
+    if len(cols) == 1:
+        col = cols[0]
+        get = lambda row: (row[col],)
+    else:
+        get = itemgetter(*cols)
+
+    def pick(row):
+        try:
+            return get(row)
+        except IndexError:
+            # Columns missing from a short row are None.
+            return tuple(row[col] if col < len(row) else None for col in cols)
+
+    if row_type == 'tuple':
+        return pick
+    if row_type == 'namedtuple':
+        # A single class shared by every row, invalid or duplicated names (and column positions when there is no
+        # header) are replaced by positional names.
+        cls = namedtuple('Row', columns, rename=True)
+        make = tuple.__new__
+        return lambda row: make(cls, pick(row))
+    if header:
+        names = list(columns)
+        return lambda row: {k: v for k, v in zip(names, pick(row))}
+    return lambda row: list(pick(row))
+
+
+def _range_pairs(rows: Generator[Tuple[int, List[str]], None, None], field: Hashable, col: int,
+                 key: Callable[[str], Any]) -> Generator[tuple, None, None]:
+    """
+    Convert the values of a column into the (value, pointer) pairs of a range index (see Navigator.register_range()).
+
+    :param rows: a generator over (pointer, parsed row) tuples.
+    :param field: the name of the column.
+    :param col: the position of the column.
+    :param key: the function converting the string values.
+    :yield: a (value, pointer) pair for every row whose value can be converted.
+    """
+    for ptr, row in rows:
+        if col >= len(row):
+            raise KeyError(field)
+        try:
+            val = key(row[col])
+        except (ValueError, TypeError):
+            continue
+        if val != val:
+            # NaN is not ordered.
+            continue
+        yield val, ptr
+
+
+def _range_arrays(pairs: List[tuple], ptrs: array or list = None) -> Tuple[array or list, array or list]:
+    """
+    Store sorted (value, pointer) pairs of a range index compactly.
+
+    :param pairs: an iterable of sorted pairs.
+    :param ptrs: an empty container for the pointers (see Navigator._ptrs()). Default is None for a typed array.
+    :return: a tuple of the values (a typed array of floats or, for other values, a list) and the pointers.
+    """
+    vals = array('d')
+    ptrs = array('q') if ptrs is None else ptrs
+    for val, ptr in pairs:
+        if type(val) is not float and isinstance(vals, array):
+            # Other values are kept as they are.
+            vals = list(vals)
+        vals.append(val)
+        ptrs.append(ptr)
+    return vals, ptrs
+
+
+class _RowReader:
+    """
+    Reads consecutive rows from a file pointer on behalf of a Navigator (see Navigator._readrow()). The csv parser pulls
+    physical lines from the file through this object only while a row is incomplete and tracks the quoting state
+    incrementally, so a row spanning several lines is parsed exactly once. The parser is reused for every row read by
+    the same instance, so loops reading many rows should create a single instance.
+    """
+
+    def __init__(self, nav: 'Navigator', fp: TextIO):
+        self.nav = nav
+        self.fp = fp
+        # Number of characters of the row read so far.
+        self.length = 0
+        self.reader = None if nav.raw_output else csv.reader(self, nav.dialect, **nav.fmtparams)
+        # Counters of the navigator (if enabled) and the number of lines the parser had pulled after the previous row.
+        self.counters = nav.counters
+        self.line_num = 0
+
+    def __iter__(self) -> '_RowReader':
+        return self
+
+    def __next__(self) -> str:
+        line = self.fp.readline()
+        if not line:
+            raise StopIteration
+        self.length += len(line)
+        if self.nav.char_lim and self.length > self.nav.char_lim:
+            raise CharLimitExceededError(f'The number of characters in the row is {self.length} which exceeds the '
+                                         f'limit of {self.nav.char_lim} characters. Is the csv file valid? If so, you '
+                                         f'can either increase char_lim or set it None.')
+        return self.nav.reformat(self.nav, line)
+
+    def read(self) -> GenericRowType:
+        row = self.parse()
+        return [] if row is None else self.nav._output(row)
+
+    def parse(self) -> List[str] or str or None:
+        if self.reader is None:
+            # Return the line as a string. Note that this will break at any newline and will not handle e.g. mismatched
+            # quotechar.
+            line = self.fp.readline()
+            if self.nav.char_lim and len(line) > self.nav.char_lim:
+                raise CharLimitExceededError(f'The number of characters in the line is {len(line)} which exceeds the '
+                                             f'limit of {self.nav.char_lim} characters. Is the csv file valid? If so, '
+                                             f'you can either increase char_lim or set it None.')
+            if line and self.counters is not None:
+                self.counters.add('rows_parsed')
+            return line
+        # Read line as a csv row. In order to deal with any newlines that might appear within a column, the parser
+        # keeps retrieving lines until it can construct a valid csv row or EOF is reached. Invalid csv raises a
+        # csv.Error (hence hard-coding fmtparams['strict'] = True).
+        self.length = 0
+        try:
+            row = next(self.reader)
+        except StopIteration:
+            # We reached EOF.
+            return None
+        if self.counters is not None:
+            # Count the lines the row spans beyond its first line.
+            lines = self.reader.line_num - self.line_num
+            self.line_num = self.reader.line_num
+            self.counters.add('rows_parsed')
+            if lines > 1:
+                self.counters.add('multiline_rows')
+                self.counters.add('continuation_lines', lines - 1)
+        return row
+
+
+class _RowCache:
+    """
+    Thread safe least recently used cache of parsed rows keyed by row pointer. The cache is bounded by a number of rows,
+    an approximate number of bytes, or both. Rows that are lists are copied when they are put and got, so that callers
+    cannot modify the cached rows.
+    """
+
+    def __init__(self, max_rows: int = None, max_bytes: int = None):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def sizeof(row: List[str] or str) -> int:
+        if isinstance(row, str):
+            return sys.getsizeof(row)
+        return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+
+    def get(self, ptr: int) -> List[str] or str or None:
+        with self.lock:
+            entry = self.rows.get(ptr)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.rows.move_to_end(ptr)
+            self.hits += 1
+        row = entry[0]
+        return row if isinstance(row, str) else row[:]
+
+    def put(self, ptr: int, row: List[str] or str):
+        nbytes = self.sizeof(row)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            # The row would evict everything else.
+            return
+        row = row if isinstance(row, str) else row[:]
+        with self.lock:
+            if ptr in self.rows:
+                self.nbytes -= self.rows.pop(ptr)[1]
+            self.rows[ptr] = (row, nbytes)
+            self.nbytes += nbytes
+            while ((self.max_rows is not None and len(self.rows) > self.max_rows) or
+                   (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                self.nbytes -= self.rows.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def discard(self, ptr: int):
+        with self.lock:
+            if ptr in self.rows:
+                self.nbytes -= self.rows.pop(ptr)[1]
+
+    def clear(self):
+        with self.lock:
+            self.rows.clear()
+            self.nbytes = 0
+
+    def info(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'rows': len(self.rows),
+                    'bytes': self.nbytes, 'max_rows': self.max_rows, 'max_bytes': self.max_bytes}
+
+
+class _BinaryLineReader:
+    """
+    File-like object that reads lines from a file opened in binary mode and decodes them, keeping track of the byte
+    offset itself. Unlike TextIOWrapper.tell(), which reconstructs the decoder state on every call, tell() is free. Only
+    valid for encodings where byte offsets are row pointers (see Navigator._byte_offsets()).
+    """
+
+    # Calling tell() for every row costs nothing.
+    cheap_tell = True
+
+    def __init__(self, raw: BinaryIO, encoding: str, errors: str = None, newline: str = None):
+        self.raw = raw
+        self.encoding = encoding
+        self.errors = 'strict' if errors is None else errors
+        # Mimic the universal newlines mode of text files where a lone '\r' also ends a line, and which translates line
+        # endings to '\n' unless newline is ''.
+        self.translate = newline is None
+        self.split_cr = newline in (None, '')
+        self.pos = 0
+
+    def _line_length(self, line: bytes) -> int:
+        # Lines are read up to b'\n', under universal newlines a lone b'\r' before it ends the line. Only called for
+        # lines that contain b'\r'.
+        cr = line.find(b'\r', 0, len(line) - 1)
+        if cr >= 0 and line[cr + 1:cr + 2] != b'\n':
+            return cr + 1
+        return len(line)
+
+    def _decode(self, line: bytes) -> str:
+        line = line.decode(self.encoding, self.errors)
+        if self.translate and '\r' in line:
+            line = line.replace('\r\n', '\n').replace('\r', '\n')
+        return line
+
+    def readline(self) -> str:
+        line = self.raw.readline()
+        if self.split_cr and CR in line:
+            length = self._line_length(line)
+            if length < len(line):
+                line = line[:length]
+                self.raw.seek(self.pos + length)
+        self.pos += len(line)
+        return self._decode(line)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.pos = self.raw.seek(offset, whence)
+        return self.pos
+
+    def read_block(self, offset: int, size: int) -> bytes:
+        # Read up to size bytes at offset without decoding them.
+        self.raw.seek(offset)
+        data = self.raw.read(size)
+        self.pos = offset + len(data)
+        return data
+
+    def close(self):
+        self.raw.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.raw.closed
+
+    def __enter__(self) -> '_BinaryLineReader':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _MmapLineReader(_BinaryLineReader):
+    """
+    Line reader over a memory map of the file that is shared by any number of readers. Each reader only holds its own
+    position, so reading a line amounts to finding the next newline in the map and decoding the bytes up to it. There
+    is no buffer to refill after seeking and no file handle per reader.
+    """
+
+    def __init__(self, mapping: mmap.mmap or bytes, encoding: str, errors: str = None, newline: str = None):
+        super().__init__(None, encoding, errors, newline)
+        self.mapping = mapping
+        self.is_closed = False
+
+    def readline(self) -> str:
+        end = self.mapping.find(b'\n', self.pos)
+        end = len(self.mapping) if end < 0 else end + 1
+        line = self.mapping[self.pos:end]
+        if self.split_cr and CR in line:
+            line = line[:self._line_length(line)]
+        self.pos += len(line)
+        return self._decode(line)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 0:
+            self.pos = offset
+        elif whence == 1:
+            self.pos += offset
+        else:
+            self.pos = len(self.mapping) + offset
+        return self.pos
+
+    def read_block(self, offset: int, size: int) -> bytes:
+        data = self.mapping[offset:offset + size]
+        self.pos = offset + len(data)
+        return data
+
+    def close(self):
+        # The map is shared and is closed by the Navigator.
+        self.is_closed = True
+
+    @property
+    def closed(self) -> bool:
+        return self.is_closed
+
+
+class _GzipIndex:
+    """
+    Decompressor checkpoints of a gzip file shared by all readers of a Navigator. A checkpoint pairs an offset in the
+    decompressed data with the offset of the compressed byte that follows it and a snapshot of the decompressor
+    (including its 32 KiB window) from which decompression resumes. Readers moving forward record a snapshot every span
+    decompressed bytes, so the first scan of the file builds the checkpoints. The start of every gzip member is also a
+    checkpoint, where decompression resumes with a fresh decompressor. Only member starts can be saved to a sidecar
+    index because a snapshot in the middle of a member cannot be restored without zlib's inflatePrime().
+    """
+
+    def __init__(self, span: int = None):
+        self.span = GZIP_CHECKPOINT_SPAN if span is None else span
+        self.offsets = array('q', [0])
+        self.positions = array('q', [0])
+        self.states = [None]
+        self.lock = threading.Lock()
+
+    def find(self, offset: int) -> Tuple[int, int, Any]:
+        with self.lock:
+            i = bisect_right(self.offsets, offset) - 1
+            return self.offsets[i], self.positions[i], self.states[i]
+
+    def add(self, offset: int, position: int, state: Any = None):
+        # A snapshot is only kept if it is at least span bytes past the previous checkpoint.
+        with self.lock:
+            i = bisect_right(self.offsets, offset)
+            if self.offsets[i - 1] == offset or (state is not None and offset - self.offsets[i - 1] < self.span):
+                return
+            self.offsets.insert(i, offset)
+            self.positions.insert(i, position)
+            self.states.insert(i, None if state is None else state.copy())
+
+    def members(self) -> List[List[int]]:
+        with self.lock:
+            return [[offset, position] for offset, position, state in zip(self.offsets, self.positions, self.states)
+                    if state is None]
+
+
+class _GzipLineReader(_BinaryLineReader):
+    """
+    Line reader over the decompressed data of a gzip file, where row pointers are offsets in the decompressed data.
+    Seeking resumes decompression from the nearest checkpoint at or before the offset (see _GzipIndex) unless the
+    offset is in the decompressed buffer or reading forward from the current position is shorter.
+    """
+
+    def __init__(self, path: str, index: _GzipIndex, encoding: str, errors: str = None, newline: str = None):
+        super().__init__(open(path, 'rb'), encoding, errors, newline)
+        self.index = index
+        self.buffer = bytearray()
+        # Decompressed offset of the start of the buffer.
+        self.start = 0
+        # Compressed bytes not fed to the decompressor yet and the compressed offset of their start.
+        self.pending = b''
+        self.position = 0
+        self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+    def _restore(self, offset: int):
+        self.start, self.position, state = self.index.find(offset)
+        self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16) if state is None else state.copy()
+        self.raw.seek(self.position)
+        self.pending = b''
+        self.buffer = bytearray()
+
+    def _fill(self) -> bool:
+        # Decompress more data into the buffer, return False at the end of the file.
+        while True:
+            if not self.pending:
+                self.position = self.raw.tell()
+                self.pending = self.raw.read(GZIP_READ_SIZE)
+                if not self.pending:
+                    return False
+            decompressor = self.decompressor
+            if decompressor.eof:
+                # The member has ended, the next member starts with a fresh decompressor.
+                self.decompressor = decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                self.index.add(self.start + len(self.buffer), self.position)
+            data = decompressor.decompress(self.pending, GZIP_READ_SIZE)
+            rest = decompressor.unused_data if decompressor.eof else decompressor.unconsumed_tail
+            self.position += len(self.pending) - len(rest)
+            self.pending = rest
+            if data:
+                self.buffer += data
+                if not decompressor.eof:
+                    self.index.add(self.start + len(self.buffer), self.position, decompressor)
+                return True
+
+    def _discard(self, end: int):
+        # Drop the buffered bytes before end (relative to the buffer) once they are no longer needed.
+        if end >= GZIP_READ_SIZE:
+            del self.buffer[:end]
+            self.start += end
+
+    def readline(self) -> str:
+        begin = self.pos - self.start
+        find = begin
+        while True:
+            nl = self.buffer.find(b'\n', find)
+            if nl >= 0:
+                end = nl + 1
+                break
+            find = len(self.buffer)
+            if not self._fill():
+                end = len(self.buffer)
+                break
+        line = bytes(self.buffer[begin:end])
+        if self.split_cr and CR in line:
+            line = line[:self._line_length(line)]
+            end = begin + len(line)
+        self.pos = self.start + end
+        self._discard(end)
+        return self._decode(line)
+
+    def read(self, size: int) -> bytes:
+        while self.start + len(self.buffer) < self.pos + size and self._fill():
+            pass
+        begin = self.pos - self.start
+        data = bytes(self.buffer[begin:begin + size])
+        self.pos += len(data)
+        return data
+
+    def read_block(self, offset: int, size: int) -> bytes:
+        self.seek(offset)
+        data = self.read(size)
+        self._discard(self.pos - self.start)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            # The decompressed size is only known once the file has been decompressed to its end, which resumes from
+            # the last checkpoint.
+            self.seek(sys.maxsize)
+            offset += self.start + len(self.buffer)
+        end = self.start + len(self.buffer)
+        if not self.start <= offset <= end:
+            if offset < self.start or self.index.find(offset)[0] > end:
+                self._restore(offset)
+            # Decompress forward to the offset.
+            while self.start + len(self.buffer) < offset:
+                self.start += len(self.buffer)
+                self.buffer = bytearray()
+                if not self._fill():
+                    break
+        self.pos = offset
+        return self.pos
+
+
+class _HandlePool:
+    """
+    Bounded pool of file pointers shared by the threads of a Navigator. A thread borrows a file pointer for the duration
+    of a read and returns it afterwards, so the number of open file pointers follows the number of concurrent reads
+    rather than the number of threads that ever read. At most size file pointers are kept open, file pointers borrowed
+    beyond that are closed when they are returned.
+    """
+
+    def __init__(self, open_fp: Callable[[], TextIO], size: int):
+        self.open_fp = open_fp
+        self.size = size
+        # Idle file pointers and every file pointer kept by the pool (idle or borrowed). Popping and appending idle
+        # file pointers is atomic, the lock only guards opening and closing them.
+        self.idle = deque()
+        self.kept = set()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> TextIO:
+        try:
+            return self.idle.pop()
+        except IndexError:
+            pass
+        fp = self.open_fp()
+        with self.lock:
+            if len(self.kept) < self.size:
+                self.kept.add(fp)
+        return fp
+
+    def release(self, fp: TextIO):
+        if fp in self.kept and not fp.closed:
+            self.idle.append(fp)
+            return
+        with self.lock:
+            self.kept.discard(fp)
+        fp.close()
+
+    def handles(self) -> List[TextIO]:
+        with self.lock:
+            return list(self.kept)
+
+    def close(self):
+        with self.lock:
+            fps = list(self.kept)
+            self.kept.clear()
+            self.idle.clear()
+        for fp in fps:
+            fp.close()
+
+
+class _Stats:
+    """
+    Thread safe counters of the work done by a Navigator (see the stats argument of Navigator).
+    """
+
+    KEYS = ('seeks', 'readlines', 'chars_read', 'rows_parsed', 'multiline_rows', 'continuation_lines', 'rows_explored',
+            'lock_acquisitions', 'lock_waits', 'lock_wait_seconds')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = None
+        self.reset()
+
+    def add(self, key: str, value: int or float = 1):
+        with self.lock:
+            self.counts[key] += value
+
+    def reset(self):
+        with self.lock:
+            self.counts = dict.fromkeys(self.KEYS, 0)
+            self.counts['lock_wait_seconds'] = 0.
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.counts)
+
+
+class _CountingFile:
+    """
+    Wraps a file pointer of a Navigator and counts its seeks, readline calls and the characters it reads. Any other
+    attribute is looked up on the wrapped file pointer.
+    """
+
+    def __init__(self, fp: TextIO, counters: _Stats):
+        self.fp = fp
+        self.counters = counters
+
+    def readline(self) -> str:
+        line = self.fp.readline()
+        self.counters.add('readlines')
+        self.counters.add('chars_read', len(line))
+        return line
+
+    def read(self, size: int = -1) -> str:
+        data = self.fp.read(size)
+        self.counters.add('chars_read', len(data))
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.counters.add('seeks')
+        return self.fp.seek(offset, whence)
+
+    def read_block(self, offset: int, size: int) -> bytes:
+        data = self.fp.read_block(offset, size)
+        self.counters.add('seeks')
+        self.counters.add('chars_read', len(data))
+        return data
+
+    def tell(self) -> int:
+        return self.fp.tell()
+
+    def close(self):
+        self.fp.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.fp.closed
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.fp, name)
+
+    def __enter__(self) -> '_CountingFile':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _TimedLock:
+    """
+    Lock that counts its acquisitions and the time threads spent waiting for it in a _Stats.
+    """
+
+    def __init__(self, counters: _Stats):
+        self.lock = threading.Lock()
+        self.counters = counters
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        self.counters.add('lock_acquisitions')
+        if self.lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        # The lock is held by another thread, time the wait.
+        start = time.perf_counter()
+        acquired = self.lock.acquire(True, timeout)
+        self.counters.add('lock_waits')
+        self.counters.add('lock_wait_seconds', time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+    # Hooks of threading.Condition, which otherwise checks ownership and releases the lock around wait() through
+    # acquire() and would count these as acquisitions.
+    def _is_owned(self) -> bool:
+        if self.lock.acquire(False):
+            self.lock.release()
+            return False
+        return True
+
+    def _release_save(self):
+        self.lock.release()
+
+    def _acquire_restore(self, state: Any):
+        self.lock.acquire()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def _trace_rows(trace: Callable[[str, tuple, float], Any], name: str, args: tuple,
+                rows: GenericGenType) -> GenericGenType:
+    """
+    Yield the rows of a generator and report the time spent producing them (excluding the time the caller spends
+    between rows) to trace once the generator is exhausted or closed.
+    """
+    seconds = 0.
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+            yield row
+    finally:
+        rows.close()
+        trace(name, args, seconds)
+
+
+def _traced(method: Callable) -> Callable:
+    """
+    Decorator of Navigator methods that reports each call to the trace callback of the instance (see the trace argument
+    of Navigator). Without a callback, the method is called directly.
+    """
+    name = method.__name__
+    if inspect.isgeneratorfunction(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.trace is None:
+                return method(self, *args, **kwargs)
+            return _trace_rows(self.trace, name, args, method(self, *args, **kwargs))
+    else:
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.trace is None:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.trace(name, args, time.perf_counter() - start)
+    return wrapper
+
+
 class Navigator:
     
     def __init__(self, path: str, header: bool = False, raw_output: bool = False, 
                  reformat: Callable[['Navigator', str], str] = None, skip: int = 0, char_lim: int or None = 1e6, 
-                 dialect: str = 'excel', open_opts: dict = None, **kwargs):
+                 dialect: str = 'excel', open_opts: dict = None, index_path: str = None, engine: str = 'text',
+                 cache_rows: int = None, cache_bytes: int = None, checkpoint: int = 1, columns: List[Hashable] = None,
+                 row_type: str = 'dict', stats: bool = False, trace: Callable[[str, tuple, float], Any] = None,
+                 max_handles: int = 8, **kwargs):
         """
-        Instantiate a Navigator object. Note that this class assumes that the file it opens is static.
+        Instantiate a Navigator object. Note that this class assumes that the file it opens is static, except that rows
+        may be appended to it (see self.refresh()).
 
         :param path: absolute or relative path to the file to be opened.
         :param header: when True, indicates the file has a row specifying the header titles after skipping skip 
@@ -40,6 +1141,47 @@ class Navigator:
         :param dialect: see csv.reader() docs for definition. Default is 'excel'.
         :param open_opts: see keyword arguments in the docs for builtin function open(). Note that the keyword
             argument mode is restricted because Navigator is fixed to mode 'r'. Default is {} (uses defaults).
+        :param index_path: path of a sidecar index file written by self.save_index(). If the file exists and matches
+            the opened file and the parsing options, the row pointers, length, header and registered fields are loaded
+            from it instead of being rebuilt. A missing or stale index is ignored. Default is None (no sidecar).
+        :param engine: either 'text' to read the file through text mode file objects (one per thread), or 'mmap' to
+            memory-map the file in binary mode. With 'mmap', all threads share a single map, row pointers are byte
+            offsets and only the bytes of the requested rows are decoded, which makes random access considerably
+            faster. The 'mmap' engine requires an ASCII compatible encoding (e.g. utf-8 or latin-1) and only uses the
+            encoding, errors and newline options of open_opts. The 'gzip' engine reads a gzip compressed file: row
+            pointers are offsets in the decompressed data and snapshots of the decompressor are recorded every
+            GZIP_CHECKPOINT_SPAN decompressed bytes while the file is explored, so that reading a row only decompresses
+            from the nearest snapshot. Like 'mmap', it requires an ASCII compatible encoding. Files that start with the
+            gzip magic number are read with the 'gzip' engine when engine is 'text'. Default is 'text'.
+        :param cache_rows: when set, parsed rows accessed by index, slice or registered field are kept in a least
+            recently used cache of at most this many rows, keyed by row pointer and shared by all threads. Full passes
+            over the file (iteration, filter, register) bypass the cache. See self.cache_info(). Default is None.
+        :param cache_bytes: like cache_rows but bounds the approximate memory used by the cached rows in bytes. Both
+            bounds may be given. Default is None.
+        :param checkpoint: store the pointer of only every checkpoint-th row (K) rather than of every row, which
+            divides the memory used by self.row_ptr by K. Accessing row i then moves to the pointer of row K * (i // K)
+            and parses forward at most K - 1 rows, so K trades memory for random access latency. Pointers of registered
+            fields are not affected. Default is 1 (store every row pointer).
+        :param columns: a list of column names (or column positions when the file has no header) to project rows onto.
+            Only these columns are returned by every method that returns rows, which avoids building values for columns
+            the caller does not need. Default is None (all columns).
+        :param row_type: the form of the rows returned when raw_output is False. 'dict' returns a dict of column names
+            to values (or a list when there is no header), 'tuple' returns a plain tuple of the values and 'namedtuple'
+            returns an instance of a namedtuple class built once from the header (names that are not valid identifiers
+            are replaced by positional names, see collections.namedtuple's rename), so it requires a header or columns.
+            Tuples are considerably cheaper to build than dicts. See also self.select(). Default is 'dict'.
+        :param stats: when True, count the seeks, readline calls and characters read by the file pointers of this
+            instance, the rows parsed (and how many of them spanned several lines), the rows added by exploration and
+            the time spent waiting for self.lock. See self.stats(). Reads done by worker processes are not counted.
+            Default is False (no counting overhead).
+        :param trace: a callback called as trace(name, args, seconds) after every call of self._handle_scalar(),
+            self._handle_slice(), self._handle_field() and self.register(), with the name of the method, its positional
+            arguments and the time spent in it. For the generator methods, the time excludes the time the caller spent
+            between rows and the callback is called once the generator is exhausted or closed. May be replaced or
+            removed at any time through self.trace. Default is None.
+        :param max_handles: the number of file pointers kept open for reading rows by index, slice or registered field.
+            Threads borrow a file pointer from this pool for each read rather than holding one of their own, more
+            concurrent reads than max_handles open temporary file pointers. Default is 8.
         :param **fmtparams: additional keyword arguments are passed into csv.reader() and the supported fields
             are identical to those defined by the fmtparams argument of csv.reader() in the documentation. Note that the
             'strict' parameter is hard-coded to True so the file must contain valid csv or else it will error.
@@ -48,36 +1190,111 @@ class Navigator:
         self.file_has_header = header
         self.char_lim = char_lim
         self.open_opts = {} if open_opts is None else open_opts
+        self.dialect = dialect
         self.fmtparams = kwargs
         self.fmtparams['strict'] = True
+        self.index_path = index_path
         # Return raw string row without any formatting.
         self.raw_output = raw_output
         # User defined function to reformat a row string (default passes through).
-        self.reformat = lambda self, line: line if reformat is None else reformat
+        self.reformat = _passthrough if reformat is None else reformat
+        # Projection and form of the returned rows. The formatter is built for the current header on first use.
+        if row_type not in ROW_TYPES:
+            raise ValueError(f'row_type must be one of {sorted(ROW_TYPES)}, got {row_type}.')
+        if row_type == 'namedtuple' and not raw_output and not header and columns is None:
+            raise ValueError('row_type="namedtuple" requires a header or explicit columns')
+        if columns is not None and not len(columns):
+            raise ValueError('columns must contain at least one column')
+        self.columns = columns
+        self.row_type = row_type
+        self.formatter = None
+        # Formatter of the calling thread while it is inside self.select().
+        self.local = threading.local()
+        # Instrumentation, both disabled by default.
+        self.counters = _Stats() if stats else None
+        self.trace = trace
         # Get the current thread id.
         thread_id = threading.get_ident()
-        # Open the file (index by current thread id).
-        self.fps = {thread_id: open(self.path, 'r', **self.open_opts)}
+        if engine == 'text':
+            with open(self.path, 'rb') as fp:
+                if fp.read(len(GZIP_MAGIC)) == GZIP_MAGIC:
+                    # The file is compressed, read it through the gzip engine.
+                    engine = 'gzip'
+        self.engine = engine
+        self.mapping = None
+        self.gzip = None
+        if engine == 'gzip':
+            # Decompressor checkpoints are shared by every thread.
+            self.encoding = self.open_opts.get('encoding') or locale.getpreferredencoding(False)
+            if not self._byte_offsets():
+                raise ValueError(f'The gzip engine requires an ASCII compatible encoding, got {self.encoding}.')
+            self.gzip = _GzipIndex()
+        elif engine == 'mmap':
+            # Map the file once, every thread reads from the same map.
+            self.encoding = self.open_opts.get('encoding') or locale.getpreferredencoding(False)
+            if not self._byte_offsets():
+                raise ValueError(f'The mmap engine requires an ASCII compatible encoding, got {self.encoding}.')
+            with open(self.path, 'rb') as fp:
+                size = os.fstat(fp.fileno()).st_size
+                # An empty file cannot be mapped.
+                self.mapping = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        elif engine != 'text':
+            raise ValueError(f"engine must be either 'text', 'mmap' or 'gzip', got {engine}.")
+        # Open the file (index by current thread id). Reads by index, slice or field borrow file pointers from a pool
+        # shared by all threads instead.
+        self.fps = {thread_id: self._open_fp()}
+        self.handles = _HandlePool(self._open_fp, max_handles)
+        self.encoding = self.fps[thread_id].encoding
+        # File pointer shared by exploring threads (only one explores at a time), opened on first use.
+        self.explorer = None
         # Skip extraneous non-header and non-data lines at the beginning of file.
         self.skip = skip
         for _ in range(skip):
             self.fps[thread_id].readline()
-        # Initialize pointer list and dict for registering groups.
-        self.row_ptr = []
+        # Initialize pointer array and dict for registering groups. Pointers are stored in typed int64 arrays which
+        # take 8 bytes per row rather than the ~36 bytes of a list of Python ints, unless they are the tell() cookies of
+        # text mode file pointers (see self._ptrs()).
+        self.compact_ptrs = self.mapping is not None or self.gzip is not None or self._byte_offsets()
+        self.row_ptr = self._ptrs()
         self.field_ptr = {}
+        # Fields registered but not yet completely grouped, mapped to the row index from which exploration groups the
+        # rows and the column of the field.
+        self.lazy_fields = {}
+        # Fields registered by self.register_range(), mapped to the sorted values and the pointers of their rows.
+        self.range_ptr = {}
+        self.range_keys = {}
         self.header = None
         if header:
             # Extract the csv header.
-            self.header = self._readrow(self.fps[thread_id])
-        # Initialize the number of explored (accessed) rows so far.
+            row = _RowReader(self, self.fps[thread_id]).parse()
+            self.header = [] if row is None else row
+        # Initialize the number of explored (accessed) rows so far and the pointer just past the last explored row.
         self.horizon = 0
+        self.frontier = None
+        # Store the pointer of every checkpoint-th row.
+        assert checkpoint >= 1
+        self.checkpoint = checkpoint
         # Initialize row length and total character length of the file.
         self.length = None
         self.char_len = None
         # Initialize iterator counter.
         self.start_iter = {thread_id: 0}
-        # Thread locking.
-        self.lock = threading.Lock()
+        # Least recently used cache of parsed rows.
+        self.cache = None if cache_rows is None and cache_bytes is None else _RowCache(cache_rows, cache_bytes)
+        # Thread locking. Threads waiting for rows that another thread is exploring wait for progress, which is
+        # published after every EXPLORE_CHUNK_SIZE rows.
+        self.lock = threading.Lock() if self.counters is None else _TimedLock(self.counters)
+        self.progress = threading.Condition(self.lock)
+        self.exploring = False
+        # Size and digest of the file that the stored pointers describe, used to detect appended rows.
+        size = os.path.getsize(self.path)
+        self.watermark = (size, self._digest(size))
+        if index_path is not None and os.path.exists(index_path):
+            # Restore the row pointers from the sidecar index unless it no longer matches the file.
+            try:
+                self.load_index(index_path)
+            except IndexMismatchError:
+                pass
 
     def _get_or_create_fp(self) -> TextIO:
         """
@@ -92,283 +1309,2095 @@ class Navigator:
         if thread_id in self.fps:
             return self.fps[thread_id]
         else:
-            self.fps[thread_id] = open(self.path, 'r', **self.open_opts)
+            # Close the file pointers of threads that have exited so that short-lived threads do not leak them.
+            self._close_exited()
+            self.fps[thread_id] = self._open_fp()
             return self.fps[thread_id]
 
+    def _close_exited(self):
+        """
+        Private method to close the file pointers of threads that have exited.
+        """
+        alive = {thread.ident for thread in threading.enumerate()}
+        for thread_id in [thread_id for thread_id in list(self.fps) if thread_id not in alive]:
+            fp = self.fps.pop(thread_id, None)
+            self.start_iter.pop(thread_id, None)
+            if fp is not None:
+                fp.close()
+
+    def _open_fp(self) -> TextIO or _MmapLineReader:
+        """
+        Private method to open a new file pointer for the engine of this instance. With the 'mmap' engine this is a
+        reader over the shared map that does not hold a file handle, with the 'gzip' engine a reader of the decompressed
+        data.
+
+        :return: a new file pointer positioned at the start of the file.
+        """
+        if self.mapping is not None:
+            fp = _MmapLineReader(self.mapping, self.encoding, self.open_opts.get('errors'),
+                                 self.open_opts.get('newline'))
+        elif self.gzip is not None:
+            fp = _GzipLineReader(self.path, self.gzip, self.encoding, self.open_opts.get('errors'),
+                                 self.open_opts.get('newline'))
+        else:
+            fp = open(self.path, 'r', **self.open_opts)
+        return fp if self.counters is None else _CountingFile(fp, self.counters)
+
     def _readrow(self, fp: TextIO = None) -> GenericRowType:
         """
-        Read a row from the file. If self.raw_output is True, this will return a row as a string up to the first newline
-        character it reaches (and will not attempt to resolve unmatched quotes, for instance). Otherwise, this method
-        will read lines until it can construct a valid csv formatted row or reaches EOF.
+        Read a row from the file. If self.raw_output is True, this will return a row as a string up to the first newline
+        character it reaches (and will not attempt to resolve unmatched quotes, for instance). Otherwise, this method
+        will read lines until it can construct a valid csv formatted row or reaches EOF. Each row is parsed once no
+        matter how many lines it spans (see _RowReader).
+
+        :param fp: an optional file pointer. If not provided, will be retrieved automatically by thread id.
+        :return: a string, list, or dict of a row.
+        """
+        fp = fp if fp else self._get_or_create_fp()
+        return _RowReader(self, fp).read()
+
+    def _output(self, row: List[str] or str) -> GenericRowType:
+        """
+        Private method to convert a parsed row into the form returned to the caller (see the columns and row_type
+        arguments of the constructor).
+
+        :param row: a list of strings or, when raw_output is True, a string.
+        :return: by default, a dict of column names to values when a header is defined, otherwise the row itself.
+        """
+        if isinstance(row, str):
+            # Return the row as a string.
+            return row
+        formatter = getattr(self.local, 'formatter', None)
+        if formatter is None:
+            formatter = self.formatter
+            if formatter is None or formatter[0] is not self.header:
+                # The header has been set or replaced since the formatter was built.
+                formatter = self.formatter = (self.header,
+                                              _make_formatter(self.header, self.columns, self.row_type))
+        return formatter[1](row)
+
+    def _read_at(self, fp: TextIO, ptr: int) -> GenericRowType:
+        """
+        Private method to read the row at a pointer, going through the row cache if it is enabled.
+
+        :param fp: a file pointer.
+        :param ptr: the pointer to the beginning of the row.
+        :return: a string, list, or dict of a row.
+        """
+        cache = self.cache
+        if cache is None:
+            fp.seek(ptr)
+            return _RowReader(self, fp).read()
+        row = cache.get(ptr)
+        if row is None:
+            fp.seek(ptr)
+            row = _RowReader(self, fp).parse()
+            if row is None:
+                # There is no row at the pointer.
+                return []
+            cache.put(ptr, row)
+        return self._output(row)
+
+    def cache_info(self) -> dict or None:
+        """
+        Get the counters of the row cache (see the cache_rows and cache_bytes arguments of the constructor).
+
+        :return: a dict with the keys 'hits', 'misses', 'evictions', 'rows' (number of cached rows), 'bytes'
+            (approximate size of the cached rows), 'max_rows' and 'max_bytes', or None if the cache is disabled.
+        """
+        return None if self.cache is None else self.cache.info()
+
+    def stats(self) -> dict or None:
+        """
+        Get the instrumentation counters (see the stats argument of the constructor). Counters are accumulated over all
+        threads since the instance was created or self.reset_stats() was last called.
+
+        :return: a dict with the keys 'seeks', 'readlines' (readline calls), 'chars_read' (characters read, i.e. bytes
+            for single byte encodings), 'rows_parsed', 'multiline_rows' (parsed rows that spanned several lines),
+            'continuation_lines' (lines the parser pulled beyond the first line of such rows), 'rows_explored' (rows
+            added to the explored rows), 'lock_acquisitions' and 'lock_waits' (acquisitions of self.lock and how many of
+            them had to wait) and 'lock_wait_seconds', or None if the counters are disabled.
+        """
+        return None if self.counters is None else self.counters.snapshot()
+
+    def reset_stats(self):
+        """
+        Set all instrumentation counters back to zero. Does nothing when the counters are disabled.
+        """
+        if self.counters is not None:
+            self.counters.reset()
+
+    def close(self):
+        """
+        Close the file, if it is open. Only closes the file pointer assigned to the calling thread (and those of threads
+        that have exited). The pooled file pointers are closed with the last file pointer.
+        """
+        thread_id = threading.get_ident()
+        if thread_id in self.fps:
+            with self.lock:
+                self.fps[thread_id].close()
+                self.fps.pop(thread_id)
+                self.start_iter.pop(thread_id, None)
+                self._close_exited()
+                if not self.fps and self.explorer is not None:
+                    # The last file pointer has been closed, also close the file pointer used for exploration.
+                    self.explorer.close()
+                if not self.fps:
+                    self.handles.close()
+                if not self.fps and isinstance(self.mapping, mmap.mmap):
+                    self.mapping.close()
+    
+    def __len__(self) -> int or None:
+        """
+        Get the number of rows of data in the file. Note that if the end of the file has not been accessed, this
+        function will return None. In this case, you can get the length of the file by calling self.size(force=True).
+        See the method self.size() for more information.
+
+        :return: the number of rows of data or None if the end of the file has not been reached.
+        """
+        return self.size()
+
+    def __del__(self):
+        """
+        Close the file when Navigator instance is garbage collected. Will only close the file pointer assigned to the 
+        calling thread.
+        """
+        if hasattr(self, 'fps'):
+            self.close()
+    
+    def chars(self, force: bool = False) -> int or None:
+        """
+        Get the total number of characters in the file.
+
+        :param force: when True, forcibly computes the number of characters in the file even if the end of the file
+            has not been reached. When False and the end of the file has not been reached, the function will return
+            None. Default is False.
+        :return: the number of characters in the file or None if the end of the file has not been reached.
+        """
+        if force and self.char_len is None:
+            # Forcibly compute if stored value is None.
+            fp = self.handles.acquire()
+            try:
+                self.char_len = fp.seek(0, 2)
+            finally:
+                self.handles.release(fp)
+        return self.char_len
+    
+    def size(self, force: bool = False, workers: int = None) -> int or None:
+        """
+        Get the size number of rows of data in the file.
+
+        :param force: when True, forcibly computes the number of rows of data in the file even if the end of the
+            file has not been reached. When False and the end of the file has not been reached, this function will
+            return None. Warning - to count the number of rows when force=True, this function needs to iterate through 
+            all the rows in the file which could take long for very large files. Default is False.
+        :param workers: when greater than 1 and the size has to be computed, the row pointers are built (and the rows of
+            lazily registered fields grouped) by this many worker processes that each scan a byte range of the file.
+            Requires an ASCII compatible encoding, no reformat function and no escapechar, otherwise the file is scanned
+            serially. Default is None (serial).
+        :return: the number of rows of data in the file or None if the end of the file has not been reached.
+        """
+        if force and self.length is None and workers is not None and workers > 1:
+            # Rows are located from scratch, so also group the rows of any lazily registered fields.
+            fields = list(self.lazy_fields)
+            opts = self._parallel_opts(fields)
+            if opts is not None:
+                self._build_index(fields, workers, opts)
+        if force and self.length is None:
+            # Forcibly compute the length of the file by exploring all remaining rows. The size of the file is
+            # universal across threads so only one needs to do the work and others can wait.
+            self._explore()
+        return self.length
+
+    def estimate_size(self, samples: int = ESTIMATE_SAMPLES, rows: int = ESTIMATE_ROWS, confidence: float = 0.95,
+                      seed: int = None) -> dict:
+        """
+        Estimate the number of rows of data in the file without exploring it, e.g. for a progress bar. The explored rows
+        are counted exactly, the rows of the unexplored part of the file are estimated from the size of the file (see
+        self.chars()) and the mean length of the rows read at samples positions spread evenly over the unexplored part.
+        A sampled position usually falls within a row, so reading starts at the next line, which may be wrong if the
+        position is in a quoted field that spans several lines. The interval is a normal approximation based on the
+        variance of the mean row length between the sampled positions. Requires byte offsets as row pointers (see the
+        engine argument of the constructor) and is not available for gzip compressed files.
+
+        :param samples: the number of positions to sample. Default is ESTIMATE_SAMPLES.
+        :param rows: the number of consecutive rows read at each position. Default is ESTIMATE_ROWS.
+        :param confidence: the confidence level of the interval. Default is 0.95.
+        :param seed: seed of the random positions. Default is None.
+        :return: a dict with the keys 'estimate', 'low' and 'high' (the bounds of the confidence interval), 'std_error'
+            and 'exact' (True if the file has been explored completely, in which case the bounds equal the estimate).
+        """
+        if self.length is not None:
+            return {'estimate': self.length, 'low': self.length, 'high': self.length, 'std_error': 0., 'exact': True}
+        if self.gzip is not None or not self._byte_offsets():
+            raise ValueError('estimate_size() requires row pointers that are byte offsets of an uncompressed file.')
+        with self.lock:
+            horizon = self.horizon
+            start = self.frontier
+        if start is None:
+            # The end of the explored rows is unknown, estimate all rows.
+            horizon = 0
+            start = self._data_start()
+        span = self.chars(force=True) - start
+        if span <= 0:
+            return {'estimate': horizon, 'low': horizon, 'high': horizon, 'std_error': 0., 'exact': False}
+        rng = random.Random(seed)
+        # The number of bytes and rows read at each sampled position.
+        sizes = []
+        counts = []
+        with self._open_stream() as fp:
+            reader = _RowReader(self, fp)
+            for i in range(samples):
+                # Stratified sampling: one position in each of samples equal parts of the unexplored bytes.
+                pos = start + int((i + rng.random()) * span / samples)
+                # Move to the beginning of the next line.
+                begin = end = fp.seek(self._next_line(fp, pos) if pos > start else pos)
+                n = 0
+                try:
+                    while n < rows and reader.parse():
+                        end = fp.tell()
+                        n += 1
+                except (csv.Error, CharLimitExceededError):
+                    # The position was probably inside a quoted field, skip it.
+                    continue
+                if n:
+                    sizes.append(end - begin)
+                    counts.append(n)
+        if not counts:
+            # Only the explored rows (or a partial last row) were found.
+            return {'estimate': horizon, 'low': horizon, 'high': horizon, 'std_error': 0., 'exact': False}
+        # Ratio estimator of the mean row length and its standard error over the sampled positions.
+        mean = sum(sizes) / sum(counts)
+        k = len(counts)
+        mean_count = sum(counts) / k
+        var = sum((size - mean * n) ** 2 for size, n in zip(sizes, counts)) / (k * max(k - 1, 1) * mean_count ** 2)
+        estimate = span / mean
+        std_error = span * var ** 0.5 / mean ** 2
+        margin = statistics.NormalDist().inv_cdf((1 + confidence) / 2) * std_error
+        return {'estimate': horizon + round(estimate), 'low': horizon + max(0, int(estimate - margin)),
+                'high': horizon + int(estimate + margin + 1), 'std_error': std_error, 'exact': False}
+
+    def _next_line(self, fp: _BinaryLineReader, pos: int) -> int:
+        """
+        Private method to find the beginning of the first line that starts after a byte position. The bytes are searched
+        for the end of the line without decoding them, since the position may be in the middle of a character.
+
+        :param fp: a binary file pointer (see self._open_stream()).
+        :param pos: a byte offset.
+        :return: the byte offset of the next line, or of the end of the file if there is none.
+        """
+        split_cr = self.open_opts.get('newline') in (None, '')
+        size = 1 << 12
+        while True:
+            block = fp.read_block(pos, size)
+            nl = block.find(b'\n')
+            if split_cr:
+                # Under universal newlines a lone '\r' also ends a line.
+                cr = block.find(b'\r', 0, len(block) if nl < 0 else nl)
+                if cr >= 0 and (block[cr + 1:cr + 2] != b'\n' if cr + 1 < len(block) else len(block) < size):
+                    nl = cr
+            if nl >= 0:
+                return pos + nl + 1
+            if len(block) < size:
+                return pos + len(block)
+            # Read a larger block until the end of the line is found.
+            size *= 4
+
+    def seek_fraction(self, fraction: float) -> GenericGenType:
+        """
+        Get a generator of the rows from the row near a fraction of the bytes of the data to the end of the file,
+        without exploring the rows before it. Rows are read from the first line that starts after the position (see
+        self.estimate_size()), or from the first checkpoint row after it if the position is within the explored rows.
+        Rows read beyond the explored rows are not explored. When row pointers are not byte offsets (and for gzip
+        compressed files), the file must have been explored and the fraction refers to the rows instead.
+
+        :param fraction: a number between 0 and 1.
+        :yield: a string, list, or dictionary of a row.
+        """
+        assert 0 <= fraction <= 1
+        if self.gzip is not None or not self._byte_offsets():
+            if self.length is None:
+                raise ValueError('seek_fraction() requires row pointers that are byte offsets of an uncompressed file '
+                                 'or a completely explored file.')
+            yield from self._handle_slice(slice(min(int(fraction * self.length), self.length), None))
+            return
+        data_start = self._data_start()
+        pos = data_start + int(fraction * (self.chars(force=True) - data_start))
+        if self.row_ptr and (self.length is not None or self.frontier is not None and pos < self.frontier):
+            # The position is within the explored rows, start at the first (checkpoint) row after it like below.
+            idx = bisect_right(self.row_ptr, pos) * self.checkpoint if pos > data_start else 0
+            yield from self._handle_slice(slice(min(idx, self.horizon), None))
+            return
+        if self.frontier is not None and self.horizon:
+            # Unexplored rows start at the frontier.
+            data_start = self.frontier
+        with self._open_stream() as fp:
+            # Move to the beginning of the next line.
+            fp.seek(self._next_line(fp, pos) if pos > data_start else pos)
+            rows = _RowReader(self, fp)
+            while True:
+                row = rows.parse()
+                if not row:
+                    break
+                yield self._output(row)
+
+    def tail(self, n: int) -> List[GenericRowType]:
+        """
+        Get the last n rows of the file, e.g. the newest rows of a file that is appended to. Unless the length of the
+        file is known, the rows are located by scanning the file backwards from its end in blocks of SCAN_BLOCK_SIZE
+        bytes, so the cost depends on n rather than on the size of the file and no rows are explored. A newline ends a
+        row if the number of quote characters after it is even, which is exact for valid csv since the file ends outside
+        of a quoted field. The scan assumes that the data runs to the end of the file. The file is explored instead when
+        rows cannot be located backwards: row pointers are not byte offsets, the file is gzip compressed, a reformat
+        function or an escapechar is used, or a blank line (where the data ends) is found near the end of the file.
+
+        :param n: the number of rows.
+        :return: a list of the last n rows (all rows if the file has fewer) in file order.
+        """
+        if n <= 0:
+            return []
+        return list(self._handle_slice(slice(-n, None)))
+
+    def _tail_ptrs(self, count: int) -> List[int] or None:
+        """
+        Private method to locate the last rows of the file by scanning backwards from the end of the file (see
+        self.tail()).
+
+        :param count: the number of rows.
+        :return: the pointers of the last count rows (fewer if the file has fewer rows) in file order, or None if the
+            rows cannot be located backwards.
+        """
+        if self.gzip is not None or not self._byte_offsets():
+            return None
+        if self.raw_output:
+            quote = None
+        else:
+            params = self._dialect_params()
+            if self.reformat is not _passthrough or params['escapechar']:
+                return None
+            quote = None if params['quoting'] == csv.QUOTE_NONE or not params['quotechar'] else \
+                params['quotechar'].encode(self.encoding)
+        split_cr = self.open_opts.get('newline') in (None, '')
+        data_start = self._data_start()
+        # The end of the file described by the row pointers (see self.refresh()).
+        pos = self.watermark[0]
+        starts = []
+        # The start of the row after the newline being examined and the parity of the quote characters after it.
+        next_start = pos
+        parity = 0
+        with self._open_stream() as fp:
+
+            def blank(start: int) -> bool:
+                # A blank row ends the data when rows are parsed as csv.
+                return not self.raw_output and next_start - start <= 2 and \
+                    fp.read_block(start, next_start - start).strip(b'\r\n') == b''
+
+            while pos > data_start and len(starts) < count:
+                begin = max(data_start, pos - SCAN_BLOCK_SIZE)
+                block = fp.read_block(begin, pos - begin)
+                if split_cr and LONE_CR.search(block):
+                    # Lines that end with a lone carriage return are left to exploration.
+                    return None
+                right = len(block)
+                while len(starts) < count:
+                    nl = block.rfind(b'\n', 0, right)
+                    if quote is not None:
+                        parity ^= block.count(quote, nl + 1, right) & 1
+                    if nl < 0:
+                        break
+                    right = nl
+                    start = begin + nl + 1
+                    if parity or start == next_start:
+                        # The newline is inside a quoted field, or it ends the last row of the file.
+                        continue
+                    if blank(start):
+                        return None
+                    starts.append(start)
+                    next_start = start
+                pos = begin
+            if len(starts) < count and data_start < next_start:
+                # The scan reached the first row of data.
+                if parity or blank(data_start):
+                    return None
+                starts.append(data_start)
+        starts.reverse()
+        return starts
+
+    def set_header(self, header: List[Hashable]):
+        """
+        Set the file's header (does not modify the file).
+
+        :param header: the header can technically be composed of any hashable objects but is typically composed of
+            strings. The number of elements in the list should be equal to the number of columns in the file.
+        """
+        self.header = header
+
+    def filter(self, condition: Callable[[GenericRowType], bool]) -> GenericRowType:
+        """
+        Get a generator that only yields rows matching a given condition. The rows are read in a single forward pass
+        (see self.__iter__()).
+
+        :param condition: a function that takes in a row and returns a boolean for whether to yield the row or not.
+        :yield: either string, list, or dictionary of a row.
+        """
+        for row in self:
+            if condition(row):
+                yield row
+
+    def parallel_filter(self, condition: Callable[[GenericRowType], bool], workers: int = None, ordered: bool = True,
+                        output: str = 'rows') -> Generator[GenericRowType or int, None, None]:
+        """
+        Get a generator over the rows matching a condition, evaluating the condition in a pool of worker processes. The
+        file is split into byte ranges (see self.size()) and each worker locates, parses and tests the rows of one range
+        at a time, so an expensive condition uses every core. The condition must be picklable, i.e. a function defined
+        at the top level of a module rather than a lambda or a nested function. Rows are passed to the condition in the
+        same form as by self.filter(). When the file cannot be split into byte ranges (a reformat function, an encoding
+        that is not ASCII compatible or an escape character), or workers is at most 1, the rows are tested serially.
+
+        :param condition: a function that takes in a row and returns a boolean for whether to yield the row or not.
+        :param workers: number of worker processes. Default is None (serial).
+        :param ordered: when True, results are yielded in file order. When False, the results of each range are
+            yielded as soon as it is done, which keeps every worker busy. Note that if the length of the file is not
+            known yet, rows that follow an empty row (where reading stops when parsing csv) may then be yielded if their
+            range finishes first. Default is True.
+        :param output: 'rows' to yield the matching rows, 'offsets' to yield their row pointers (byte offsets) or
+            'indices' to yield their row indices. Indices are always yielded in file order. Default is 'rows'.
+        :yield: a row, row pointer or row index for each matching row.
+        """
+        assert output in ('rows', 'offsets', 'indices')
+        opts = self._parallel_opts([]) if workers is not None and workers > 1 else None
+        if opts is None:
+            # Test the rows serially.
+            if output == 'rows':
+                yield from self.filter(condition)
+                return
+            self.size(force=True)
+            for idx, (ptr, row) in enumerate(self._scan_rows()):
+                if condition(self._output(row)):
+                    yield ptr if output == 'offsets' else idx
+            return
+        opts['data_start'] = self._data_start()
+        opts['format'] = (self.header, self.columns, self.row_type)
+        # When the file has been explored, the data ends at the end of the last row.
+        end = self.frontier if self.length is not None else None
+        ordered = ordered or output == 'indices'
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            tasks = iter([(self.path, a, b, in_quote, opts, condition, output)
+                          for a, b, in_quote in self._ranges(executor, opts, end)])
+            pending = deque()
+            # Number of rows in the ranges before the range being yielded.
+            base = 0
+            try:
+                while True:
+                    # Keep a bounded number of ranges in flight so results do not pile up.
+                    for task in tasks:
+                        pending.append(executor.submit(_filter_chunk, task))
+                        if len(pending) >= 2 * workers:
+                            break
+                    if not pending:
+                        return
+                    if ordered:
+                        future = pending.popleft()
+                    else:
+                        future = next(iter(wait(pending, return_when=FIRST_COMPLETED).done))
+                        pending.remove(future)
+                    matches, count, blank = future.result()
+                    if output == 'indices':
+                        yield from (base + idx for idx in matches)
+                    elif output == 'rows':
+                        yield from map(self._output, matches)
+                    else:
+                        yield from matches
+                    base += count
+                    if blank:
+                        return
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    @_traced
+    def register(self, fields: Hashable or List[Hashable], workers: int = None, lazy: bool = False):
+        """
+        Group rows by the values in a column. See the README.md file for an example. Note that this is also memory
+        efficient in the sense that it only stores pointers and does not store the grouped data in memory. This method
+        only performs the initial mapping of the pointers and does not return rows. To return results, see self.get()
+        or self.__getitem__(). Note that this function cannot be used when header=False or raw_output=True.
+
+        Registration is declarative: once a field is registered, every row explored afterwards (by indexing, slicing,
+        iteration or self.size()) is grouped as it is read. A complete grouping only requires reading the rows that
+        were explored before the field was registered plus the unexplored remainder of the file, so no row is read
+        twice for a field. Several fields registered together share the same pass.
+
+        :param fields: either a hashable (typically a string) or a list of hashables that correspond to column names
+            defined in self.header whose values we would like to group by. Note that each field is grouped independently
+            (see self.where() for conjunctions/disjunctions).
+        :param workers: when greater than 1, the file is scanned by this many worker processes that each handle a
+            byte range of the file (see self.size()). Default is None (serial).
+        :param lazy: when True, only declare the fields and let exploration group the rows incrementally. The grouping
+            is completed the first time it is needed by self.keys(), self.items(), self.get() or a field and key
+            lookup. Default is False (complete the grouping now).
+        """
+        # If the file has a header, rows can be grouped such that the values of a field (column) are keys.
+        assert self.header is not None
+        assert not self.raw_output
+        if not isinstance(fields, list):
+            # Only a single field was provided, put in a list.
+            fields = [fields]
+        if workers is not None and workers > 1 and not lazy:
+            # Rows are regrouped from scratch, so also complete any lazily registered fields.
+            all_fields = fields + [field for field in self.lazy_fields if field not in fields]
+            opts = self._parallel_opts(all_fields)
+            if opts is not None:
+                self._build_index(all_fields, workers, opts)
+                return
+        with self.lock:
+            for field in fields:
+                # Group rows explored from now on.
+                self.field_ptr[field] = {}
+                self.lazy_fields[field] = (self.horizon, self._column(field))
+        if not lazy:
+            self._complete(fields)
+
+    def _capture(self, row: List[str], ptr: int):
+        """
+        Private method to group a newly explored row by each lazily registered field. Must be called with self.lock
+        held.
+
+        :param row: the parsed row.
+        :param ptr: the pointer to the beginning of the row.
+        """
+        for field, (_, col) in self.lazy_fields.items():
+            if col >= len(row):
+                raise KeyError(field)
+            groups = self.field_ptr[field]
+            val = row[col]
+            if val not in groups:
+                groups[val] = self._ptrs([ptr])
+            else:
+                groups[val].append(ptr)
+
+    def _complete(self, fields: List[Hashable]):
+        """
+        Private method to complete the grouping of lazily registered fields. The unexplored remainder of the file is
+        explored (which groups those rows) and the rows explored before the fields were registered are read once to
+        group them as well. The rows are read without holding self.lock, which is only taken to merge the groups.
+
+        :param fields: the fields to complete.
+        """
+        while any(field in self.lazy_fields for field in fields):
+            self._explore()
+            with self.lock:
+                pending = {field: self.lazy_fields[field] for field in fields if field in self.lazy_fields}
+                # Pointer to the first row, fixed once the file has been explored.
+                first = self.row_ptr[0] if self.horizon else None
+            if not pending:
+                # Another thread has completed the fields.
+                return
+            backfill = {field: {} for field in pending}
+            end = max(start for start, _ in pending.values())
+            if end > 0:
+                # Read the rows that were explored before the fields were registered.
+                with self._open_stream() as fp:
+                    fp.seek(first)
+                    rows = _RowReader(self, fp)
+                    for idx in range(end):
+                        ptr = fp.tell()
+                        row = rows.parse()
+                        for field, (start, col) in pending.items():
+                            if idx < start:
+                                if col >= len(row):
+                                    raise KeyError(field)
+                                groups = backfill[field]
+                                val = row[col]
+                                if val not in groups:
+                                    groups[val] = self._ptrs([ptr])
+                                else:
+                                    groups[val].append(ptr)
+            with self.lock:
+                for field, state in pending.items():
+                    if self.lazy_fields.get(field) != state:
+                        # Another thread has completed the field or restarted its grouping meanwhile.
+                        continue
+                    # Pointers of earlier rows come first so every group stays in file order.
+                    groups = backfill[field]
+                    for val, ptrs in self.field_ptr[field].items():
+                        if val not in groups:
+                            groups[val] = ptrs
+                        else:
+                            groups[val].extend(ptrs)
+                    self.field_ptr[field] = groups
+                    self.lazy_fields.pop(field)
+
+    def _groups(self, field: Hashable) -> dict:
+        """
+        Private method to get the complete grouping of a field, registering the field first if necessary.
+
+        :param field: a field (column) name.
+        :return: a dict mapping the values of the field to arrays of row pointers.
+        """
+        if field not in self.field_ptr:
+            self.register(field, lazy=True)
+        if field in self.lazy_fields:
+            self._complete([field])
+        return self.field_ptr[field]
+
+    @property
+    def fields(self) -> KeysView:
+        """
+        Gets a dict_keys object corresponding the fields (columns) that have been grouped by the self.register() method.
+
+        :return: fields (columns) that have been registered.
+        """
+        return self.field_ptr.keys()
+        
+    def keys(self, field: Hashable) -> KeysView:
+        """
+        Gets a dict_keys object corresponding to the unique values of the field (column) that has been used to key a
+        grouping by the self.register() method.
+
+        :return: keys of a registered field (column).
+        """
+        return self._groups(field).keys()
+        
+    @property
+    def cols(self) -> List[Hashable]:
+        """
+        Get the header that defines the columns of the file.
+
+        :return: the header of the file.
+        """
+        return self.header
+        
+    def get(self, field: Hashable, key: str, default: Any = None) -> GenericGenType or Any:
+        """
+        Get a row by field (column) and key provided a key has been registered by self.register() method.
+
+        :param field: typically a string that matches an element of the header.
+        :param key: one of the unique values in the field (column) of the file defined by field that is used as a key in
+            the grouping by the self.register() method.
+        :param default: value to return if key does not exist. Default is None.
+        :return: either returns the matching rows or a default value.
+        """
+        if key not in self.keys(field):
+            # If the key does not exist for a given field, return the default.
+            return default
+        else:
+            # Key exists, return the value.
+            return self.__getitem__((field, key))
+
+    def items(self, field: Hashable) -> Generator[Tuple[str, GenericGenType], None, None]:
+        """
+        Get a generator over key/value pairs for a given registered field by the self.register() method.
+
+        :param field: typically a string that matches an element of the header.
+        :yield: returns a generator that iterates over a tuple of key/value pairs.
+        """
+        # Should be thread safe because content of self.field_ptr[field] should not change once completely grouped.
+        for key in self._groups(field):
+            yield key, self.__getitem__((field, key))
+        
+    def _seek_data_start(self, fp: TextIO) -> int:
+        """
+        Private method to move a file pointer past the skipped rows and the header to the first row of data.
+
+        :param fp: a file pointer.
+        :return: the pointer to the first row of data.
+        """
+        fp.seek(0)
+        for _ in range(self.skip):
+            fp.readline()
+        if self.file_has_header:
+            self._readrow(fp)
+        return fp.tell()
+
+    def _data_start(self) -> int:
+        """
+        Private method to get the pointer to the first row of data through a file pointer borrowed from self.handles.
+        Where row pointers are byte offsets, a binary reader is used instead since the tell() cookie of a text mode file
+        pointer after a lone carriage return carries the state of the decoder.
+
+        :return: the pointer to the first row of data.
+        """
+        if self._byte_offsets():
+            with self._open_stream() as fp:
+                return self._seek_data_start(fp)
+        fp = self.handles.acquire()
+        try:
+            return self._seek_data_start(fp)
+        finally:
+            self.handles.release(fp)
+
+    def _column(self, field: Hashable) -> int:
+        """
+        Private method to get the column of a field of the header (see _column()).
+
+        :param field: a field (column) name.
+        :return: the index of the column.
+        """
+        return _column(self.header, field)
+
+    def _dialect_params(self) -> dict:
+        """
+        Private method to resolve self.dialect and self.fmtparams into the complete set of csv formatting parameters.
+
+        :return: a dict of keyword arguments accepted by csv.reader().
+        """
+        dialect = csv.reader([], self.dialect, **self.fmtparams).dialect
+        return {k: getattr(dialect, k) for k in ('delimiter', 'doublequote', 'escapechar', 'lineterminator',
+                                                 'quotechar', 'quoting', 'skipinitialspace', 'strict')}
+
+    def _byte_offsets(self) -> bool:
+        """
+        Private method to check whether the row pointers of this instance are plain byte offsets into the file and
+        whether a newline byte always terminates a line. This holds for the common ASCII compatible encodings and is
+        required to locate rows by scanning the file in binary mode. Like text mode file pointers, the binary line
+        readers end a line at a lone carriage return under universal newlines.
+
+        :return: True if rows can be located in binary mode.
+        """
+        try:
+            encoding = codecs.lookup(self.encoding).name
+        except LookupError:
+            return False
+        return encoding in BYTE_OFFSET_ENCODINGS and self.open_opts.get('newline') in (None, '', '\n')
+
+    def _ptrs(self, ptrs: List[int] = ()) -> array or list:
+        """
+        Private method to create a container of pointers. Byte offsets are stored in a typed int64 array, whereas the
+        tell() cookies of text mode file pointers are kept in a list since they carry the state of the decoder in
+        their high bits and can exceed 64 bits.
+
+        :param ptrs: an iterable of pointers. Default is empty.
+        :return: a typed array or a list of pointers.
+        """
+        return array('q', ptrs) if self.compact_ptrs else list(ptrs)
+
+    def _parallel_opts(self, fields: List[Hashable]) -> dict or None:
+        """
+        Private method to prepare the parsing options passed to the worker processes of the parallel index builder.
+
+        :param fields: the fields (columns) to group rows by.
+        :return: a dict of options or None if the file cannot be indexed in parallel, in which case the serial path
+            must be used.
+        """
+        if self.reformat is not _passthrough or not self._byte_offsets() or self.gzip is not None:
+            return None
+        dialect = self._dialect_params()
+        if self.raw_output or dialect['quoting'] == csv.QUOTE_NONE or dialect['quotechar'] is None:
+            quote = None
+        elif dialect['escapechar'] is None:
+            quote = dialect['quotechar'].encode('ascii')
+        else:
+            # An escaped quote character does not toggle the quoting state so quote parity cannot be used.
+            return None
+        columns = {field: self._column(field) for field in fields}
+        return {
+            'quote': quote,
+            'columns': columns,
+            'raw_output': self.raw_output,
+            'dialect': dialect,
+            'encoding': self.encoding,
+            'errors': self.open_opts.get('errors', 'strict'),
+            'translate': self.open_opts.get('newline') is None,
+            'split_cr': self.open_opts.get('newline') in (None, ''),
+        }
+
+    def _ranges(self, executor: ProcessPoolExecutor, opts: dict, end: int = None) -> List[Tuple[int, int, int]]:
+        """
+        Private method to split the data of the file into byte ranges of PARALLEL_CHUNK_SIZE bytes and resolve the
+        quoting state at the start of each range from the parity of quote characters in the preceding ranges.
+
+        :param executor: the pool of worker processes that counts the quote characters.
+        :param opts: parsing options from self._parallel_opts() including the offset of the first row of data.
+        :param end: the offset at which the data ends. Default is None (the size of the file).
+        :return: a list of (start, end, in_quote) tuples.
+        """
+        size = os.path.getsize(self.path) if end is None else end
+        bounds = list(range(opts['data_start'], size, PARALLEL_CHUNK_SIZE)) + [size]
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+        in_quote = [0] * len(ranges)
+        if opts['quote'] is not None:
+            parities = executor.map(_count_quotes, [(self.path, a, b, opts['quote']) for a, b in ranges])
+            for i, parity in enumerate(parities):
+                if i + 1 < len(ranges):
+                    in_quote[i + 1] = in_quote[i] ^ parity
+        return [(a, b, in_quote[i]) for i, (a, b) in enumerate(ranges)]
+
+    def _build_index(self, fields: List[Hashable], workers: int, opts: dict):
+        """
+        Private method to build the row pointers and optionally group rows by fields using a pool of worker processes.
+        The file is split into byte ranges of PARALLEL_CHUNK_SIZE bytes. The quoting state at the start of each range
+        is resolved from the parity of quote characters in the preceding ranges, after which each worker locates the
+        rows that start in its range. The results are identical to scanning the file serially.
+
+        :param fields: the fields (columns) to group rows by, may be empty.
+        :param workers: number of worker processes.
+        :param opts: parsing options from self._parallel_opts().
+        """
+        opts['data_start'] = self._data_start()
+        row_ptr = array('q')
+        fields_to_vals = {field: {} for field in fields}
+        # The data ends at the end of the file unless an empty row is found.
+        frontier = os.path.getsize(self.path)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            tasks = [(self.path, a, b, in_quote, opts) for a, b, in_quote in self._ranges(executor, opts, frontier)]
+            # Merge the rows of each range in file order, stopping at the first empty row like the serial path.
+            length = 0
+            for starts, blank, groups in executor.map(_scan_chunk, tasks):
+                if blank >= 0:
+                    frontier = starts[blank]
+                starts = starts if blank < 0 else starts[:blank]
+                # Only keep the pointers of checkpoint rows.
+                row_ptr.extend(starts[-length % self.checkpoint::self.checkpoint])
+                length += len(starts)
+                for field, vals in groups.items():
+                    for val, ptrs in vals.items():
+                        if val not in fields_to_vals[field]:
+                            fields_to_vals[field][val] = ptrs
+                        else:
+                            fields_to_vals[field][val].extend(ptrs)
+                if blank >= 0:
+                    break
+        with self.lock:
+            if self.counters is not None:
+                self.counters.add('rows_explored', length - self.horizon)
+            self.row_ptr = row_ptr
+            for field in fields_to_vals:
+                self.field_ptr[field] = fields_to_vals[field]
+                self.lazy_fields.pop(field, None)
+            for field, (_, col) in self.lazy_fields.items():
+                # Fields lazily registered while the workers ran are grouped again from the new horizon.
+                self.field_ptr[field] = {}
+                self.lazy_fields[field] = (length, col)
+            self.length = length
+            self.horizon = length
+            self.frontier = frontier
+
+    def memory_usage(self) -> dict:
+        """
+        Report the approximate memory used by the pointers stored in this instance, in bytes. The report also includes
+        the memory the same pointers would need if they were stored as lists of Python ints.
+
+        :return: a dict with the keys 'row_ptr' (row pointers), 'field_ptr' (pointers of registered fields including
+            the dicts that map keys to pointers), 'range_ptr' (values and pointers of range registered fields),
+            'total', 'pointers' (number of stored pointers), and 'list_equivalent' (estimated total if the pointers were
+            lists of Python ints).
+        """
+        row_ptr = self.row_ptr
+        row_bytes = sys.getsizeof(row_ptr)
+        field_bytes = 0
+        pointers = len(row_ptr)
+        list_bytes = sys.getsizeof([]) + 8 * len(row_ptr)
+        for keys in list(self.field_ptr.values()):
+            field_bytes += sys.getsizeof(keys)
+            for key, ptrs in list(keys.items()):
+                field_bytes += sys.getsizeof(key) + sys.getsizeof(ptrs)
+                pointers += len(ptrs)
+                list_bytes += sys.getsizeof(key) + sys.getsizeof([]) + 8 * len(ptrs)
+            list_bytes += sys.getsizeof(keys)
+        range_bytes = 0
+        for vals, ptrs in list(self.range_ptr.values()):
+            range_bytes += sys.getsizeof(vals) + sys.getsizeof(ptrs)
+            pointers += len(ptrs)
+            list_bytes += sys.getsizeof(vals) + sys.getsizeof([]) + 8 * len(ptrs)
+        # Large ints are separate objects in a list whereas an array stores them inline.
+        list_bytes += pointers * sys.getsizeof(1 << 32)
+        return {
+            'row_ptr': row_bytes,
+            'field_ptr': field_bytes,
+            'range_ptr': range_bytes,
+            'total': row_bytes + field_bytes + range_bytes,
+            'pointers': pointers,
+            'list_equivalent': list_bytes,
+        }
+
+    def _fingerprint(self) -> dict:
+        """
+        Private method to fingerprint the opened file by its size, modification time and a digest of the bytes at the
+        head and tail of the file. Used to check that a sidecar index still describes the file.
+
+        :return: a JSON serializable dict describing the file.
+        """
+        stat = os.stat(self.path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': self._digest(stat.st_size)}
+
+    def _digest(self, size: int) -> str:
+        """
+        Private method to digest the bytes at the head and tail of the first size bytes of the file.
+
+        :param size: the number of bytes at the beginning of the file to digest.
+        :return: a hex digest.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(self.path, 'rb') as fp:
+            digest.update(fp.read(min(size, FINGERPRINT_BLOCK)))
+            if size > FINGERPRINT_BLOCK:
+                fp.seek(max(FINGERPRINT_BLOCK, size - FINGERPRINT_BLOCK))
+                digest.update(fp.read(size - max(FINGERPRINT_BLOCK, size - FINGERPRINT_BLOCK)))
+        return digest.hexdigest()
+
+    def _index_settings(self) -> dict:
+        """
+        Private method to collect the options that determine where rows begin and how they are parsed. A sidecar index
+        is only valid for a Navigator with identical settings.
+
+        :return: a JSON serializable dict of settings.
+        """
+        return {
+            'skip': self.skip,
+            'header': self.file_has_header,
+            'raw_output': self.raw_output,
+            'checkpoint': self.checkpoint,
+            # Resolve the dialect so that equivalent dialect names and fmtparams compare equal.
+            'dialect': self._dialect_params(),
+            'open_opts': {k: self.open_opts.get(k) for k in ('encoding', 'errors', 'newline')},
+        }
+
+    def save_index(self, path: str = None):
+        """
+        Write the row pointers, number of rows, header and registered fields explored so far to a compact binary
+        sidecar file so that another process can restore them with self.load_index() (or the index_path argument of
+        the constructor) instead of rescanning the file. The index is tied to the current contents of the file and to
+        the skip, header, raw_output, dialect and fmtparams settings of this instance. Raises OverflowError if a
+        pointer does not fit in 64 bits, which can happen to the tell() cookies of text mode file pointers (see
+        self._ptrs()).
+
+        :param path: path of the sidecar file. Default is self.index_path or, if that is None, self.path + '.idx'.
+        """
+        path = path if path else (self.index_path if self.index_path else self.path + '.idx')
+        with self.lock:
+            # Copy the row pointers so that exploration by other threads does not change them while writing.
+            row_ptr = self.row_ptr[:]
+            fields = []
+            groups = []
+            for field, keys in self.field_ptr.items():
+                if field in self.lazy_fields:
+                    # Only completely grouped fields are saved.
+                    continue
+                fields.append([field, [[key, len(ptrs)] for key, ptrs in keys.items()]])
+                groups.extend(keys.values())
+            meta = {
+                'fingerprint': self._fingerprint(),
+                'settings': self._index_settings(),
+                'byteorder': sys.byteorder,
+                'header': self.header,
+                'horizon': self.horizon,
+                'length': self.length,
+                'frontier': self.frontier,
+                'rows': len(row_ptr),
+                'fields': fields,
+                'gzip_members': None if self.gzip is None else self.gzip.members(),
+            }
+        meta = json.dumps(meta).encode('utf-8')
+        # Pointers kept in lists are written as int64 too, which raises an OverflowError if a text mode cookie does not
+        # fit (see self._ptrs()).
+        arrays = [ptrs if isinstance(ptrs, array) else array('q', ptrs) for ptrs in [row_ptr] + groups]
+        # Write to a temporary file first so that readers never observe a partially written index.
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as fp:
+            fp.write(INDEX_PREFIX.pack(INDEX_MAGIC, INDEX_VERSION, len(meta)))
+            fp.write(meta)
+            for ptrs in arrays:
+                ptrs.tofile(fp)
+        os.replace(tmp_path, path)
+
+    def load_index(self, path: str = None):
+        """
+        Restore the row pointers, number of rows, header and registered fields from a sidecar file written by
+        self.save_index(). Raises IndexMismatchError if the sidecar is not a valid index, if the file has changed since
+        the index was written, or if the index was built with different parsing settings.
+
+        :param path: path of the sidecar file. Default is self.index_path or, if that is None, self.path + '.idx'.
+        """
+        path = path if path else (self.index_path if self.index_path else self.path + '.idx')
+        with open(path, 'rb') as fp:
+            prefix = fp.read(INDEX_PREFIX.size)
+            if len(prefix) < INDEX_PREFIX.size:
+                raise IndexMismatchError(f'{path} is not a csvnav index file.')
+            magic, version, meta_len = INDEX_PREFIX.unpack(prefix)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                raise IndexMismatchError(f'{path} is not a csvnav index file of version {INDEX_VERSION}.')
+            try:
+                meta = json.loads(fp.read(meta_len).decode('utf-8'))
+                if meta['fingerprint'] != self._fingerprint():
+                    raise IndexMismatchError(f'{self.path} has changed since the index {path} was written.')
+                if meta['settings'] != json.loads(json.dumps(self._index_settings())):
+                    raise IndexMismatchError(f'The index {path} was written with different settings than this '
+                                             f'Navigator.')
+                swap = meta['byteorder'] != sys.byteorder
+                header, horizon, length = meta['header'], meta['horizon'], meta['length']
+                # The pointer arrays must fill the rest of the sidecar exactly.
+                counts = [meta['rows']] + [count for _, keys in meta['fields'] for _, count in keys]
+                if min(counts) < 0 or 8 * sum(counts) != os.fstat(fp.fileno()).st_size - fp.tell():
+                    raise IndexMismatchError(f'The index {path} is truncated or corrupt.')
+                row_ptr = array('q')
+                row_ptr.fromfile(fp, meta['rows'])
+                field_ptr = {}
+                for field, keys in meta['fields']:
+                    field_ptr[field] = {}
+                    for key, count in keys:
+                        ptrs = array('q')
+                        ptrs.fromfile(fp, count)
+                        field_ptr[field][key] = ptrs
+            except (ValueError, EOFError, KeyError, TypeError) as e:
+                # Truncated or corrupt metadata (json.JSONDecodeError and UnicodeDecodeError are ValueErrors).
+                raise IndexMismatchError(f'The index {path} is truncated or corrupt: {e}') from e
+        for ptrs in [row_ptr] + [ptrs for keys in field_ptr.values() for ptrs in keys.values()]:
+            if swap:
+                ptrs.byteswap()
+        if not self.compact_ptrs:
+            row_ptr = self._ptrs(row_ptr)
+            field_ptr = {field: {key: self._ptrs(ptrs) for key, ptrs in keys.items()}
+                         for field, keys in field_ptr.items()}
+        with self.lock:
+            self.row_ptr = row_ptr
+            for field, keys in field_ptr.items():
+                self.field_ptr[field] = keys
+                self.lazy_fields.pop(field, None)
+            for field, (_, col) in self.lazy_fields.items():
+                # Lazily registered fields that are not in the index are grouped again from the restored horizon.
+                self.field_ptr[field] = {}
+                self.lazy_fields[field] = (horizon, col)
+            if header is not None:
+                self.header = header
+            self.horizon = horizon
+            self.length = length
+            self.frontier = meta.get('frontier')
+        if self.gzip is not None and meta.get('gzip_members'):
+            for offset, position in meta['gzip_members']:
+                self.gzip.add(offset, position)
+
+    def _open_stream(self) -> TextIO or _BinaryLineReader:
+        """
+        Private method to open a new file pointer for reading the file forward with a large buffer. Where row pointers
+        are byte offsets, the file is read in binary mode and lines are decoded individually so that tell() is free.
+
+        :return: a file pointer.
+        """
+        if self.mapping is not None or self.gzip is not None:
+            return self._open_fp()
+        if self._byte_offsets():
+            fp = _BinaryLineReader(open(self.path, 'rb', buffering=STREAM_BUFFER_SIZE), self.encoding,
+                                   self.open_opts.get('errors'), self.open_opts.get('newline'))
+        else:
+            fp = open(self.path, 'r', **{'buffering': STREAM_BUFFER_SIZE, **self.open_opts})
+        return fp if self.counters is None else _CountingFile(fp, self.counters)
+
+    def _explore(self, index: int = None, fp: TextIO = None):
+        """
+        Private method to explore unexplored rows, storing a pointer to each checkpoint row (every row unless
+        checkpoint > 1), until the row at index has been explored or the end of the file is reached. Only one thread
+        explores at a time. Rows are explored in chunks of EXPLORE_CHUNK_SIZE rows and self.lock is released after each
+        chunk, so other threads can read explored rows, and threads waiting for rows of a chunk that has been explored
+        proceed, while the exploration continues. Where every row is a single line, chunks are found by scanning blocks
+        of bytes for newlines instead (see self._scan_lines()).
+
+        :param index: the row index to explore up to (inclusive). Default is None (explore to the end of the file).
+        :param fp: a file pointer to explore with when row pointers are not byte offsets. Default is None (borrow one
+            from self.handles).
+        """
+        with self.lock:
+            while not self._explored(index) and self.exploring:
+                # Another thread is exploring, wait until it has published the requested rows or stopped.
+                self.progress.wait()
+            if self._explored(index):
+                return
+            self.exploring = True
+        borrowed = None
+        try:
+            if self._byte_offsets():
+                # Explore through a binary file pointer whose tell() is free.
+                if self.explorer is None or self.explorer.closed:
+                    self.explorer = self._open_stream()
+                fp = self.explorer
+            elif fp is None:
+                fp = borrowed = self.handles.acquire()
+            checkpoint = self.checkpoint
+            # Pointers are only needed for checkpoint rows, avoid the expensive tell() of text files for other rows.
+            cheap_tell = getattr(fp, 'cheap_tell', False)
+            rows = _RowReader(self, fp)
+            # The row index fp is positioned at, unknown until fp has been positioned.
+            position = None
+            ptr = None
+            # Whether rows can be found by scanning for newlines and whether the next chunk is scanned (rows that the
+            # scan stopped at are parsed).
+            scan = self._scan_options()
+            scan_next = True
+            while True:
+                with self.lock:
+                    if self._explored(index):
+                        break
+                    start = self.horizon
+                    if position != start:
+                        # Position fp at the first unexplored row (another thread may have explored rows, e.g. by
+                        # iterating, since the previous chunk).
+                        if start == 0:
+                            # We have not explored anything yet, start from the beginning and skip non-data.
+                            ptr = self._seek_data_start(fp)
+                        elif self.frontier is not None:
+                            # Go to the pointer just past the last explored row.
+                            ptr = fp.seek(self.frontier)
+                        else:
+                            # Go to the last known row pointer and advance the pointer past the explored rows.
+                            fp.seek(self.row_ptr[-1])
+                            for _ in range(start - (len(self.row_ptr) - 1) * checkpoint):
+                                rows.parse()
+                            ptr = fp.tell()
+                    lazy = self.lazy_fields
+                    scanned = 0
+                    if scan is not None and scan_next and not lazy:
+                        ptr = fp.tell() if ptr is None else ptr
+                        scanned, scan_next = self._scan_lines(fp, ptr, index, scan)
+                        if not scan_next and scanned < EXPLORE_CHUNK_SIZE:
+                            # Rows that cannot be scanned are frequent, parse the remaining rows one by one.
+                            scan = None
+                        if scanned:
+                            # fp is no longer positioned at a row.
+                            position = ptr = None
+                        else:
+                            ptr = fp.seek(ptr)
+                    else:
+                        scan_next = True
+                    if not scanned:
+                        stop = start + EXPLORE_CHUNK_SIZE
+                        stop = stop if index is None else min(stop, index + 1)
+                        while self.horizon < stop:
+                            if ptr is None and (cheap_tell or self.horizon % checkpoint == 0 or lazy):
+                                ptr = fp.tell()
+                            row = rows.parse()
+                            if row:
+                                # An unexplored line has been found, store the pointer to this newly explored row if it
+                                # is a checkpoint, group it by any lazily registered fields and advance the horizon.
+                                if self.horizon % checkpoint == 0:
+                                    self.row_ptr.append(ptr)
+                                if lazy:
+                                    self._capture(row, ptr)
+                                ptr = None
+                                self.horizon += 1
+                            else:
+                                # The end of the file has been reached. Set the row length of the file.
+                                self.length = self.horizon
+                                break
+                        # Store the pointer to the next unexplored row (if it is known when the end of the file was
+                        # reached).
+                        self.frontier = fp.tell() if self.length is None else ptr
+                        position = self.horizon
+                    # Wake the threads waiting for the explored rows.
+                    if self.counters is not None:
+                        self.counters.add('rows_explored', self.horizon - start)
+                    self.progress.notify_all()
+        finally:
+            if borrowed is not None:
+                self.handles.release(borrowed)
+            with self.lock:
+                self.exploring = False
+                self.progress.notify_all()
+
+    def _scan_options(self) -> dict or None:
+        """
+        Private method to check whether rows can be explored by scanning blocks of bytes for newlines rather than by
+        reading them one by one (see self._scan_lines()). This requires row pointers that are byte offsets and rows that
+        are single lines: raw_output is True, or rows are parsed as csv without a reformat function or lazily registered
+        fields. Unlike parsing, scanning does not decode the rows so encoding errors are only raised when the rows are
+        read.
+
+        :return: a dict with the keys 'stops' (bytes that make a row span several lines or fail to parse, the scan stops
+            before the lines that contain them), 'csv' (whether blank lines end the scan), 'cr' (whether carriage
+            returns that do not end a line end the scan) and 'limit' (the length of a line in bytes the scan stops at,
+            if any), or None if rows cannot be scanned.
+        """
+        if not self._byte_offsets():
+            return None
+        if self.raw_output:
+            # Under universal newlines a lone carriage return ends a line, which is left to the line reader.
+            split_cr = self.open_opts.get('newline') in (None, '')
+            return {'stops': [], 'csv': False, 'cr': split_cr, 'limit': self.char_lim}
+        if self.reformat is not _passthrough or self.lazy_fields:
+            return None
+        params = self._dialect_params()
+        stops = [b'\x00']
+        if params['quoting'] != csv.QUOTE_NONE and params['quotechar']:
+            stops.append(params['quotechar'].encode(self.encoding))
+        if params['escapechar']:
+            stops.append(params['escapechar'].encode(self.encoding))
+        # Longer lines may exceed the field size limit of the csv module.
+        limit = csv.field_size_limit() if not self.char_lim else min(self.char_lim, csv.field_size_limit())
+        return {'stops': stops, 'csv': True, 'cr': True, 'limit': limit}
+
+    def _scan_lines(self, fp: _BinaryLineReader, ptr: int, index: int or None, scan: dict) -> Tuple[int, bool]:
+        """
+        Private method to explore the rows in a block of SCAN_BLOCK_SIZE bytes at ptr by finding the newlines in the
+        block, without reading or parsing the rows one by one. The scan stops before the first line that has to be
+        parsed: a line that contains one of scan['stops'], a blank line when rows are csv, a lone carriage return (see
+        self._scan_options()), a line of at least scan['limit'] bytes and the incomplete last line of the block (or
+        file). Must be called while holding self.lock.
+
+        :param fp: the file pointer used for exploration.
+        :param ptr: the pointer to the first unexplored row.
+        :param index: the row index to explore up to (inclusive). None to scan the whole block.
+        :param scan: options from self._scan_options().
+        :return: a tuple of the number of rows explored and whether the block was scanned up to its last line or up to
+            index, i.e. False if the next row has to be parsed.
+        """
+        block = fp.read_block(ptr, SCAN_BLOCK_SIZE)
+        end = block.rfind(b'\n') + 1
+        complete = True
+        cuts = [block.find(stop, 0, end) for stop in scan['stops']]
+        if scan['csv']:
+            # A blank line is parsed as an empty row, which ends the data.
+            if block.startswith(b'\n') or block.startswith(b'\r\n'):
+                cuts.append(0)
+            blanks = (block.find(b'\n\n', 0, end), block.find(b'\n\r\n', 0, end))
+            cuts.extend(blank + 1 for blank in blanks if blank >= 0)
+        if scan['cr'] and b'\r' in block and block.count(b'\r', 0, end) != block.count(b'\r\n', 0, end):
+            cuts.append(LONE_CR.search(block, 0, end).start())
+        cuts = [cut for cut in cuts if cut >= 0]
+        if cuts:
+            # Only scan the lines before the line of the first cut.
+            end = block.rfind(b'\n', 0, min(cuts)) + 1
+            complete = False
+        if end == 0:
+            return 0, False
+        lines = block[:end - 1].split(b'\n')
+        if index is not None:
+            del lines[index + 1 - self.horizon:]
+        limit = scan['limit']
+        if limit and max(map(len, lines)) + 1 >= limit:
+            # Leave long lines to the parser, which raises the appropriate error.
+            del lines[next(i for i, line in enumerate(lines) if len(line) + 1 >= limit):]
+            complete = False
+        if not lines:
+            return 0, False
+        # The pointer of each row is ptr plus the lengths of the preceding lines and their newlines.
+        starts = list(map(add, accumulate(map(len, lines), initial=ptr), count()))
+        self.frontier = starts.pop()
+        self.row_ptr.extend(starts[-self.horizon % self.checkpoint::self.checkpoint])
+        self.horizon += len(lines)
+        return len(lines), complete
+
+    def _explored(self, index: int or None) -> bool:
+        """
+        Private method to check whether the row at index (or every row when index is None) has been explored.
+
+        :param index: a row index or None.
+        :return: True if the row has been explored.
+        """
+        return self.length is not None or (index is not None and index < self.horizon)
+
+    def refresh(self) -> int:
+        """
+        Pick up rows appended to the file since it was opened or last refreshed. Growth is detected by the size of the
+        file, and the head and tail of the part of the file that has already been indexed are checked to be unchanged.
+        Only the appended bytes are read: the row pointers, length, registered fields (lazy or not) and range indexes
+        are extended with the new rows. If the end of the file has not been explored yet, nothing is read and the new
+        rows are explored when they are accessed. A last row that did not end with a newline may have been cut off by a
+        writer, so it is dropped and read again. Cached rows stay valid since the indexed part of the file has not
+        changed.
+
+        :return: the number of rows added to the explored rows (negative if a cut off last row was dropped and nothing
+            was appended after it yet).
+        """
+        size, digest = self.watermark
+        new_size = os.path.getsize(self.path)
+        if new_size < size or self._digest(size) != digest:
+            raise IndexMismatchError(f'{self.path} has been modified other than by appending rows.')
+        if new_size == size:
+            return 0
+        if self.mapping is not None:
+            self._remap()
+        fields = [field for field in self.field_ptr if field not in self.lazy_fields]
+        with self.lock:
+            self.watermark = (new_size, self._digest(new_size))
+            self.char_len = None
+            if self.length is None:
+                # The end of the file has not been explored, exploration finds the appended rows when it gets there.
+                return 0
+            horizon = self.horizon
+            if self._cut_off():
+                self._drop_last()
+            # Continue exploring where the end of the file was found.
+            self.length = None
+            start = self.horizon
+            # Group the new rows of the completely grouped fields during exploration as well (no rows of these fields
+            # need to be backfilled).
+            for field in fields:
+                self.lazy_fields[field] = (0, self._column(field))
+        try:
+            self._explore()
+        finally:
+            self._complete(fields)
+        if self.range_ptr and self.length > start:
+            self._extend_ranges(start)
+        return self.horizon - horizon
+
+    def follow(self, start: int = None, interval: float = 1.0) -> GenericGenType:
+        """
+        Get a generator that yields the rows of the file and then waits for rows to be appended, like tail -f. The file
+        is refreshed (see self.refresh()) every interval seconds while there are no new rows. A last row that does not
+        end with a newline yet is only yielded once it is complete. The generator never ends by itself.
+
+        :param start: the index of the first row to yield. Default is None (only rows appended from now on).
+        :param interval: the number of seconds to wait between refreshes. Default is 1.0.
+        :yield: either string, list, or dictionary of a row.
+        """
+        idx = self.size(force=True) if start is None else start
+        while True:
+            stop = self.size(force=True)
+            if stop > 0 and self._cut_off():
+                # The last row may still be written.
+                stop -= 1
+            if idx < stop:
+                yield from self._forward(idx, stop)
+                idx = stop
+            else:
+                time.sleep(interval)
+                self.refresh()
+
+    def _cut_off(self) -> bool:
+        """
+        Private method to check whether the last row of a completely explored file does not end with a newline, in which
+        case a writer may not have finished it. Only detected when the row pointers are byte offsets.
+
+        :return: True if the last row does not end with a newline.
+        """
+        if not self.horizon or self.frontier is None or not self._byte_offsets():
+            return False
+        with self._open_stream() if self.gzip is not None else open(self.path, 'rb') as fp:
+            fp.seek(self.frontier - 1)
+            return fp.read(1) != b'\n'
+
+    def _drop_last(self):
+        """
+        Private method to remove the last explored row from the row pointers, registered fields and range indexes so
+        that it is explored again. Must be called with self.lock held.
+        """
+        idx = self.horizon - 1
+        ptr = self._row_pointer(idx)
+        if idx % self.checkpoint == 0:
+            self.row_ptr.pop()
+        for field, groups in self.field_ptr.items():
+            for val, ptrs in groups.items():
+                if ptrs and ptrs[-1] == ptr:
+                    ptrs.pop()
+                    if not ptrs:
+                        del groups[val]
+                    break
+            if field in self.lazy_fields:
+                # The row is grouped again when it is explored.
+                start, col = self.lazy_fields[field]
+                self.lazy_fields[field] = (min(start, idx), col)
+        for field, (vals, ptrs) in self.range_ptr.items():
+            if ptr in ptrs:
+                pos = ptrs.index(ptr)
+                del vals[pos]
+                del ptrs[pos]
+        if self.cache is not None:
+            self.cache.discard(ptr)
+        self.horizon = idx
+        self.frontier = ptr
+
+    def _row_pointer(self, index: int) -> int:
+        """
+        Private method to get the pointer of an explored row, parsing forward from the nearest checkpoint if necessary.
+
+        :param index: the row index.
+        :return: the pointer to the beginning of the row.
+        """
+        if self.checkpoint == 1:
+            return self.row_ptr[index]
+        with self._open_stream() as fp:
+            fp.seek(self.row_ptr[index // self.checkpoint])
+            rows = _RowReader(self, fp)
+            for _ in range(index % self.checkpoint):
+                rows.parse()
+            return fp.tell()
+
+    def _extend_ranges(self, start: int):
+        """
+        Private method to add the rows from start on to the range indexes (see self.register_range()).
+
+        :param start: the index of the first new row.
+        """
+        cols = {field: self._column(field) for field in self.range_ptr}
+        new = {field: [] for field in cols}
+        with self._open_stream() as fp:
+            fp.seek(self._row_pointer(start))
+            rows = _RowReader(self, fp)
+            scanned = []
+            for _ in range(self.length - start):
+                ptr = fp.tell()
+                scanned.append((ptr, rows.parse()))
+                if len(scanned) >= RANGE_RUN_SIZE:
+                    for field, col in cols.items():
+                        new[field].extend(_range_pairs(scanned, field, col, self.range_keys[field]))
+                    scanned = []
+            for field, col in cols.items():
+                new[field].extend(_range_pairs(scanned, field, col, self.range_keys[field]))
+        with self.lock:
+            for field, pairs in new.items():
+                if not pairs:
+                    continue
+                pairs.sort()
+                vals, ptrs = self.range_ptr[field]
+                if not ptrs or pairs[0] >= (vals[-1], ptrs[-1]):
+                    # The new values do not precede any indexed value (e.g. timestamps), append them.
+                    new_vals, new_ptrs = _range_arrays(pairs, self._ptrs())
+                    if isinstance(vals, array) and not isinstance(new_vals, array):
+                        vals = list(vals)
+                    vals.extend(new_vals)
+                    ptrs.extend(new_ptrs)
+                    self.range_ptr[field] = (vals, ptrs)
+                else:
+                    self.range_ptr[field] = _range_arrays(heapq.merge(zip(vals, ptrs), pairs), self._ptrs())
+
+    def _remap(self):
+        """
+        Private method to map the file again after it has grown and point the readers of the mmap engine at the new
+        map. The old map is left to the readers that may still be using it.
+        """
+        with self.lock:
+            with open(self.path, 'rb') as fp:
+                size = os.fstat(fp.fileno()).st_size
+                self.mapping = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            for fp in list(self.fps.values()) + self.handles.handles() + [self.explorer]:
+                fp = fp.fp if isinstance(fp, _CountingFile) else fp
+                if isinstance(fp, _MmapLineReader):
+                    fp.mapping = self.mapping
+
+    def _stream(self) -> GenericGenType:
+        """
+        Private method to read the rows of the file in a single forward pass. Unlike indexing, rows are read one after
+        another through a dedicated file pointer with a large buffer and are never seeked to individually. Pointers to
+        unexplored rows are stored along the way so the pass also explores the file, and the length of the file is set
+        once the end of the file is reached.
+
+        :yield: a string, list, or dictionary of a row.
+        """
+        with self._open_stream() as fp:
+            if self.horizon > 0:
+                ptr = fp.seek(self.row_ptr[0])
+            else:
+                ptr = self._seek_data_start(fp)
+            checkpoint = self.checkpoint
+            cheap_tell = getattr(fp, 'cheap_tell', False)
+            rows = _RowReader(self, fp)
+            idx = 0
+            while self.length is None or idx < self.length:
+                if idx < self.horizon:
+                    # The row has already been explored.
+                    row = rows.parse()
+                else:
+                    if ptr is None and (cheap_tell or idx % checkpoint == 0 or self.lazy_fields):
+                        ptr = fp.tell()
+                    row = rows.parse()
+                    with self.lock:
+                        if self.horizon == idx and self.length is None:
+                            if row:
+                                # Store the pointer to the newly explored row if it is a checkpoint and group it by
+                                # any lazily registered fields.
+                                if idx % checkpoint == 0:
+                                    self.row_ptr.append(ptr)
+                                if self.lazy_fields:
+                                    self._capture(row, ptr)
+                                self.horizon += 1
+                                self.frontier = fp.tell() if cheap_tell else None
+                                if self.counters is not None:
+                                    self.counters.add('rows_explored')
+                            else:
+                                # The end of the file has been reached.
+                                self.length = self.horizon
+                                self.frontier = ptr
+                ptr = None
+                if not row:
+                    break
+                yield self._output(row)
+                idx += 1
+
+    def _read_sparse(self, fp: TextIO, rows: _RowReader, index: int, cur: int = None) -> Tuple[GenericRowType, int]:
+        """
+        Private method to read a row when only every self.checkpoint-th row pointer is stored. Moves to the nearest
+        checkpoint at or before the row and parses forward to it, unless fp is already positioned at a row between the
+        checkpoint and the requested row.
+
+        :param fp: a file pointer.
+        :param rows: the _RowReader of fp.
+        :param index: the row index.
+        :param cur: the index of the row fp is positioned at, if known. Default is None.
+        :return: a tuple of the row and the index of the row fp is positioned at afterwards.
+        """
+        offset = index % self.checkpoint
+        if cur is None or not 0 <= index - cur <= offset:
+            # Move to the checkpoint.
+            fp.seek(self.row_ptr[index // self.checkpoint])
+            cur = index - offset
+        for _ in range(index - cur):
+            rows.parse()
+        if self.cache is None:
+            return rows.read(), index + 1
+        # Look the row up in the cache by its pointer. fp is only moved past the row on a cache miss.
+        ptr = fp.tell()
+        row = self.cache.get(ptr)
+        if row is None:
+            row = rows.parse()
+            if row is None:
+                # There is no row at the pointer.
+                return [], index
+            self.cache.put(ptr, row)
+            cur = index + 1
+        else:
+            cur = index
+        return self._output(row), cur
+
+    def register_range(self, field: Hashable, key: Callable[[str], Any] = float, run_size: int = None):
+        """
+        Build a sorted index of the values in a column for range and top-k queries (see self.range() and self.top()).
+        Each row whose value can be converted by key is stored as a (key(value), pointer) pair, sorted by value and then
+        by file order. Pairs are sorted in runs of at most run_size pairs that are spilled to temporary files and
+        merged, so the memory used while sorting is bounded regardless of the size of the file. The finished index
+        stores float values in a typed array (8 bytes per value) next to the pointers. Rows whose value cannot be
+        converted (key raises ValueError or TypeError, e.g. empty cells) or converts to NaN are left out of the index.
+        Note that this function cannot be used when header=False or raw_output=True.
+
+        :param field: a hashable (typically a string) that corresponds to a column name defined in self.header.
+        :param key: a function that converts the string value of a row into a comparable value. Default is float.
+        :param run_size: the maximum number of pairs sorted in memory at once. Default is None (RANGE_RUN_SIZE).
+        """
+        assert self.header is not None
+        assert not self.raw_output
+        run_size = RANGE_RUN_SIZE if run_size is None else run_size
+        col = self._column(field)
+        self.size(force=True)
+        run = []
+        spilled = []
+        try:
+            for pair in _range_pairs(self._scan_rows(), field, col, key):
+                run.append(pair)
+                if len(run) >= run_size:
+                    spilled.append(_spill(run))
+                    run = []
+            run.sort()
+            index = _range_arrays(heapq.merge(*[_read_run(fp) for fp in spilled], run) if spilled else run,
+                                  self._ptrs())
+        finally:
+            for fp in spilled:
+                fp.close()
+        with self.lock:
+            self.range_ptr[field] = index
+            self.range_keys[field] = key
+
+    def range(self, field: Hashable, lo: Any = None, hi: Any = None) -> GenericGenType:
+        """
+        Get a generator over the rows whose value of a range registered field lies between lo and hi (inclusive), in
+        ascending order of value (rows with equal values in file order). Only the matching rows are read.
+
+        :param field: a field registered by self.register_range().
+        :param lo: the lower bound, comparable with the values returned by the key given to self.register_range().
+            Default is None (no lower bound).
+        :param hi: the upper bound. Default is None (no upper bound).
+        :yield: either string, list, or dictionary of a row.
+        """
+        vals, ptrs = self.range_ptr[field]
+        start = 0 if lo is None else bisect_left(vals, lo)
+        stop = len(vals) if hi is None else bisect_right(vals, hi)
+        return self._handle_ptrs(ptrs[start:max(start, stop)])
+
+    def top(self, field: Hashable, k: int, largest: bool = True) -> GenericGenType:
+        """
+        Get a generator over the k rows with the largest (or smallest) values of a range registered field, from the
+        largest (or smallest) value on. Only these rows are read.
+
+        :param field: a field registered by self.register_range().
+        :param k: the number of rows.
+        :param largest: when False, get the rows with the smallest values instead. Default is True.
+        :yield: either string, list, or dictionary of a row.
+        """
+        _, ptrs = self.range_ptr[field]
+        k = max(0, min(k, len(ptrs)))
+        return self._handle_ptrs(ptrs[len(ptrs) - k:][::-1] if largest else ptrs[:k])
+
+    def select(self, index: GenericIndexType, columns: List[Hashable] = None,
+               row_type: str = None) -> GenericRowType or GenericGenType:
+        """
+        Get row(s) like self.__getitem__() but projected onto some columns and/or in another form than the one the
+        instance was created with. E.g. nav.select(slice(0, 10), ['time', 'quantity'], 'tuple') yields the first ten
+        rows as (time, quantity) tuples.
+
+        :param index: an int, slice or (field, key) tuple, see self.__getitem__().
+        :param columns: a list of column names (or positions when the file has no header) to return. Default is None
+            (the columns of the instance).
+        :param row_type: 'dict', 'tuple' or 'namedtuple', see the constructor. Default is None (the row_type of the
+            instance).
+        :return: a row, or a generator over rows for a slice or a field and key.
+        """
+        formatter = (self.header, _make_formatter(self.header, self.columns if columns is None else columns,
+                                                  self.row_type if row_type is None else row_type))
+        if isinstance(index, (slice, tuple)):
+            return self._select(self[index], formatter)
+        local = self.local
+        previous = getattr(local, 'formatter', None)
+        local.formatter = formatter
+        try:
+            return self[index]
+        finally:
+            local.formatter = previous
+
+    def _select(self, rows: GenericGenType, formatter: tuple) -> GenericGenType:
+        """
+        Private method to produce the rows of a generator with the formatter of self.select() in effect for the calling
+        thread.
 
-        :param fp: an optional file pointer. If not provided, will be retrieved automatically by thread id.
-        :return: a string, list, or dict of a row.
+        :param rows: a generator over rows.
+        :param formatter: a tuple of the header and the formatter.
+        :yield: the formatted rows.
         """
-        fp = fp if fp else self._get_or_create_fp()
-        if self.raw_output:
-            # Return the line as a string. Note that this will break at any newline and will not handle e.g. mismatched
-            # quotechar.
-            line = fp.readline()
-            if self.char_lim and len(line) > self.char_lim:
-                raise CharLimitExceededError(f'The number of characters in the line is {len(line)} which exceeds the '
-                                             f'limit of {self.char_lim} characters. Is the csv file valid? If so, you '
-                                             f'can either increase char_lim or set it None.')
-            return line
-        else:
-            # Read line as a csv row. In order to deal with any newlines that might appear within a column, this will
-            # attempt to interpret a read error as an incomplete line and will keep retrieving lines until the line
-            # can be correctly formatted as a csv row (hence hard-coding fmtparams['strict'] = True) or EOF is reached.
-            line = ''
-            line_length = 0
-            next_line = fp.readline()
-            while next_line:
-                try:
-                    line_length += len(next_line)
-                    if self.char_lim and line_length > self.char_lim:
-                        raise CharLimitExceededError(f'The number of characters in the row is {len(line)} which '
-                                                     f'exceeds the limit of {self.char_lim} characters. Is the csv '
-                                                     f'file valid? If so, you can either increase char_lim or set it '
-                                                     f'None.')
-                    line += self.reformat(self, next_line)
-                    # Attempt to format the line as csv.
-                    row = list(csv.reader([line], **self.fmtparams))[0]
-                    if self.header:
-                        # Return the row as a dictionary.
-                        return {k: v for k, v in zip(self.header, row)}
-                    else:
-                        # Return the row as a list.
-                        return row
-                except csv.Error:
-                    # The line is invalid csv, attempt to resolve by getting the next line (and appending).
-                    next_line = fp.readline()
-            # We reached EOF. This may throw an error if the line is invalid csv.
-            return list(csv.reader([line], **self.fmtparams))[0]
+        local = self.local
+        while True:
+            previous = getattr(local, 'formatter', None)
+            local.formatter = formatter
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            finally:
+                local.formatter = previous
+            yield row
 
-    def close(self):
+    def to_arrays(self, columns: List[Hashable], dtypes: Any = None, rows: GenericIndexType or List[int] = None,
+                  batch_size: int = None, missing: Any = None) -> dict:
         """
-        Close the file, if it is open. Only closes the file pointer assigned to the calling thread.
+        Extract columns into NumPy arrays. The selected rows are read in batches of batch_size rows and the values of
+        each batch are converted by NumPy at once and copied into arrays allocated up front for all the rows, so only
+        one batch of values is held as strings at any time. Requires NumPy. Note that this function cannot be used when
+        raw_output=True.
+
+        :param columns: a list of column names (or positions when the file has no header).
+        :param dtypes: either a single NumPy dtype for every column, a list of dtypes in the order of columns or a dict
+            mapping columns to dtypes. Columns that are not in the dict are float64. Strings should use object or a
+            sized string dtype such as 'U16', an unsized string dtype makes the array as wide as its longest value.
+            Default is None (float64).
+        :param rows: the rows to extract: None for every row, a slice, a list of row indices or a (field, key) tuple
+            (see self.__getitem__()). Default is None.
+        :param batch_size: the number of rows converted at a time. Default is None (ARRAY_BATCH_SIZE).
+        :param missing: the value stored for missing values (empty cells or columns absent from a short row), either a
+            single value or a dict mapping columns to values. Missing floats default to NaN and missing strings to '',
+            while a missing value in any other column without a fill value raises a ValueError. Default is None.
+        :return: a dict mapping each column to a NumPy array with one element per row.
         """
-        thread_id = threading.get_ident()
-        if thread_id in self.fps:
-            with self.lock:
-                self.fps[thread_id].close()
-                self.fps.pop(thread_id)
-                self.start_iter.pop(thread_id)
-    
-    def __len__(self) -> int or None:
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError('Navigator.to_arrays() requires NumPy, install it with pip install numpy.')
+        assert not self.raw_output
+        batch_size = ARRAY_BATCH_SIZE if batch_size is None else batch_size
+        if isinstance(dtypes, dict):
+            dtypes = [np.dtype(dtypes.get(column, np.float64)) for column in columns]
+        elif isinstance(dtypes, (list, tuple)):
+            assert len(dtypes) == len(columns)
+            dtypes = [np.dtype(dtype) for dtype in dtypes]
+        else:
+            dtypes = [np.dtype(np.float64 if dtypes is None else dtypes)] * len(columns)
+        if isinstance(missing, dict):
+            fills = [missing.get(column) for column in columns]
+        else:
+            fills = [missing] * len(columns)
+        # Count the rows so the arrays can be allocated up front.
+        if rows is None or isinstance(rows, slice):
+            index = slice(None) if rows is None else rows
+            start, stop, step = index.indices(self.size(force=True))
+            count = len(range(start, stop, step))
+            # Rows are read forward in a single pass rather than by seeking to each row.
+            formatter = (self.header, _make_formatter(self.header, columns, 'tuple'))
+            selected = self._select(islice(self._forward(start, stop), 0, None, step), formatter)
+        else:
+            # Rows are read a batch at a time in file order.
+            pick = _make_formatter(self.header, columns, 'tuple')
+            if isinstance(rows, tuple):
+                ptrs = self._groups(rows[0]).get(rows[1], array('q'))
+                count = len(ptrs)
+                selected = (pick(row) for i in range(0, count, batch_size)
+                            for row in self._fetch(ptrs[i:i + batch_size]).values())
+            else:
+                count = len(rows)
+                selected = (pick(row) for i in range(0, count, batch_size)
+                            for row in self._take(rows[i:i + batch_size]))
+        # Unsized string dtypes cannot be allocated up front, their batches are concatenated instead.
+        sized = [dtype.itemsize > 0 or dtype.kind not in 'SU' for dtype in dtypes]
+        arrays = [np.empty(count, dtype) if ok else [] for dtype, ok in zip(dtypes, sized)]
+        pos = 0
+        while True:
+            batch = []
+            for row in selected:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    break
+            if not batch:
+                break
+            for col, values in enumerate(zip(*batch)):
+                dtype = dtypes[col]
+                missed = [not val or val.isspace() for val in values]
+                if any(missed):
+                    fill = fills[col]
+                    if fill is None:
+                        if dtype.kind == 'f' or dtype.kind == 'c':
+                            fill = np.nan
+                        elif dtype.kind in 'SUO':
+                            fill = ''
+                        else:
+                            raise ValueError(f'Column {columns[col]} has a missing value and no missing value was '
+                                             f'given.')
+                    # Convert a placeholder and overwrite it with the fill value.
+                    placeholder = '' if dtype.kind in 'SUO' else '0'
+                    converted = np.array([placeholder if miss else val for miss, val in zip(missed, values)], dtype)
+                    converted[np.array(missed)] = fill
+                else:
+                    converted = np.array(values, dtype)
+                if sized[col]:
+                    arrays[col][pos:pos + len(batch)] = converted
+                else:
+                    arrays[col].append(converted)
+            pos += len(batch)
+        return {column: values if ok else np.concatenate(values) if values else np.empty(0, dtype)
+                for column, values, ok, dtype in zip(columns, arrays, sized, dtypes)}
+
+    def take(self, indices: List[int]) -> List[GenericRowType]:
         """
-        Get the number of rows of data in the file. Note that if the end of the file has not been accessed, this
-        function will return None. In this case, you can get the length of the file by calling self.size(force=True).
-        See the method self.size() for more information.
+        Get the rows at a list of indices. The rows are read in file order through a single dedicated file pointer
+        after exploring at most once, so scattered lookups turn into mostly forward reads, and the rows are returned in
+        the order of indices. This is considerably faster than [nav[i] for i in indices].
 
-        :return: the number of rows of data or None if the end of the file has not been reached.
+        :param indices: a list of non-negative row indices, possibly unsorted and with duplicates.
+        :return: a list of rows (see self.__getitem__()) in the order of indices.
         """
-        return self.size()
+        # Duplicate indices share a parsed row, copy lists so that the returned rows are independent.
+        return [self._output(row if isinstance(row, str) else row[:]) for row in self._take(indices)]
 
-    def __del__(self):
+    def batches(self, batch_size: int, shuffle: bool = True, seed: int = 0, block_size: int = None, window: int = None,
+                prefetch: int = 2, rank: int = 0, world_size: int = 1, epoch: int = 0,
+                drop_last: bool = False) -> Generator[List[GenericRowType], None, None]:
         """
-        Close the file when Navigator instance is garbage collected. Will only close the file pointer assigned to the 
-        calling thread.
+        Get a generator of mini-batches of rows, e.g. to train a model on the rows of the file. The rows are split into
+        blocks of block_size consecutive rows and the order of the blocks is shuffled, then the rows of every window
+        rows (rounded up to whole blocks) are shuffled, so every batch is read mostly forward from a few blocks through
+        a dedicated file pointer (see self.take()) rather than with a seek per row. The next prefetch batches are read
+        and parsed in a background thread while the current batch is used.
+
+        For data-parallel training, the shuffled blocks are dealt out round-robin to world_size workers and each worker
+        gets the batches of the blocks of its rank. Workers that use the same seed and epoch get disjoint rows that
+        cover the whole file. With drop_last, every worker gets the same number of full batches.
+
+        :param batch_size: the number of rows in a batch.
+        :param shuffle: whether to shuffle the rows, otherwise each worker gets its blocks in file order. Default is
+            True.
+        :param seed: the seed of the shuffle, which must be the same for all workers. Default is 0.
+        :param block_size: the number of consecutive rows in a block. Default is None for BATCH_BLOCK_SIZE.
+        :param window: the number of rows shuffled together. Default is None for BATCH_WINDOW_BLOCKS blocks.
+        :param prefetch: the number of batches read ahead in a background thread, 0 reads the batches in the calling
+            thread. Default is 2.
+        :param rank: the index of this worker from 0 to world_size - 1. Default is 0.
+        :param world_size: the number of workers. Default is 1.
+        :param epoch: the epoch, which is combined with seed so that every epoch is shuffled differently. Default is 0.
+        :param drop_last: whether to drop the last batch if it is incomplete, and the batches that other workers do
+            not have. Default is False.
+        :yield: a list of rows (see self.__getitem__()).
         """
-        if hasattr(self, 'fps'):
-            self.close()
-    
-    def chars(self, force: bool = False) -> int or None:
+        assert batch_size > 0 and prefetch >= 0 and 0 <= rank < world_size
+        block_size = BATCH_BLOCK_SIZE if block_size is None else block_size
+        window = block_size * BATCH_WINDOW_BLOCKS if window is None else window
+        assert block_size > 0 and window > 0
+        plan = self._batch_indices(self.size(force=True), batch_size, shuffle, seed, block_size, window, rank,
+                                   world_size, epoch, drop_last)
+        if not prefetch:
+            for indices in plan:
+                yield self.take(indices)
+            return
+        batches = queue.Queue(prefetch)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for indices in plan:
+                    if not put((self.take(indices), None)):
+                        return
+            except BaseException as e:
+                put((None, e))
+                return
+            put((None, None))
+
+        thread = threading.Thread(target=produce, name='csvnav-batches', daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch, error = batches.get()
+                if error is not None:
+                    raise error
+                if batch is None:
+                    break
+                yield batch
+        finally:
+            # Stop the thread if the generator is closed early.
+            stop.set()
+            thread.join()
+
+    @staticmethod
+    def _batch_indices(size: int, batch_size: int, shuffle: bool, seed: int, block_size: int, window: int, rank: int,
+                       world_size: int, epoch: int, drop_last: bool) -> Generator[List[int], None, None]:
         """
-        Get the total number of characters in the file.
+        Private method to compute the row indices of the batches of a worker (see self.batches()).
 
-        :param force: when True, forcibly computes the number of characters in the file even if the end of the file
-            has not been reached. When False and the end of the file has not been reached, the function will return
-            None. Default is False.
-        :return: the number of characters in the file or None if the end of the file has not been reached.
+        :param size: the number of rows.
+        :param batch_size: the number of rows in a batch.
+        :param shuffle: whether to shuffle the rows.
+        :param seed: the seed of the shuffle.
+        :param block_size: the number of consecutive rows in a block.
+        :param window: the number of rows shuffled together.
+        :param rank: the index of the worker.
+        :param world_size: the number of workers.
+        :param epoch: the epoch.
+        :param drop_last: whether to drop incomplete batches and the batches that other workers do not have.
+        :yield: a list of row indices.
         """
-        fp = self._get_or_create_fp()
-        if force and self.char_len is None:
-            # Forcibly compute if stored value is None.
-            self.char_len = fp.seek(0, 2)
-        return self.char_len
-    
-    def size(self, force: bool = False) -> int or None:
+        nblocks = -(-size // block_size)
+        blocks = list(range(nblocks))
+        rng = random.Random(f'{seed}:{epoch}')
+        if shuffle:
+            rng.shuffle(blocks)
+        counts = [len(range(r, nblocks, world_size)) * block_size for r in range(world_size)]
+        if nblocks:
+            # Only the last block of the file can be short.
+            counts[blocks.index(nblocks - 1) % world_size] -= nblocks * block_size - size
+        if drop_last:
+            limit = min(counts) // batch_size * batch_size
+        else:
+            limit = counts[rank]
+        pending = []
+        shuffled = []
+        for block in blocks[rank::world_size]:
+            shuffled.extend(range(block * block_size, min((block + 1) * block_size, size)))
+            if len(shuffled) < window:
+                continue
+            if shuffle:
+                rng.shuffle(shuffled)
+            pending.extend(shuffled)
+            shuffled = []
+            while len(pending) >= batch_size and limit >= batch_size:
+                yield pending[:batch_size]
+                del pending[:batch_size]
+                limit -= batch_size
+        if shuffle:
+            rng.shuffle(shuffled)
+        pending.extend(shuffled)
+        for start in range(0, min(len(pending), limit), batch_size):
+            yield pending[start:min(start + batch_size, limit)]
+
+    def _take(self, indices: List[int]) -> List[List[str] or str]:
         """
-        Get the size number of rows of data in the file.
+        Private method to read the parsed rows at a list of indices (see self.take()).
 
-        :param force: when True, forcibly computes the number of rows of data in the file even if the end of the
-            file has not been reached. When False and the end of the file has not been reached, this function will
-            return None. Warning - to count the number of rows when force=True, this function needs to iterate through 
-            all the rows in the file which could take long for very large files. Default is False.
-        :return: the number of rows of data in the file or None if the end of the file has not been reached.
+        :param indices: a list of non-negative row indices.
+        :return: a list of the parsed rows in the order of indices.
         """
-        fp = self._get_or_create_fp()
-        # The size of the file is universal across threads so only one needs to do the work and others can wait.
-        with self.lock:
-            # Get the number of rows in the file (less self.skip and the header lines).
-            if force and self.length is None:
-                # Forcibly compute the length of the file if it is not currently known.
-                if self.horizon == 0:
-                    # File has not been explored yet, determine size from top of file.
-                    fp.seek(0)
-                    # Skip lines.
-                    for _ in range(self.skip):
-                        fp.readline()
-                    # Skip header.
-                    if self.file_has_header:
-                        self._readrow(fp)
+        indices = list(indices)
+        if not indices:
+            return []
+        assert min(indices) >= 0
+        last = max(indices)
+        if last >= self.horizon:
+            # Explore up to the last requested row once.
+            self._explore(last)
+        assert last < self.horizon
+        checkpoint = self.checkpoint
+        if checkpoint == 1:
+            row_ptr = self.row_ptr
+            rows = self._fetch([row_ptr[idx] for idx in indices])
+            return [rows[row_ptr[idx]] for idx in indices]
+        # Only checkpoint pointers are stored, so rows are parsed forward from the nearest checkpoint unless the file
+        # pointer is already between the checkpoint and the row.
+        cache = self.cache
+        parsed = {}
+        with self._open_stream() as fp:
+            rows = _RowReader(self, fp)
+            cur = None
+            for idx in sorted(set(indices)):
+                offset = idx % checkpoint
+                if cur is None or not 0 <= idx - cur <= offset:
+                    fp.seek(self.row_ptr[idx // checkpoint])
+                    cur = idx - offset
+                for _ in range(idx - cur):
+                    rows.parse()
+                cur = idx
+                if cache is None:
+                    row = rows.parse()
                 else:
-                    # Move to last known position and skip line.
-                    fp.seek(self.row_ptr[-1])
-                    self._readrow(fp)
-                # Get pointer to current position.
-                ptr = fp.tell()
-                while True:
-                    # Read each remaining row in the file.
-                    row = self._readrow(fp)
-                    if row:
-                        # Row found, expand horizon and continue.
-                        self.row_ptr.append(ptr)
-                        ptr = fp.tell()
-                        self.horizon += 1
-                    else:
-                        # No more rows found, report length.
-                        self.length = self.horizon
-                        break
-                            
-            return self.length
+                    ptr = fp.tell()
+                    row = cache.get(ptr)
+                    if row is not None:
+                        parsed[idx] = row
+                        continue
+                    row = rows.parse()
+                    cache.put(ptr, row)
+                parsed[idx] = row
+                cur = idx + 1
+        return [parsed[idx] for idx in indices]
 
-    def set_header(self, header: List[Hashable]):
+    def _fetch(self, ptrs: List[int]) -> dict:
         """
-        Set the file's header (does not modify the file).
+        Private method to read the parsed rows at a list of pointers in file order through a dedicated file pointer,
+        going through the row cache if it is enabled.
 
-        :param header: the header can technically be composed of any hashable objects but is typically composed of
-            strings. The number of elements in the list should be equal to the number of columns in the file.
+        :param ptrs: a list of row pointers.
+        :return: a dict mapping each distinct pointer to its parsed row.
         """
-        self.header = header
+        cache = self.cache
+        parsed = {}
+        with self._open_stream() as fp:
+            rows = _RowReader(self, fp)
+            for ptr in sorted(set(ptrs)):
+                if cache is not None:
+                    row = cache.get(ptr)
+                    if row is not None:
+                        parsed[ptr] = row
+                        continue
+                # Nearby pointers are usually within the buffer of fp, so moving forward to them does not read again.
+                fp.seek(ptr)
+                row = rows.parse()
+                if cache is not None:
+                    cache.put(ptr, row)
+                parsed[ptr] = row
+        return parsed
 
-    def filter(self, condition: Callable[[GenericRowType], bool]) -> GenericRowType:
+    def take_keys(self, field: Hashable, keys: List[str]) -> List[List[GenericRowType]]:
         """
-        Get a generator that only yields rows matching a given condition.
+        Get the rows of several keys of a registered field (registering the field first if necessary). The rows of all
+        keys are read together in file order, see self.take().
 
-        :param condition: a function that takes in a row and returns a boolean for whether to yield the row or not.
-        :yield: either string, list, or dictionary of a row.
+        :param field: a field (column) name.
+        :param keys: a list of keys.
+        :return: a list with a list of the matching rows (in file order) for each key in the order of keys. Keys that
+            do not occur in the field have no rows.
         """
-        for row in self:
-            if condition(row):
-                yield row
+        groups = self._groups(field)
+        ptrs = [groups.get(key, ()) for key in keys]
+        rows = self._fetch([ptr for group in ptrs for ptr in group])
+        output = self._output
+        # Duplicate keys share parsed rows, copy lists so that the returned rows are independent.
+        return [[output(rows[ptr] if isinstance(rows[ptr], str) else rows[ptr][:]) for ptr in group] for group in ptrs]
 
-    def register(self, fields: Hashable or List[Hashable]):
+    def where(self, conditions: dict = None, exclude: dict = None, **kwargs) -> GenericGenType:
         """
-        Group rows by the values in a column. See the README.md file for an example. Note that this is also memory
-        efficient in the sense that it only stores pointers and does not store the grouped data in memory. This method
-        only performs the initial mapping of the pointers and does not return rows. To return results, see self.get()
-        or self.__getitem__(). Note that this function cannot be used when header=False or raw_output=True.
+        Get a generator over the rows matching conditions on one or more registered fields, in file order. The query is
+        answered from the pointers of the registered fields (fields that are not registered yet are registered first):
+        the pointers of the values of a field are merged (disjunction), the results of different fields are intersected
+        (conjunction) and the pointers of excluded values are removed (difference). Only the matching rows are read.
+        E.g. nav.where(product='tire', region=['EU', 'US']) yields the rows whose product is 'tire' and whose region is
+        either 'EU' or 'US'.
 
-        TODO: add the option to perform conjuctions/disjunctions?
-
-        :param fields: either a hashable (typically a string) or a list of hashables that correspond to column names
-            defined in self.header whose values we would like to group by. Note that each field is grouped independently
-            (no conjunctions/disjunctions).
+        :param conditions: a dict mapping fields to either a value or a list of values. Fields may also be given as
+            keyword arguments when they are valid identifiers. Default is None.
+        :param exclude: a dict mapping fields to either a value or a list of values, rows with any of these values are
+            excluded. Default is None.
+        :yield: either string, list, or dictionary of a row.
         """
-        fp = self._get_or_create_fp()
-        # If the file has a header, rows can be grouped such that the values of a field (column) are keys.
-        assert self.header is not None
-        assert not self.raw_output
-        if not isinstance(fields, list):
-            # Only a single field was provided, put in a list.
-            fields = [fields]
-        # Start from the beginning of the file.
-        fp.seek(0)
-        # Skip lines.
-        for _ in range(self.skip):
-            fp.readline()
-        if self.file_has_header:
-            # Skip header.
-            self._readrow(fp)
-        # Get position of first line of data.
-        ptr = fp.tell()
-        # Initialize mapping, row pointer array, and number of data rows.
-        fields_to_vals = {k: {} for k in fields}
-        row_ptr = []
-        length = 0
-        while True:
-            row = self._readrow(fp)
-            if row:
-                # If the line is non-empty, store a pointer to the beginning of the line.
-                row_ptr.append(ptr)
-                # Associate row pointer with a key in each field.
-                for field in fields:
-                    val = row[field]
-                    if val not in fields_to_vals[field]:
-                        fields_to_vals[field][val] = [ptr]
-                    else:
-                        fields_to_vals[field][val].append(ptr)
-                # Update pointer and expand known data row length of file.
-                ptr = fp.tell()
-                length += 1
-            else:
-                # End-of-file.
-                break
-        # Since all rows explored, store all row pointers (atomic).
-        self.row_ptr = row_ptr
-        # GIL protects us and all threads should have the same result for a given field.
-        for field in fields_to_vals:
-            self.field_ptr[field] = fields_to_vals[field]
-        self.length = length
-        self.horizon = length
-        
-    @property
-    def fields(self) -> KeysView:
+        return self._handle_ptrs(self._query(dict(conditions if conditions else {}, **kwargs), exclude))
+
+    def _query(self, conditions: dict, exclude: dict = None) -> array:
         """
-        Gets a dict_keys object corresponding the fields (columns) that have been grouped by the self.register() method.
+        Private method to compute the sorted pointers of the rows matching a query (see self.where()).
 
-        :return: fields (columns) that have been registered.
+        :param conditions: a dict mapping fields to either a value or a list of values.
+        :param exclude: a dict mapping fields to either a value or a list of values to exclude. Default is None.
+        :return: a sorted array of row pointers.
         """
-        return self.field_ptr.keys()
-        
-    def keys(self, field: Hashable) -> KeysView:
+        def pointers(field, vals):
+            groups = self._groups(field)
+            vals = vals if isinstance(vals, list) else [vals]
+            return _union([groups[val] for val in vals if val in groups] or [self._ptrs()])
+
+        if conditions:
+            # Intersect starting from the most selective condition.
+            matches = sorted((pointers(field, vals) for field, vals in conditions.items()), key=len)
+            ptrs = matches[0]
+            for other in matches[1:]:
+                if not ptrs:
+                    break
+                ptrs = _intersect(ptrs, other)
+        else:
+            # Without conditions every row matches, which requires all row pointers.
+            ptrs = self._all_ptrs()
+        for field, vals in (exclude if exclude else {}).items():
+            ptrs = _difference(ptrs, pointers(field, vals))
+        return ptrs
+
+    def _all_ptrs(self) -> array:
         """
-        Gets a dict_keys object corresponding to the unique values of the field (column) that has been used to key a
-        grouping by the self.register() method.
+        Private method to get the pointers of all rows.
 
-        :return: keys of a registered field (column).
+        :return: a sorted array of row pointers.
         """
-        return self.field_ptr[field].keys()
-        
-    @property
-    def cols(self) -> List[Hashable]:
+        self.size(force=True)
+        if self.checkpoint == 1:
+            return self.row_ptr
+        return self._ptrs(ptr for ptr, _ in self._scan_rows())
+
+    def _scan_rows(self) -> Generator[Tuple[int, List[str] or str], None, None]:
         """
-        Get the header that defines the columns of the file.
+        Private method to read every row of the file once with a dedicated file pointer, without caching or grouping.
+        The file must have been explored completely (see self.size()).
 
-        :return: the header of the file.
+        :yield: the pointer and the parsed row of each row in file order.
         """
-        return self.header
-        
-    def get(self, field: Hashable, key: str, default: Any = None) -> GenericGenType or Any:
+        if not self.length:
+            return
+        with self._open_stream() as fp:
+            fp.seek(self.row_ptr[0])
+            rows = _RowReader(self, fp)
+            for _ in range(self.length):
+                ptr = fp.tell()
+                yield ptr, rows.parse()
+
+    def _forward(self, start: int, stop: int) -> GenericGenType:
         """
-        Get a row by field (column) and key provided a key has been registered by self.register() method.
+        Private method to read a range of rows forward in a single pass with a dedicated file pointer. The file must
+        have been explored completely (see self.size()).
 
-        :param field: typically a string that matches an element of the header.
-        :param key: one of the unique values in the field (column) of the file defined by field that is used as a key in
-            the grouping by the self.register() method.
-        :param default: value to return if key does not exist. Default is None.
-        :return: either returns the matching rows or a default value.
+        :param start: the index of the first row.
+        :param stop: the index after the last row.
+        :yield: either string, list, or dictionary of a row.
         """
-        if key not in self.keys(field):
-            # If the key does not exist for a given field, return the default.
-            return default
-        else:
-            # Key exists, return the value.
-            return self.__getitem__((field, key))
+        if start >= stop:
+            return
+        with self._open_stream() as fp:
+            # Move to the nearest stored pointer at or before the first row.
+            fp.seek(self.row_ptr[start // self.checkpoint])
+            rows = _RowReader(self, fp)
+            for _ in range(start % self.checkpoint):
+                rows.parse()
+            for _ in range(stop - start):
+                yield self._output(rows.parse())
 
-    def items(self, field: Hashable) -> Generator[Tuple[str, GenericGenType], None, None]:
+    def _handle_ptrs(self, ptrs: array) -> GenericGenType:
         """
-        Get a generator over key/value pairs for a given registered field by the self.register() method.
+        Private method to read the rows at a sequence of pointers.
 
-        :param field: typically a string that matches an element of the header.
-        :yield: returns a generator that iterates over a tuple of key/value pairs.
+        :param ptrs: row pointers.
+        :yield: a string, list, or dictionary of a row.
         """
-        # Should be thread safe because content of self.field_ptr[field] should not change once registered.
-        for key in self.field_ptr[field]:
-            yield key, self.__getitem__((field, key))
-        
+        fp = self.handles.acquire()
+        try:
+            for ptr in ptrs:
+                yield self._read_at(fp, ptr)
+        finally:
+            self.handles.release(fp)
+
+    @_traced
     def _handle_slice(self, index: slice) -> GenericRowType:
         """
         Private method to handle slicing of the Navigator object.
@@ -380,70 +3409,72 @@ class Navigator:
         # Received a slice so get a result generator of corresponding rows.
         start = 0 if index.start is None else index.start
         step = 1 if index.step is None else index.step
+        if step <= 0:
+            raise ValueError('slice step must be positive')
+        if start < 0 or (index.stop is not None and index.stop < 0):
+            if self.length is None and start < 0 and (index.stop is None or index.stop < 0):
+                # Only the last rows are needed, locate them from the end of the file.
+                ptrs = self._tail_ptrs(-start)
+                if ptrs is not None:
+                    yield from self._handle_ptrs(ptrs[:index.stop:step])
+                    return
+            # Count from the end of the file.
+            start, stop, step = index.indices(self.size(force=True))
+            index = slice(start, stop, step)
 
-        fp = self._get_or_create_fp()
-        if self.length is None:
-            # Length of the file is unknown, need to explore.
-            stop = None if index.stop is None else index.stop
-            assert start >= 0
-            idx = start
-            while True:
-                if stop is None or idx < stop:
-                    # We have not reached the end of the slice yet.
-                    if idx >= self.horizon:
-                        # The current row index is beyond what has been explored.
-                        if self.horizon == 0:
-                            # We have not explored anything yet, start from the beginning and skip non-data.
-                            fp.seek(0)
-                            for _ in range(self.skip):
-                                fp.readline()
-                            if self.file_has_header:
-                                self._readrow(fp)
+        sparse = self.checkpoint > 1
+        # When only checkpoint pointers are stored, the rows of the slice are read forward through a dedicated file
+        # pointer rather than returning to a checkpoint for every row.
+        fp = self._open_stream() if sparse else self.handles.acquire()
+        rows = _RowReader(self, fp)
+        cur = None
+        try:
+            if self.length is None:
+                # Length of the file is unknown, need to explore.
+                stop = None if index.stop is None else index.stop
+                assert start >= 0
+                idx = start
+                while True:
+                    if stop is None or idx < stop:
+                        # We have not reached the end of the slice yet.
+                        if idx >= self.horizon:
+                            # The current row index is beyond what has been explored, explore up to the requested row.
+                            self._explore(idx, fp)
+                            cur = None
+                            if idx >= self.horizon:
+                                # The end of the file has been reached, no lines left to add to the result list.
+                                break
+                        # Now that we have the pointer for the current index, yield the row and prepare to move on to
+                        # the next index in the slice.
+                        if sparse:
+                            row, cur = self._read_sparse(fp, rows, idx, cur)
+                            yield row
                         else:
-                            # Go to the last known row pointer and advance the pointer by one row.
-                            fp.seek(self.row_ptr[-1])
-                            self._readrow(fp)
-                        # Get the current pointer to the first unexplored row.
-                        ptr = fp.tell()
-                        # Iterate through unexplored rows until we reach the requested row.
-                        # Only let one thread explore at a time.
-                        with self.lock:
-                            for _ in range(self.horizon, idx + 1):
-                                row = self._readrow(fp)
-                                if row:
-                                    # An unexplored line has been found, store the pointer to this newly explored
-                                    # row, set the pointer to the next unexplored row, and advance the horizon.
-                                    self.row_ptr.append(ptr)
-                                    ptr = fp.tell()
-                                    self.horizon += 1
-                                else:
-                                    # The end of the file has been reached. Set the row length of the file.
-                                    self.length = self.horizon
-                                    stop = self.length
-                                    break
-                        if self.length is not None:
-                            # No lines left to add to the result list, break out of while loop.
-                            break
-                    # Now that we have the pointer for the current index, move to the pointer.
-                    fp.seek(self.row_ptr[idx])
-                    # Yield the row and prepare to move on to the next index in the slice.
-                    yield self._readrow(fp)
-                    idx += step
-                else:
-                    # We are at the end of the slice, break out.
-                    break
-        else:
-            # Length of the file is known.
-            stop = self.length if index.stop is None else index.stop
-            assert start >= 0 and stop <= self.length
-            # Since all rows must have been explored to know the length of the file, we can simply iterate over
-            # the slice.
-            for idx in range(start, stop, step):
-                # Move to the pointer of the current row index.
-                fp.seek(self.row_ptr[idx])
-                # Yield the current row.
-                yield self._readrow(fp)
+                            yield self._read_at(fp, self.row_ptr[idx])
+                        idx += step
+                    else:
+                        # We are at the end of the slice, break out.
+                        break
+            else:
+                # Length of the file is known.
+                stop = self.length if index.stop is None else index.stop
+                assert start >= 0 and stop <= self.length
+                # Since all rows must have been explored to know the length of the file, we can simply iterate over
+                # the slice.
+                for idx in range(start, stop, step):
+                    # Yield the row at the pointer of the current row index.
+                    if sparse:
+                        row, cur = self._read_sparse(fp, rows, idx, cur)
+                        yield row
+                    else:
+                        yield self._read_at(fp, self.row_ptr[idx])
+        finally:
+            if sparse:
+                fp.close()
+            else:
+                self.handles.release(fp)
 
+    @_traced
     def _handle_scalar(self, index: int) -> GenericRowType:
         """
         Private method to handle an index of the Navigator object.
@@ -451,64 +3482,50 @@ class Navigator:
         :param index: an integer index.
         :return: a string, list, or dictionary of a row. 
         """
-        fp = self._get_or_create_fp()
+        if index < 0:
+            if self.length is None:
+                # Locate the row from the end of the file.
+                ptrs = self._tail_ptrs(-index)
+                if ptrs is not None:
+                    assert len(ptrs) == -index
+                    return next(self._handle_ptrs(ptrs[:1]))
+            index += self.size(force=True)
+            assert index >= 0
         if self.length is not None:
             assert index < self.length
-        if index >= self.horizon:
-            # The row index is beyond what has been explored.
-            if self.horizon == 0:
-                # We have not explored anything yet, start from the beginning and skip non-data.
-                fp.seek(0)
-                for _ in range(self.skip):
-                    fp.readline()
-                if self.file_has_header:
-                    self._readrow(fp)
-            else:
-                # Go to the last known row pointer and advance the pointer by one row.
-                fp.seek(self.row_ptr[-1])
-                self._readrow(fp)
-            # Get the current pointer to the first unexplored row.
-            ptr = fp.tell()
-            # Iterate through the unexplored rows until we reach the requested row.
-            # Again, only allow one thread to explore at a time.
-            with self.lock:
-                for _ in range(self.horizon, index + 1):
-                    row = self._readrow(fp)
-                    if row:
-                        # An unexplored line has been found, store the pointer to this newly explored row, set
-                        # the pointer to the next unexplored row, and advance the horizon.
-                        self.row_ptr.append(ptr)
-                        ptr = fp.tell()
-                        self.horizon += 1
-                    else:
-                        # The end of the file has been reached. Set the row length of the file.
-                        self.length = self.horizon
-                        break
-            if self.length is not None:
-                # Throw an error if index is too large.
-                assert index < self.length
-        # Now that we have the pointer for the requested row, move to the pointer.
-        fp.seek(self.row_ptr[index])
-        # Return the current row.
-        return self._readrow(fp)
+        fp = self.handles.acquire()
+        try:
+            if index >= self.horizon:
+                # The row index is beyond what has been explored, explore up to the requested row.
+                self._explore(index, fp)
+                if self.length is not None:
+                    # Throw an error if index is too large.
+                    assert index < self.length
+            # Now that we have the pointer for the requested row, return the row at the pointer. Explored pointers are
+            # only ever appended, so they are read without the lock.
+            if self.checkpoint > 1:
+                return self._read_sparse(fp, _RowReader(self, fp), index)[0]
+            return self._read_at(fp, self.row_ptr[index])
+        finally:
+            self.handles.release(fp)
 
+    @_traced
     def _handle_field(self, field: Hashable, key: str) -> GenericRowType:
         """
-        Private method to handle registered field indexing.
-
-        TODO: make it possible to run this without the extra self.register() step.
+        Private method to handle registered field indexing. A field that has not been registered is registered first.
 
         :param field: a hashable (typically string) that may be used to get the pointers for a field.
         :param key: rows will match this key.
         :yield: a string, list, or dictionary of a row.
         """
-        fp = self._get_or_create_fp()
-        # Iterate through the pointers of all matching rows.
-        for ptr in self.field_ptr[field][key]:
-            # Move to the pointer.
-            fp.seek(ptr)
-            # Yield the current row.
-            yield self._readrow(fp)
+        fp = self.handles.acquire()
+        try:
+            # Iterate through the pointers of all matching rows.
+            for ptr in self._groups(field)[key]:
+                # Yield the row at the pointer.
+                yield self._read_at(fp, ptr)
+        finally:
+            self.handles.release(fp)
 
     def __getitem__(self, index: GenericIndexType) -> GenericRowType or GenericGenType:
         """
@@ -517,13 +3534,14 @@ class Navigator:
         the column 'myfield' has value 'mykey' provided the 'myfield' column has been registered by the method
         self.register('myfield').
 
-        TODO: accept negative indices?
+        Negative indices count from the end of the file. Rows at negative indices, and slices whose start and stop are
+        negative (or None for stop), are located by scanning backwards from the end of the file without exploring it
+        when possible (see self.tail()), other negative indices require the length of the file (see self.size()).
 
         :param index: this variable may take on three forms such that it may be used to access rows by either index or
             by field (column) and key (see self.register() method). The three forms are:
                 int - get a single row by index.
-                slice - return one or more rows by index via a slicing operation. Only supports non-negative integers
-                    at least for now.
+                slice - return one or more rows by index via a slicing operation. The step must be positive.
                 tuple<hashable,str> - a two element tuple where the first element is the field (column) and the second
                     element is the key which returns all rows that match the field and key. Must be registered first
                     by method self.register().
@@ -555,14 +3573,18 @@ class Navigator:
             # above case because it is necessary to explore all rows when registering in the first place.
             return self._handle_field(field, index)
         
-    def __iter__(self) -> 'Navigator':
+    def __iter__(self) -> GenericGenType:
         """
-        Initialize an iterator over the rows of data in the file.
+        Initialize an iterator over the rows of data in the file. The iterator reads the file forward in a single
+        buffered pass rather than seeking to each row, storing row pointers as it goes, so that iterating over an
+        unexplored file does not require the size of the file to be computed first. Each call returns an independent
+        iterator, so multiple threads may iterate at the same time. Calling iter() also restarts next(nav) from the
+        first row for the calling thread.
 
-        :return: returns this instance.
+        :return: a generator over the rows of the file.
         """
         self.start_iter[threading.get_ident()] = 0
-        return self
+        return self._stream()
     
     def __next__(self) -> GenericRowType:
         """
@@ -571,8 +3593,233 @@ class Navigator:
         :return: a row with types defined in the __getitem__ return documentation.
         """
         thread_id = threading.get_ident()
+        self.start_iter.setdefault(thread_id, 0)
         if self.start_iter[thread_id] >= self.size(force=True):
             raise StopIteration
         else:
             self.start_iter[thread_id] += 1
             return self.__getitem__(self.start_iter[thread_id] - 1)
+
+
+class AsyncNavigator:
+
+    def __init__(self, path: str or Navigator, max_workers: int = 4, batch_size: int = None, **kwargs):
+        """
+        Instantiate an asyncio front-end of a Navigator. Every method that reads the file runs in a bounded pool of
+        threads so the event loop is never blocked on disk reads or parsing. Concurrent requests that need unexplored
+        rows are coalesced: a single exploration runs in the pool while the other requests wait on it without holding a
+        thread, so one slow scan does not stall many small requests.
+
+        :param path: either the path of the file to open or an existing Navigator instance.
+        :param max_workers: the maximum number of threads reading the file (and so of open file pointers). Default is 4.
+        :param batch_size: the number of rows read per thread call when iterating asynchronously. Default is None
+            (ASYNC_BATCH_SIZE).
+        :param **kwargs: when path is a path, the keyword arguments of Navigator.
+        """
+        # Only a Navigator opened here is closed by self.close().
+        self.owner = not isinstance(path, Navigator)
+        self.nav = Navigator(path, **kwargs) if self.owner else path
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.batch_size = ASYNC_BATCH_SIZE if batch_size is None else batch_size
+        # Explorations in progress, mapped from the row index they explore up to (None for the end of the file).
+        self.pending = {}
+
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Private method to call a function in the thread pool.
+
+        :param func: the function.
+        :param *args: positional arguments of the function.
+        :param **kwargs: keyword arguments of the function.
+        :return: the result of the function.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def _explore(self, index: int = None):
+        """
+        Private method to explore the file up to a row, joining an exploration in progress that reaches at least as far
+        instead of starting another one.
+
+        :param index: the row index to explore up to (inclusive). Default is None (explore to the end of the file).
+        """
+        nav = self.nav
+        while nav.length is None and (index is None or index >= nav.horizon):
+            future = None
+            for target, pending in self.pending.items():
+                if target is None or (index is not None and target >= index):
+                    future = pending
+                    break
+            if future is None:
+                # Start an exploration in the pool.
+                future = asyncio.ensure_future(self._run(lambda: nav._explore(index)))
+                self.pending[index] = future
+                future.add_done_callback(lambda _, target=index: self.pending.pop(target, None))
+            # Shielded so that a cancelled request does not cancel the exploration other requests are waiting on.
+            await asyncio.shield(future)
+
+    async def size(self, force: bool = False) -> int or None:
+        """
+        Get the number of rows in the file, see Navigator.size().
+
+        :param force: when True, explore the whole file if necessary. Default is False.
+        :return: the number of rows or, if force=False and the file has not been fully explored, None.
+        """
+        if force:
+            await self._explore()
+        return self.nav.size()
+
+    async def register(self, fields: Hashable or List[Hashable], workers: int = None, lazy: bool = False):
+        """
+        Group rows by the values in a column, see Navigator.register().
+
+        :param fields: a field or a list of fields.
+        :param workers: see Navigator.register(). Default is None.
+        :param lazy: see Navigator.register(). Default is False.
+        """
+        if not lazy:
+            await self._explore()
+        await self._run(self.nav.register, fields, workers=workers, lazy=lazy)
+
+    async def getitem(self, index: GenericIndexType) -> GenericRowType or List[GenericRowType]:
+        """
+        Get row(s) by index, slice or field and key, see Navigator.__getitem__().
+
+        :param index: an int, slice or (field, key) tuple.
+        :return: a row for an int, otherwise a list of rows.
+        """
+        if isinstance(index, tuple) or isinstance(index, slice):
+            return [row async for row in self.iterate(index)]
+        await self._explore(index)
+        return await self._run(self.nav.__getitem__, index)
+
+    async def get(self, field: Hashable, key: str, default: Any = None) -> List[GenericRowType] or Any:
+        """
+        Get the rows of a key of a registered field, see Navigator.get().
+
+        :param field: a field (column) name.
+        :param key: the key.
+        :param default: returned when the key does not occur in the field. Default is None.
+        :return: a list of rows or default.
+        """
+        groups = await self._run(self.nav._groups, field)
+        if key not in groups:
+            return default
+        return [row async for row in self.iterate((field, key))]
+
+    async def take(self, indices: List[int]) -> List[GenericRowType]:
+        """
+        Get the rows at a list of indices, see Navigator.take().
+
+        :param indices: a list of non-negative row indices.
+        :return: a list of rows in the order of indices.
+        """
+        indices = list(indices)
+        if indices:
+            await self._explore(max(indices))
+        return await self._run(self.nav.take, indices)
+
+    async def take_keys(self, field: Hashable, keys: List[str]) -> List[List[GenericRowType]]:
+        """
+        Get the rows of several keys of a registered field, see Navigator.take_keys().
+
+        :param field: a field (column) name.
+        :param keys: a list of keys.
+        :return: a list with a list of the matching rows for each key in the order of keys.
+        """
+        return await self._run(self.nav.take_keys, field, keys)
+
+    async def iterate(self, index: slice or Tuple[Hashable, str] = None) -> AsyncGenerator[GenericRowType, None]:
+        """
+        Asynchronously iterate over the rows of a slice, of a key of a registered field or of the whole file. Rows are
+        read a batch at a time in the thread pool through Navigator.take() (slices) or a forward pass (the whole file
+        and registered fields).
+
+        :param index: a slice, a (field, key) tuple or None for every row. Default is None.
+        :yield: either string, list, or dictionary of a row.
+        """
+        nav = self.nav
+        if isinstance(index, slice):
+            start = 0 if index.start is None else index.start
+            step = 1 if index.step is None else index.step
+            if step <= 0:
+                raise ValueError('slice step must be positive')
+            if start < 0 or (index.stop is not None and index.stop < 0):
+                # Rows counted from the end of the file are located and read at once.
+                for row in await self._run(lambda: list(nav[index])):
+                    yield row
+                return
+            assert start >= 0
+            stop = index.stop
+            if stop is not None:
+                assert stop >= 0
+            for first in range(start, sys.maxsize if stop is None else stop, step * self.batch_size):
+                last = first + step * (self.batch_size - 1)
+                if stop is not None:
+                    last = min(last, stop - 1)
+                await self._explore(last)
+                if nav.length is not None:
+                    last = min(last, nav.length - 1)
+                if last < first:
+                    return
+                for row in await self._run(nav.take, range(first, last + 1, step)):
+                    yield row
+            return
+        if isinstance(index, tuple):
+            # The pointers of the key are looked up (which may register the field) in the pool.
+            ptrs = await self._run(lambda: nav._groups(index[0]).get(index[1], array('q')))
+            rows = nav._handle_ptrs(ptrs)
+        else:
+            rows = iter(nav)
+        async for row in self._batches(rows):
+            yield row
+
+    async def filter(self, condition: Callable[[GenericRowType], bool]) -> AsyncGenerator[GenericRowType, None]:
+        """
+        Asynchronously iterate over the rows that satisfy a condition, see Navigator.filter(). The condition is
+        evaluated in the thread pool.
+
+        :param condition: a function of a row that returns True for the rows to keep.
+        :yield: either string, list, or dictionary of a row.
+        """
+        async for row in self._batches(self.nav.filter(condition)):
+            yield row
+
+    async def _batches(self, rows: GenericGenType) -> AsyncGenerator[GenericRowType, None]:
+        """
+        Private method to advance a generator over rows a batch at a time in the thread pool.
+
+        :param rows: a generator over rows.
+        :yield: the rows of the generator.
+        """
+        try:
+            while True:
+                batch = await self._run(lambda: list(islice(rows, self.batch_size)))
+                if not batch:
+                    return
+                for row in batch:
+                    yield row
+        finally:
+            rows.close()
+
+    def __aiter__(self) -> AsyncGenerator[GenericRowType, None]:
+        """
+        Asynchronously iterate over every row of the file.
+
+        :return: an asynchronous generator over the rows of the file.
+        """
+        return self.iterate()
+
+    async def close(self):
+        """
+        Shut down the thread pool. The threads of the pool read through file pointers borrowed from the handle pool of
+        the Navigator, which is closed as well if it was opened by this instance.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, partial(self.executor.shutdown, wait=True))
+        if self.owner:
+            self.nav.close()
+
+    async def __aenter__(self) -> 'AsyncNavigator':
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
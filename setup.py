@@ -12,6 +12,7 @@ setup_args = {
     'long_description': readme,
     'license': 'MIT',
     'py_modules': ['csvnav'],
+    'extras_require': {'numpy': ['numpy']},
     'author': 'Joel Kaardal',
     'author_email': 'jkaardal@gmail.com',
     'keywords': ['data-science', 'csv', 'machine-learning', 'data-analysis', 'memory-management'],
@@ -1,6 +1,11 @@
+import asyncio
 import csv
+import gzip
+import os
+import pytest
 import threading
-from csvnav import Navigator
+import csvnav
+from csvnav import Navigator, AsyncNavigator, CharLimitExceededError, IndexMismatchError
 
 
 data_file = './inventory.csv'
@@ -146,6 +151,10 @@ def test__handle_slice():
     # Test skipped rows.
     for i, row in enumerate(nav[::2]):
         assert row == [str(r) for r in content[i * 2]]
+    # Test that a step that is not positive is rejected, whatever the bounds.
+    for index in (slice(None, None, -1), slice(-3, None, -1), slice(0, 5, 0)):
+        with pytest.raises(ValueError):
+            list(nav[index])
     nav.close()
 
 
@@ -240,3 +249,972 @@ def test_concurrency():
     for thread in threads:
         thread.join()
     nav.close()
+
+
+def test_save_index():
+    # Test that a saved index restores the row pointers, length and registered fields without rescanning.
+    index_file = data_file + '.idx'
+    nav = Navigator(data_file, header=True)
+    nav.register('product')
+    nav.save_index(index_file)
+    row_ptr = list(nav.row_ptr)
+    nav.close()
+
+    nav = Navigator(data_file, header=True, index_path=index_file)
+    assert list(nav.row_ptr) == row_ptr
+    assert nav.size() == len(content) - 1
+    assert list(nav.fields) == ['product']
+    header = content[0]
+    for i, row in enumerate(content[1:]):
+        assert nav[i] == {header[j]: str(r) for j, r in enumerate(row)}
+    assert len(list(nav['product', 'tire'])) == 3
+    nav.close()
+    os.remove(index_file)
+
+
+def test_load_index():
+    # Test that an index written with different settings is rejected.
+    index_file = data_file + '.idx'
+    nav = Navigator(data_file, header=True)
+    nav.size(force=True)
+    nav.save_index(index_file)
+    nav.close()
+
+    nav = Navigator(data_file, header=True, skip=1)
+    try:
+        nav.load_index(index_file)
+        raise Exception('load_index should reject an index built with different settings!')
+    except IndexMismatchError:
+        pass
+    nav.close()
+
+    # A stale index passed to the constructor is ignored.
+    nav = Navigator(data_file, header=True, skip=1, index_path=index_file)
+    assert nav.size() is None
+    nav.close()
+
+    # Test that truncated or corrupt indexes are rejected and ignored by the constructor.
+    with open(index_file, 'rb') as fp:
+        index = fp.read()
+    try:
+        for corrupt in [index[:-8], index[:-100], index + b'\0' * 8, index[:30], index.replace(b'"rows"', b'"rowz"')]:
+            with open(index_file, 'wb') as fp:
+                fp.write(corrupt)
+            nav = Navigator(data_file, header=True)
+            with pytest.raises(IndexMismatchError):
+                nav.load_index(index_file)
+            nav.close()
+            nav = Navigator(data_file, header=True, index_path=index_file)
+            assert nav.size() is None and nav[1]['product'] == 'sparkplug'
+            nav.close()
+    finally:
+        os.remove(index_file)
+
+
+def test_memory_usage():
+    # Test that the pointers are stored compactly and that the memory report accounts for them.
+    nav = Navigator(data_file, header=True)
+    nav.register('product')
+    usage = nav.memory_usage()
+    assert usage['pointers'] == 2 * (len(content) - 1)
+    assert usage['total'] == usage['row_ptr'] + usage['field_ptr'] + usage['range_ptr']
+    assert nav.row_ptr.itemsize == 8
+    assert all(ptrs.itemsize == 8 for ptrs in nav.field_ptr['product'].values())
+    nav.close()
+
+
+def test_text_cookies():
+    # Test that the tell() cookies of text mode file pointers, which can exceed 64 bits, are kept in lists.
+    cookie_file = './cookies.csv'
+    with open(cookie_file, 'w', encoding='cp437', newline='') as fp:
+        fp.write('a,b\r1,2\r3,4\r')
+    try:
+        nav = Navigator(cookie_file, header=True, open_opts={'encoding': 'cp437'})
+        assert nav.size(force=True) == 2 and isinstance(nav.row_ptr, list)
+        assert list(nav) == [{'a': '1', 'b': '2'}, {'a': '3', 'b': '4'}] and nav[1] == {'a': '3', 'b': '4'}
+        nav.register('a')
+        assert list(nav['a', '3']) == [{'a': '3', 'b': '4'}] and list(nav.where(a='1')) == [nav[0]]
+        nav.register_range('b')
+        assert list(nav.range('b', 3, 5)) == [nav[1]]
+        nav.close()
+    finally:
+        os.remove(cookie_file)
+
+
+def test__build_index():
+    # Test that the parallel index builder gives the same pointers as the serial path, even when the byte ranges
+    # split rows and quoted fields that contain newlines.
+    multiline_file = './multiline.csv'
+    with open(multiline_file, 'w') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(content[0])
+        for i, row in enumerate(content[1:] * 5):
+            writer.writerow([row[0], f'{row[1]}\n"{i}"' if i % 3 == 0 else row[1], row[2]])
+    chunk_size = csvnav.PARALLEL_CHUNK_SIZE
+    csvnav.PARALLEL_CHUNK_SIZE = 16
+    try:
+        serial = Navigator(multiline_file, header=True)
+        serial.register(['product', 'time'])
+        parallel = Navigator(multiline_file, header=True)
+        parallel.register(['product', 'time'], workers=2)
+        assert list(parallel.row_ptr) == list(serial.row_ptr)
+        assert parallel.size() == serial.size() == (len(content) - 1) * 5
+        for field in serial.fields:
+            assert {k: list(v) for k, v in parallel.field_ptr[field].items()} == \
+                {k: list(v) for k, v in serial.field_ptr[field].items()}
+        serial.close()
+        parallel.close()
+
+        nav = Navigator(multiline_file, header=True)
+        assert nav.size(force=True, workers=2) == (len(content) - 1) * 5
+        assert nav[3]['product'] == 'tire\n"3"'
+        nav.close()
+
+        # Test that the rows of lazily registered fields are grouped by the workers too.
+        nav = Navigator(multiline_file, header=True)
+        nav[5]
+        nav.register('product', lazy=True)
+        assert nav.size(force=True, workers=2) == (len(content) - 1) * 5 and nav.lazy_fields == {}
+        assert {k: list(v) for k, v in nav.field_ptr['product'].items()} == \
+            {k: list(v) for k, v in serial.field_ptr['product'].items()}
+        assert list(nav['product', 'tire']) == [row for row in nav if row['product'] == 'tire']
+        nav.close()
+    finally:
+        csvnav.PARALLEL_CHUNK_SIZE = chunk_size
+        os.remove(multiline_file)
+
+
+def test__stream():
+    # Test that iterating explores the file as it goes and only sets the length at the end of the file.
+    nav = Navigator(data_file)
+    rows = iter(nav)
+    assert next(rows) == [str(r) for r in content[0]]
+    assert next(rows) == [str(r) for r in content[1]]
+    assert nav.horizon == 2 and nav.length is None
+    for i, row in enumerate(rows):
+        assert row == [str(r) for r in content[i + 2]]
+    assert nav.length == len(content)
+    reference = Navigator(data_file)
+    reference.size(force=True)
+    assert list(nav.row_ptr) == list(reference.row_ptr)
+    reference.close()
+    # Test that exploration by indexing continues where the iterator stopped.
+    nav = Navigator(data_file)
+    rows = iter(nav)
+    next(rows)
+    assert nav[len(content) - 1] == [str(r) for r in content[-1]]
+    assert [row for row in nav] == [[str(r) for r in row] for row in content]
+    nav.close()
+
+
+def test__readrow_multiline():
+    # Test that rows with quoted fields spanning many lines are assembled and that char_lim is enforced on the row.
+    multiline_file = './multiline.csv'
+    text = '\n'.join(f'line {i}, "quoted"' for i in range(1000))
+    with open(multiline_file, 'w') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(content[0])
+        writer.writerow([1, text, 2])
+        writer.writerow(content[1])
+    try:
+        nav = Navigator(multiline_file, header=True)
+        assert nav._readrow() == {'time': '1', 'product': text, 'quantity': '2'}
+        assert nav._readrow() == {content[0][i]: str(r) for i, r in enumerate(content[1])}
+        assert nav._readrow() == []
+        nav.close()
+
+        nav = Navigator(multiline_file, header=True, char_lim=len(text) // 2)
+        try:
+            nav._readrow()
+            raise Exception('_readrow should raise an error when the row exceeds char_lim!')
+        except CharLimitExceededError:
+            pass
+        nav.close()
+
+        # Test that the reformat function is applied to every line of the row.
+        nav = Navigator(multiline_file, header=True, reformat=lambda nav, line: line.replace('quoted', 'q'))
+        assert nav._readrow()['product'] == text.replace('quoted', 'q')
+        nav.close()
+    finally:
+        os.remove(multiline_file)
+
+
+def test_mmap_engine():
+    # Test that the mmap engine returns the same rows and byte offset pointers as the text engine.
+    text_nav = Navigator(data_file, header=True)
+    nav = Navigator(data_file, header=True, engine='mmap')
+    header = content[0]
+    for i in reversed(range(len(content) - 1)):
+        assert nav[i] == {header[j]: str(r) for j, r in enumerate(content[i + 1])}
+    assert list(nav) == list(text_nav)
+    assert list(nav.row_ptr) == list(text_nav.row_ptr)
+    assert list(nav[1:4]) == list(text_nav[1:4])
+    nav.register('product')
+    assert len(list(nav['product', 'tire'])) == 3
+
+    # Test that threads share the map rather than opening file handles.
+    def read_rows():
+        for i in range(len(content) - 1):
+            assert nav[i] == {header[j]: str(r) for j, r in enumerate(content[i + 1])}
+
+    threads = [threading.Thread(target=read_rows) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(fp.mapping is nav.mapping for fp in nav.fps.values())
+    text_nav.close()
+    nav.close()
+
+
+def test_lone_carriage_returns():
+    # Test that a lone carriage return ends a line under universal newlines, like in text mode, in every engine.
+    cr_file = './cr.csv'
+    with open(cr_file, 'wb') as fp:
+        fp.write(b'time,product\r5,tire\r8,"spark\rplug"\r\n2,battery\n10,tire\r')
+    rows = [{'time': '5', 'product': 'tire'}, {'time': '8', 'product': 'spark\nplug'},
+            {'time': '2', 'product': 'battery'}, {'time': '10', 'product': 'tire'}]
+    chunk_size = csvnav.PARALLEL_CHUNK_SIZE
+    csvnav.PARALLEL_CHUNK_SIZE = 8
+    try:
+        for opts in [{}, {'engine': 'mmap'}, {'checkpoint': 3}]:
+            nav = Navigator(cr_file, header=True, **opts)
+            assert [nav[i] for i in range(4)] == rows and list(nav) == rows and nav.size() == 4
+            assert nav.tail(2) == rows[-2:]
+            nav.close()
+            nav = Navigator(cr_file, header=True, **opts)
+            assert list(nav) == rows and nav[1] == rows[1] and nav.tail(2) == rows[-2:]
+            nav.close()
+        nav = Navigator(cr_file, header=True)
+        nav.register('product', workers=2)
+        parallel = list(nav.row_ptr)
+        assert list(nav['product', 'tire']) == [rows[0], rows[3]]
+        nav.close()
+        nav = Navigator(cr_file, header=True)
+        nav.register('product')
+        assert list(nav.row_ptr) == parallel
+        nav.close()
+
+        with open(cr_file, 'wb') as fp:
+            fp.write(b'a\rb\nc\n')
+        nav = Navigator(cr_file, raw_output=True)
+        assert nav[0] == 'a\n' and list(nav) == ['a\n', 'b\n', 'c\n'] and nav[1] == 'b\n'
+        nav.close()
+        nav = Navigator(cr_file, raw_output=True, open_opts={'newline': ''})
+        assert list(nav) == ['a\r', 'b\n', 'c\n'] and nav[0] == 'a\r'
+        nav.close()
+        with gzip.open(cr_file + '.gz', 'wb') as fp:
+            fp.write(b'a\rb\nc\n')
+        nav = Navigator(cr_file + '.gz', raw_output=True)
+        assert list(nav) == ['a\n', 'b\n', 'c\n'] and nav[1] == 'b\n'
+        nav.close()
+    finally:
+        csvnav.PARALLEL_CHUNK_SIZE = chunk_size
+        os.remove(cr_file)
+        if os.path.exists(cr_file + '.gz'):
+            os.remove(cr_file + '.gz')
+
+
+def test_iter_restarts_next():
+    # Test that iter() restarts next(nav) after a complete pass.
+    nav = Navigator(data_file)
+    assert [next(nav) for _ in content] == [[str(r) for r in row] for row in content]
+    with pytest.raises(StopIteration):
+        next(nav)
+    iter(nav)
+    assert next(nav) == [str(r) for r in content[0]]
+    nav.close()
+
+
+def test_cache_info():
+    # Test that repeated accesses are served from the row cache and that the least recently used row is evicted.
+    nav = Navigator(data_file, cache_rows=2)
+    assert nav.cache_info()['rows'] == 0
+    assert nav[0] == [str(r) for r in content[0]]
+    assert nav[1] == [str(r) for r in content[1]]
+    # Modifying a returned row must not modify the cached row.
+    nav[0].append('modified')
+    assert nav[0] == [str(r) for r in content[0]]
+    info = nav.cache_info()
+    assert info['hits'] == 2 and info['misses'] == 2 and info['evictions'] == 0
+    assert nav[2] == [str(r) for r in content[2]]
+    assert nav.cache_info()['evictions'] == 1
+    # Row 1 was the least recently used row and has been evicted.
+    nav[1]
+    assert nav.cache_info()['misses'] == 4
+    # Rows read in bulk through the cache are independent copies too.
+    rows = nav.take([1, 1, 2])
+    rows[0].append('modified')
+    assert rows[1] == nav[1] == [str(r) for r in content[1]]
+    assert list(nav[0:3]) == [[str(r) for r in row] for row in content[:3]]
+    nav.close()
+
+    # Test the cache bounded by bytes and the cache with a header.
+    nav = Navigator(data_file, header=True, cache_bytes=1)
+    nav[0]
+    nav[0]
+    assert nav.cache_info()['rows'] == 0 and nav.cache_info()['hits'] == 0
+    nav.close()
+    nav = Navigator(data_file, header=True, cache_rows=10)
+    nav.register('product')
+    assert list(nav['product', 'tire']) == list(nav['product', 'tire'])
+    assert nav.cache_info()['hits'] == 3
+    assert Navigator(data_file).cache_info() is None
+    nav.close()
+
+
+def test_checkpoint():
+    # Test that storing only every k-th row pointer gives the same rows for every kind of access.
+    rows = [[str(r) for r in row] for row in content]
+    reference = Navigator(data_file)
+    reference.size(force=True)
+    for checkpoint in [2, 3, 10]:
+        nav = Navigator(data_file, checkpoint=checkpoint)
+        for i in reversed(range(len(content))):
+            assert nav[i] == rows[i]
+        assert list(nav.row_ptr) == list(reference.row_ptr[::checkpoint])
+        nav.close()
+
+        nav = Navigator(data_file, checkpoint=checkpoint, cache_rows=2)
+        assert list(nav[1:5]) == rows[1:5]
+        assert list(nav[::2]) == rows[::2]
+        assert list(nav) == rows
+        assert nav.size() == len(content)
+        assert list(nav[:]) == rows
+        nav.close()
+
+        nav = Navigator(data_file, checkpoint=checkpoint)
+        assert nav.size(force=True) == len(content)
+        assert list(nav.row_ptr) == list(reference.row_ptr[::checkpoint])
+        assert nav[len(content) - 1] == rows[-1]
+        nav.close()
+
+        nav = Navigator(data_file, header=True, checkpoint=checkpoint)
+        nav.register('product')
+        assert len(nav.row_ptr) == (len(content) - 2) // checkpoint + 1
+        assert nav[4] == dict(zip(content[0], rows[5]))
+        assert len(list(nav['product', 'tire'])) == 3
+        nav.close()
+    reference.close()
+
+
+def test_register_lazy():
+    # Test that lazily registered fields are grouped by exploration and completed on demand.
+    reference = Navigator(data_file, header=True)
+    reference.register(['product', 'time'])
+    nav = Navigator(data_file, header=True)
+    nav[1]
+    nav.register('product', lazy=True)
+    assert nav.field_ptr['product'] == {}
+    nav[3]
+    # Rows explored after registration have been grouped.
+    assert sum(len(ptrs) for ptrs in nav.field_ptr['product'].values()) == 2
+    assert list(nav.keys('product')) == list(reference.keys('product'))
+    for key in reference.keys('product'):
+        assert list(nav.field_ptr['product'][key]) == list(reference.field_ptr['product'][key])
+        assert list(nav['product', key]) == list(reference['product', key])
+    assert nav.lazy_fields == {}
+    nav.close()
+
+    # Test that a field is registered on the first lookup.
+    nav = Navigator(data_file, header=True)
+    assert list(nav['time', '10']) == list(reference['time', '10'])
+    assert list(nav.fields) == ['time']
+    nav.close()
+
+    # Test that the rows explored before registration are read without holding the lock.
+    locked = []
+    nav = Navigator(data_file, header=True)
+    nav.size(force=True)
+    nav.reformat = lambda nav, line: locked.append(nav.lock.locked()) or line
+    nav.register('product')
+    assert len(locked) == len(content) - 1 and not any(locked)
+    assert {k: list(v) for k, v in nav.field_ptr['product'].items()} == \
+        {k: list(v) for k, v in reference.field_ptr['product'].items()}
+    nav.close()
+    reference.close()
+
+
+def test_where():
+    # Test conjunctions, disjunctions and exclusions over registered fields against filtering every row.
+    nav = Navigator(data_file, header=True)
+    nav.register(['product', 'quantity'])
+    header = content[0]
+    rows = [{header[i]: str(r) for i, r in enumerate(row)} for row in content[1:]]
+    assert list(nav.where(product='tire')) == [row for row in rows if row['product'] == 'tire']
+    assert list(nav.where(product='tire', quantity=['2', '3', '35'])) == \
+        [row for row in rows if row['product'] == 'tire' and row['quantity'] in ['2', '3', '35']]
+    assert list(nav.where(product=['tire', 'battery'])) == \
+        [row for row in rows if row['product'] in ['tire', 'battery']]
+    assert list(nav.where({'product': 'tire'}, exclude={'quantity': '3'})) == \
+        [row for row in rows if row['product'] == 'tire' and row['quantity'] != '3']
+    assert list(nav.where(exclude={'product': 'tire'})) == [row for row in rows if row['product'] != 'tire']
+    assert list(nav.where(product='tire', quantity='120')) == []
+    assert list(nav.where(product='wheel')) == []
+    # Fields that have not been registered are registered by the query.
+    assert list(nav.where(time='10', product='tire')) == [rows[3]]
+    nav.close()
+
+
+def test_register_range():
+    # Test range and top-k queries against sorting every row, including the external sort of spilled runs.
+    nav = Navigator(data_file, header=True)
+    header = content[0]
+    rows = [{header[i]: str(r) for i, r in enumerate(row)} for row in content[1:]]
+    by_quantity = sorted(rows, key=lambda row: float(row['quantity']))
+    for run_size in [None, 2]:
+        nav.register_range('quantity', run_size=run_size)
+        assert list(nav.range('quantity', 3, 35)) == [row for row in by_quantity if 3 <= float(row['quantity']) <= 35]
+        assert list(nav.range('quantity', hi=4)) == [row for row in by_quantity if float(row['quantity']) <= 4]
+        assert list(nav.range('quantity', lo=36)) == [by_quantity[-1]]
+        assert list(nav.range('quantity', 50, 60)) == []
+        assert list(nav.top('quantity', 2)) == by_quantity[::-1][:2]
+        assert list(nav.top('quantity', 2, largest=False)) == by_quantity[:2]
+        assert list(nav.top('quantity', 100)) == by_quantity[::-1]
+    # Values that cannot be converted are left out.
+    nav.register_range('product', key=int)
+    assert list(nav.range('product')) == []
+    nav.register_range('product', key=str)
+    assert [row['product'] for row in nav.top('product', 1)] == ['tire']
+    nav.close()
+
+
+def test_select():
+    # Test projected and tuple rows, both for the instance and per call.
+    header = content[0]
+    rows = [[str(r) for r in row] for row in content[1:]]
+    nav = Navigator(data_file, header=True, columns=['quantity', 'time'])
+    assert nav[0] == {'quantity': rows[0][2], 'time': rows[0][0]}
+    assert nav.select(1, row_type='tuple') == (rows[1][2], rows[1][0])
+    assert list(nav.select(slice(0, 2), ['product'])) == [{'product': row[1]} for row in rows[:2]]
+    assert list(nav.select(('product', 'battery'), row_type='namedtuple')) == [(rows[2][2], rows[2][0])]
+    # The projection of the instance is restored after each call.
+    assert list(nav) == [{'quantity': row[2], 'time': row[0]} for row in rows]
+    nav.close()
+    nav = Navigator(data_file, header=True, row_type='namedtuple')
+    row = nav[3]
+    assert row == tuple(rows[3]) and row.product == rows[3][1] and row._fields == tuple(header)
+    assert type(row) is type(nav[4])
+    nav.close()
+    nav = Navigator(data_file, header=False, row_type='tuple', columns=[1])
+    assert list(nav[1:3]) == [(row[1],) for row in rows[:2]]
+    nav.close()
+    # Test that namedtuple rows need names and that an empty projection is rejected.
+    with pytest.raises(ValueError):
+        Navigator(data_file, header=False, row_type='namedtuple')
+    with pytest.raises(ValueError):
+        Navigator(data_file, header=True, columns=[])
+    nav = Navigator(data_file, header=False, row_type='namedtuple', columns=[2, 0])
+    assert nav[1] == (rows[0][2], rows[0][0]) and nav[1]._fields == ('_0', '_1')
+    with pytest.raises(ValueError):
+        nav.select(1, [])
+    nav.close()
+    nav = Navigator(data_file, header=False)
+    with pytest.raises(ValueError):
+        nav.select(1, row_type='namedtuple')
+    nav.close()
+
+
+def test_to_arrays():
+    # Test typed column extraction in batches, including missing values.
+    np = pytest.importorskip('numpy')
+    rows = content[1:]
+    nav = Navigator(data_file, header=True)
+    arrays = nav.to_arrays(['time', 'quantity', 'product'], {'time': 'int64', 'product': object}, batch_size=4)
+    assert arrays['time'].dtype == np.int64 and arrays['time'].tolist() == [row[0] for row in rows]
+    assert arrays['quantity'].dtype == np.float64 and arrays['quantity'].tolist() == [row[2] for row in rows]
+    assert arrays['product'].tolist() == [row[1] for row in rows]
+    arrays = nav.to_arrays(['quantity'], rows=('product', 'tire'))
+    assert arrays['quantity'].tolist() == [row[2] for row in rows if row[1] == 'tire']
+    arrays = nav.to_arrays(['quantity', 'product'], [int, str], rows=[4, 0])
+    assert arrays['quantity'].tolist() == [rows[4][2], rows[0][2]]
+    assert arrays['product'].tolist() == [rows[4][1], rows[0][1]]
+    assert nav.to_arrays(['time'], rows=slice(1, 5, 2))['time'].tolist() == [rows[1][0], rows[3][0]]
+    nav.close()
+    missing_file = './missing.csv'
+    with open(missing_file, 'w') as fp:
+        fp.write('a,b\n1,2\n,3\n4\n')
+    try:
+        nav = Navigator(missing_file, header=True)
+        arrays = nav.to_arrays(['a', 'b'])
+        assert arrays['a'][[0, 2]].tolist() == [1, 4] and np.isnan(arrays['a'][1])
+        assert arrays['b'][:2].tolist() == [2, 3] and np.isnan(arrays['b'][2])
+        assert nav.to_arrays(['a'], int, missing=-1)['a'].tolist() == [1, -1, 4]
+        with pytest.raises(ValueError):
+            nav.to_arrays(['a'], int)
+        nav.close()
+    finally:
+        os.remove(missing_file)
+
+
+def test_take():
+    # Test that rows are returned in the order of the indices with every checkpoint and cache setting.
+    header = content[0]
+    rows = [{header[i]: str(r) for i, r in enumerate(row)} for row in content[1:]]
+    indices = [4, 0, 5, 4, 2]
+    for checkpoint in [1, 2, 4]:
+        for cache_rows in [None, 2]:
+            nav = Navigator(data_file, header=True, checkpoint=checkpoint, cache_rows=cache_rows)
+            assert nav.take(indices) == [rows[idx] for idx in indices]
+            assert nav.take(indices[::-1]) == [rows[idx] for idx in indices[::-1]]
+            assert nav.take([]) == []
+            nav.close()
+
+
+def test_take_keys():
+    # Test that the rows of each key are returned in the order of the keys.
+    header = content[0]
+    rows = [{header[i]: str(r) for i, r in enumerate(row)} for row in content[1:]]
+    nav = Navigator(data_file, header=True, cache_rows=2)
+    keys = ['tire', 'wheel', 'battery', 'tire']
+    assert nav.take_keys('product', keys) == [[row for row in rows if row['product'] == key] for key in keys]
+    nav.close()
+
+
+def test_async_navigator():
+    # Test the asyncio front-end against the synchronous results, including coalesced concurrent exploration.
+    header = content[0]
+    rows = [{header[i]: str(r) for i, r in enumerate(row)} for row in content[1:]]
+
+    async def run():
+        async with AsyncNavigator(data_file, max_workers=2, batch_size=2, header=True) as nav:
+            results = await asyncio.gather(*[nav.getitem(idx) for idx in [5, 0, 3, 5, 1]])
+            assert results == [rows[idx] for idx in [5, 0, 3, 5, 1]]
+            assert nav.nav.horizon == len(rows)
+            assert await nav.size(force=True) == len(rows)
+            assert await nav.getitem(slice(1, None, 2)) == rows[1::2]
+            assert await nav.take([4, 2]) == [rows[4], rows[2]]
+            assert [row async for row in nav] == rows
+            assert [row async for row in nav.filter(lambda row: row['product'] == 'tire')] == \
+                [row for row in rows if row['product'] == 'tire']
+            await nav.register('product')
+            assert await nav.get('product', 'sparkplug') == [row for row in rows if row['product'] == 'sparkplug']
+            assert await nav.get('product', 'wheel') is None
+            assert await nav.take_keys('product', ['battery']) == [[rows[2]]]
+            # The threads of the pool read through the handle pool of the Navigator.
+            assert len(nav.nav.fps) == 1 and 0 < len(nav.nav.handles.handles()) <= 2
+        assert not nav.nav.handles.handles()
+
+    asyncio.run(run())
+
+
+def _is_tire(row):
+    return row['product'] == 'tire'
+
+
+def _is_tire_tuple(row):
+    return row.product == 'tire'
+
+
+def test_parallel_filter():
+    # Test that the parallel filter matches the serial filter, with byte ranges that split rows and quoted newlines.
+    multiline_file = './multiline.csv'
+    with open(multiline_file, 'w') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(content[0])
+        for i, row in enumerate(content[1:] * 5):
+            writer.writerow([row[0], f'{row[1]}\n"{i}"' if i % 3 == 0 else row[1], row[2]])
+    chunk_size = csvnav.PARALLEL_CHUNK_SIZE
+    csvnav.PARALLEL_CHUNK_SIZE = 16
+    try:
+        nav = Navigator(multiline_file, header=True)
+        expected = list(nav.filter(_is_tire))
+        indices = [idx for idx, row in enumerate(nav) if _is_tire(row)]
+        assert list(nav.parallel_filter(_is_tire, workers=2)) == expected
+        assert sorted(nav.parallel_filter(_is_tire, workers=2, ordered=False), key=str) == sorted(expected, key=str)
+        assert list(nav.parallel_filter(_is_tire, workers=2, output='indices')) == indices
+        assert list(nav.parallel_filter(_is_tire, workers=2, output='offsets')) == [nav.row_ptr[i] for i in indices]
+        assert list(nav.parallel_filter(_is_tire, output='indices')) == indices
+        nav.close()
+        # Test that namedtuple rows, whose class is built by each process, are returned.
+        nav = Navigator(multiline_file, header=True, row_type='namedtuple')
+        rows = list(nav.parallel_filter(_is_tire_tuple, workers=2))
+        assert rows == list(nav.filter(_is_tire_tuple)) and all(type(row) is type(nav[0]) for row in rows)
+        nav.close()
+    finally:
+        csvnav.PARALLEL_CHUNK_SIZE = chunk_size
+        os.remove(multiline_file)
+
+
+def test_refresh():
+    # Test that appended rows extend the pointers, registered fields and range indexes, including a cut off last row.
+    growing_file = './growing.csv'
+    try:
+        for engine, checkpoint in [('text', 1), ('mmap', 2)]:
+            with open(growing_file, 'w') as fp:
+                fp.write('time,product,quantity\n5,tire,4\n8,sparkplug,2')
+            nav = Navigator(growing_file, header=True, engine=engine, checkpoint=checkpoint)
+            nav.register('product')
+            nav.register('time', lazy=True)
+            nav.register_range('quantity', key=int)
+            assert nav.size() == 2 and list(nav.range('quantity', 10, 200)) == []
+            assert nav.refresh() == 0
+            with open(growing_file, 'a') as fp:
+                fp.write('0\n2,battery,120\n')
+            assert nav.refresh() == 1
+            rows = [{'time': '5', 'product': 'tire', 'quantity': '4'},
+                    {'time': '8', 'product': 'sparkplug', 'quantity': '20'},
+                    {'time': '2', 'product': 'battery', 'quantity': '120'}]
+            assert nav.size() == 3 and list(nav) == rows and nav[2] == rows[2]
+            assert list(nav['product', 'sparkplug']) == [rows[1]]
+            assert list(nav['time', '2']) == [rows[2]] and list(nav['time', '8']) == [rows[1]]
+            assert list(nav.range('quantity', 10, 200)) == rows[1:]
+            with open(growing_file, 'a') as fp:
+                fp.write('1,tire,1\n')
+            assert nav.refresh() == 1
+            assert list(nav['product', 'tire']) == [rows[0], {'time': '1', 'product': 'tire', 'quantity': '1'}]
+            assert [row['time'] for row in nav.range('quantity')] == ['1', '5', '8', '2']
+            with open(growing_file, 'w') as fp:
+                fp.write('time,product,quantity\n6,tire,4\n')
+            with pytest.raises(IndexMismatchError):
+                nav.refresh()
+            nav.close()
+
+        # Test that a file that has not been explored to its end is not explored by a refresh.
+        nav = Navigator(growing_file, header=True)
+        assert nav[0] == {'time': '6', 'product': 'tire', 'quantity': '4'}
+        with open(growing_file, 'a') as fp:
+            fp.write('7,battery,1\n')
+        assert nav.refresh() == 0 and nav.horizon == 1 and nav.length is None
+        assert nav.chars(force=True) == os.path.getsize(growing_file)
+        assert nav.size(force=True) == 2 and nav[1] == {'time': '7', 'product': 'battery', 'quantity': '1'}
+        nav.close()
+    finally:
+        os.remove(growing_file)
+
+
+def test_follow():
+    # Test that following a growing file yields appended rows once they are complete.
+    growing_file = './growing.csv'
+    with open(growing_file, 'w') as fp:
+        fp.write('time,product\n5,tire\n')
+    try:
+        nav = Navigator(growing_file, header=True)
+        rows = nav.follow(start=0, interval=0.01)
+        assert next(rows) == {'time': '5', 'product': 'tire'}
+        with open(growing_file, 'a') as fp:
+            fp.write('8,spark')
+
+        def append():
+            with open(growing_file, 'a') as fp:
+                fp.write('plug\n')
+
+        timer = threading.Timer(0.05, append)
+        timer.start()
+        assert next(rows) == {'time': '8', 'product': 'sparkplug'}
+        timer.join()
+        rows.close()
+        nav.close()
+    finally:
+        os.remove(growing_file)
+
+
+def test_gzip_engine():
+    # Test random access into a gzip file with several members against the uncompressed file, with decompressor
+    # snapshots every few rows and member starts restored from a sidecar index.
+    gzip_file = './inventory.csv.gz'
+    with open(data_file, 'rb') as fp:
+        data = fp.read()
+    with open(gzip_file, 'wb') as fp:
+        fp.write(gzip.compress(data[:40]))
+        fp.write(gzip.compress(data[40:]))
+    span = csvnav.GZIP_CHECKPOINT_SPAN
+    read_size = csvnav.GZIP_READ_SIZE
+    csvnav.GZIP_CHECKPOINT_SPAN = 16
+    csvnav.GZIP_READ_SIZE = 8
+    try:
+        nav = Navigator(data_file, header=True)
+        rows = list(nav)
+        nav.close()
+        nav = Navigator(gzip_file, header=True)
+        assert nav.engine == 'gzip'
+        assert [nav[idx] for idx in [3, 0, 5, 1]] == [rows[idx] for idx in [3, 0, 5, 1]]
+        assert list(nav) == rows and nav.size() == len(rows)
+        assert len(nav.gzip.offsets) > 2 and [40, None] in [[offset, state] for offset, state in
+                                                            zip(nav.gzip.offsets, nav.gzip.states)]
+        assert list(nav['product', 'tire']) == [row for row in rows if row['product'] == 'tire']
+        nav.save_index()
+        nav.close()
+        nav = Navigator(gzip_file, header=True, index_path=gzip_file + '.idx')
+        assert nav.gzip.members() == [[0, 0], [40, len(gzip.compress(data[:40]))]]
+        assert nav.take([5, 2, 4]) == [rows[5], rows[2], rows[4]]
+        nav.close()
+        # Test that the size of the decompressed data is found without exploring the file.
+        nav = Navigator(gzip_file, header=True)
+        assert nav.chars(force=True) == len(data) and nav.horizon == 0
+        assert nav[2] == rows[2] and nav.chars() == len(data)
+        nav.close()
+    finally:
+        csvnav.GZIP_CHECKPOINT_SPAN = span
+        csvnav.GZIP_READ_SIZE = read_size
+        os.remove(gzip_file)
+        os.remove(gzip_file + '.idx')
+
+
+def test_stats():
+    # Test the instrumentation counters and the trace callback.
+    assert Navigator(data_file).stats() is None
+    calls = []
+    nav = Navigator(data_file, header=True, stats=True, trace=lambda *args: calls.append(args))
+    assert nav.stats()['rows_parsed'] == 1 and nav.stats()['rows_explored'] == 0
+    nav.reset_stats()
+    nav[2]
+    stats = nav.stats()
+    assert stats['rows_explored'] == 3 and stats['seeks'] >= 1 and stats['readlines'] >= 1
+    assert stats['chars_read'] > 0 and stats['lock_acquisitions'] >= 1 and stats['lock_waits'] == 0
+    assert calls[-1][:2] == ('_handle_scalar', (2,)) and calls[-1][2] >= 0
+    assert len(list(nav[0:2])) == 2 and calls[-1][:2] == ('_handle_slice', (slice(0, 2),))
+    nav.register('product')
+    assert [call[0] for call in calls[-2:]] == ['_handle_slice', 'register']
+    assert nav.stats()['rows_explored'] == len(content) - 1
+    rows = nav['product', 'tire']
+    next(rows)
+    rows.close()
+    assert calls[-1][:2] == ('_handle_field', ('product', 'tire'))
+    nav.trace = None
+    nav[0]
+    assert calls[-1][0] == '_handle_field'
+    # Notifying the threads waiting for progress is not counted as acquiring the lock.
+    nav.reset_stats()
+    with nav.lock:
+        nav.progress.notify_all()
+        assert not nav.progress.wait(0)
+    assert nav.stats()['lock_acquisitions'] == 1
+    nav.close()
+
+    # Test that the lines of multiline rows are counted.
+    multiline_file = './stats.csv'
+    with open(multiline_file, 'w') as fp:
+        fp.write('a,b\n1,"x\ny\nz"\n2,w\n')
+    try:
+        nav = Navigator(multiline_file, header=True, stats=True)
+        assert list(nav) == [{'a': '1', 'b': 'x\ny\nz'}, {'a': '2', 'b': 'w'}]
+        stats = nav.stats()
+        assert stats['multiline_rows'] == 1 and stats['continuation_lines'] == 2 and stats['rows_parsed'] == 4
+        nav.close()
+    finally:
+        os.remove(multiline_file)
+
+
+def test_concurrent_exploration():
+    # Test that rows explored by a chunk can be read while another thread is still exploring.
+    chunk_size = csvnav.EXPLORE_CHUNK_SIZE
+    csvnav.EXPLORE_CHUNK_SIZE = 2
+    reached = threading.Event()
+    gate = threading.Event()
+
+    def reformat(nav, line):
+        if line.startswith('11,'):
+            # Block the exploration of the fifth row.
+            reached.set()
+            gate.wait(10)
+        return line
+
+    try:
+        nav = Navigator(data_file, header=True, reformat=reformat)
+        explorer = threading.Thread(target=nav.size, kwargs={'force': True})
+        explorer.start()
+        assert reached.wait(10)
+        assert nav.exploring and nav.horizon == 4 and nav.length is None
+        assert nav[3] == {'time': '10', 'product': 'tire', 'quantity': '2'}
+        waiter = threading.Thread(target=nav.__getitem__, args=(5,))
+        waiter.start()
+        gate.set()
+        explorer.join()
+        waiter.join()
+        assert nav.size() == len(content) - 1 and not nav.exploring
+        reference = Navigator(data_file, header=True)
+        reference.size(force=True)
+        assert nav.row_ptr == reference.row_ptr and nav.frontier == reference.frontier
+        reference.close()
+        nav.close()
+    finally:
+        csvnav.EXPLORE_CHUNK_SIZE = chunk_size
+
+    # Test that reads from many short-lived threads share a bounded pool of file pointers.
+    nav = Navigator(data_file, header=True, max_handles=2)
+    threads = [threading.Thread(target=lambda: [nav[idx] for idx in range(len(content) - 1)]) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(nav.fps) == 1 and len(nav.handles.handles()) <= 2
+    # The file pointer of a thread that has exited is closed when another thread opens one.
+    for _ in range(2):
+        thread = threading.Thread(target=nav._readrow)
+        thread.start()
+        thread.join()
+        assert len(nav.fps) == 2
+    handles = nav.handles.handles()
+    nav.close()
+    assert all(fp.closed for fp in handles)
+
+
+def test_scan_lines():
+    # Test that rows found by scanning blocks for newlines match the rows found by the parser.
+    scan_file = './scan.csv'
+    lines = [b'a,b', b'1,2', b'"x\r\ny",3', b'4,5', b'6,' + b'7' * 40, b'8,9\r', b'', b'10,11']
+    with open(scan_file, 'wb') as fp:
+        fp.write(b'\r\n'.join(lines) + b'\n')
+    try:
+        block_size = csvnav.SCAN_BLOCK_SIZE
+        csvnav.SCAN_BLOCK_SIZE = 16
+        try:
+            for opts in [{}, {'raw_output': True}, {'char_lim': 30}, {'checkpoint': 2}, {'engine': 'mmap'}]:
+                nav = Navigator(scan_file, header=True, stats=True, **opts)
+                reference = Navigator(scan_file, header=True, reformat=lambda nav, line: line, **opts)
+                if 'char_lim' in opts:
+                    with pytest.raises(CharLimitExceededError):
+                        nav.size(force=True)
+                    continue
+                assert nav.size(force=True) == reference.size(force=True)
+                assert nav.row_ptr == reference.row_ptr and nav.frontier == reference.frontier
+                assert list(nav) == list(reference)
+                nav.close()
+                reference.close()
+        finally:
+            csvnav.SCAN_BLOCK_SIZE = block_size
+        # Scanned rows are not parsed.
+        nav = Navigator(scan_file, raw_output=True, stats=True, open_opts={'newline': '\n'})
+        # The quoted field with a line break is two raw lines.
+        assert nav.size(force=True) == len(lines) + 1 and nav.stats()['rows_parsed'] == 0
+        assert nav[len(lines)] == '10,11\n'
+        nav.close()
+        # Under universal newlines the lone carriage return ends a line too, like in text mode.
+        nav = Navigator(scan_file, raw_output=True)
+        with open(scan_file) as fp:
+            assert nav.size(force=True) == len(lines) + 2 and list(nav) == fp.readlines()
+        assert nav[len(lines) + 1] == '10,11\n'
+        nav.close()
+    finally:
+        os.remove(scan_file)
+
+
+def test_estimate_size():
+    # Test that the estimate is exact for explored files and close for files of rows of similar length.
+    estimate_file = './estimate.csv'
+    with open(estimate_file, 'w') as fp:
+        fp.write('index,value\n')
+        for idx in range(1000):
+            fp.write(f'{idx},{"x" * (idx % 7)}\n')
+    try:
+        nav = Navigator(estimate_file, header=True)
+        estimate = nav.estimate_size(seed=0)
+        assert not estimate['exact'] and estimate['low'] <= estimate['estimate'] <= estimate['high']
+        assert abs(estimate['estimate'] - 1000) < 100 and nav.horizon == 0
+        nav[499]
+        estimate = nav.estimate_size(seed=0)
+        assert abs(estimate['estimate'] - 1000) < 50 and estimate['low'] >= 500
+        nav.size(force=True)
+        assert nav.estimate_size() == {'estimate': 1000, 'low': 1000, 'high': 1000, 'std_error': 0., 'exact': True}
+        nav.close()
+
+        # Test that sampled positions in the middle of multibyte characters are not decoded.
+        with open(estimate_file, 'w', encoding='utf-8') as fp:
+            fp.write('index,value\n')
+            for idx in range(1000):
+                fp.write(f'{idx},{"é€" * (idx % 5 + 1)}\n')
+        for seed in range(5):
+            nav = Navigator(estimate_file, header=True, open_opts={'encoding': 'utf-8'})
+            estimate = nav.estimate_size(seed=seed)
+            assert estimate['low'] <= 1000 <= estimate['high'] and abs(estimate['estimate'] - 1000) < 100
+            rows = list(nav.seek_fraction(seed / 5 + 0.07))
+            assert 0 < len(rows) < 1000 and rows == list(nav[-len(rows):])
+            nav.close()
+    finally:
+        os.remove(estimate_file)
+
+
+def test_seek_fraction():
+    # Test that the rows from a fraction of the file are a suffix of the rows of the file.
+    nav = Navigator(data_file, header=True)
+    rows = list(Navigator(data_file, header=True))
+    assert list(nav.seek_fraction(0)) == rows and nav.horizon == 0
+    half = list(nav.seek_fraction(0.5))
+    assert 0 < len(half) < len(rows) and half == rows[-len(half):]
+    assert list(nav.seek_fraction(1)) == []
+    nav.size(force=True)
+    assert list(nav.seek_fraction(0.5)) == half
+    nav.close()
+    nav = Navigator(data_file, header=True, checkpoint=4)
+    nav.size(force=True)
+    assert list(nav.seek_fraction(0.5)) == rows[4:]
+    nav.close()
+
+
+def test_tail():
+    # Test negative indices and the last rows of a file with quoted fields that span several lines.
+    tail_file = './tail.csv'
+    with open(tail_file, 'w') as fp:
+        fp.write('a,b\n1,"x\ny"\n2,"""q"""\n3,"\n4,z\n"\n5,w')
+    try:
+        rows = list(Navigator(tail_file, header=True))
+        block_size = csvnav.SCAN_BLOCK_SIZE
+        csvnav.SCAN_BLOCK_SIZE = 4
+        try:
+            for opts in [{}, {'engine': 'mmap'}, {'checkpoint': 2}]:
+                nav = Navigator(tail_file, header=True, **opts)
+                assert len(rows) == 4 and [nav.tail(n) for n in range(6)] == [[]] + [rows[-n:] for n in range(1, 6)]
+                assert nav[-1] == {'a': '5', 'b': 'w'} and nav[-3] == rows[-3]
+                assert list(nav[-3:-1]) == rows[-3:-1] and list(nav[-4::2]) == rows[-4::2]
+                # The rows were located without exploring the file.
+                assert nav.horizon == 0 and len(nav.row_ptr) == 0
+                with pytest.raises(AssertionError):
+                    nav[-5]
+                assert list(nav[1:-1]) == rows[1:-1] and nav.length == 4
+                assert nav[-2] == rows[-2] and nav.tail(2) == rows[-2:]
+                nav.close()
+        finally:
+            csvnav.SCAN_BLOCK_SIZE = block_size
+
+        # Test that the file is explored when rows cannot be located backwards.
+        with open(tail_file, 'a') as fp:
+            fp.write('\n\n')
+        nav = Navigator(tail_file, header=True)
+        assert nav.tail(2) == rows[-2:] and nav.length == 4
+        nav.close()
+        nav = Navigator(tail_file, header=True, escapechar='\\')
+        assert nav[-1] == rows[-1] and nav.length == 4
+        nav.close()
+    finally:
+        os.remove(tail_file)
+
+
+def test_batches():
+    # Test that shuffled batches are deterministic and that shards cover every row exactly once.
+    batch_file = './batches.csv'
+    with open(batch_file, 'w') as fp:
+        fp.write('a,b\n' + ''.join(f'{i},"x\n{i}"\n' for i in range(500)))
+    try:
+        for opts in [{}, {'checkpoint': 3}]:
+            nav = Navigator(batch_file, header=True, row_type='tuple', **opts)
+            rows = [int(row[0]) for batch in nav.batches(16, shuffle=False, block_size=40) for row in batch]
+            assert rows == list(range(500))
+            batches = list(nav.batches(16, seed=7, block_size=40, window=100))
+            assert all(len(batch) == 16 for batch in batches[:-1]) and len(batches[-1]) == 500 % 16
+            assert batches == list(nav.batches(16, seed=7, block_size=40, window=100, prefetch=0))
+            assert batches != list(nav.batches(16, seed=7, block_size=40, window=100, epoch=1))
+            assert sorted(batches[0]) == sorted(nav.take([int(row[0]) for row in batches[0]]))
+            for world_size in [2, 3]:
+                rows = []
+                counts = set()
+                for rank in range(world_size):
+                    batches = nav.batches(16, seed=7, block_size=40, rank=rank, world_size=world_size)
+                    rows += [int(row[0]) for batch in batches for row in batch]
+                    batches = nav.batches(16, seed=7, block_size=40, rank=rank, world_size=world_size, drop_last=True)
+                    batches = list(batches)
+                    assert all(len(batch) == 16 for batch in batches)
+                    counts.add(len(batches))
+                assert sorted(rows) == list(range(500)) and len(counts) == 1
+            nav.close()
+
+        # Test that closing the generator early stops the prefetch thread.
+        nav = Navigator(batch_file, header=True)
+        threads = threading.active_count()
+        batches = nav.batches(8, prefetch=1)
+        assert len(next(batches)) == 8
+        batches.close()
+        assert threading.active_count() == threads
+        nav.close()
+    finally:
+        os.remove(batch_file)